@@ -28,4 +28,28 @@ app.conf.beat_schedule = {
         'task': 'contentapi.tasks.post_ai_comments',
         'schedule': 30.0,
     },
+    'maintain-stat-snapshot-partitions-daily': {
+        'task': 'contents.tasks.maintain_stat_snapshot_partitions',
+        'schedule': crontab(minute=0, hour=0),
+    },
+    'maintain-content-partitions-daily': {
+        'task': 'contents.tasks.maintain_content_partitions',
+        'schedule': crontab(minute=5, hour=0),
+    },
+    'refresh-sales-summary-every-5-minutes': {
+        'task': 'contents.tasks.refresh_sales_summary_task',
+        'schedule': crontab(minute='*/5'),
+    },
+    'refresh-tag-daily-stats-every-5-minutes': {
+        'task': 'contents.tasks.refresh_tag_daily_stats_task',
+        'schedule': crontab(minute='*/5'),
+    },
+    'refresh-tag-cooccurrences-hourly': {
+        'task': 'contents.tasks.refresh_tag_cooccurrences_task',
+        'schedule': crontab(minute=45),
+    },
+    'refresh-product-recommendations-hourly': {
+        'task': 'contents.tasks.refresh_product_recommendations',
+        'schedule': crontab(minute=15),
+    },
 }
\ No newline at end of file
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, it compresses the response the other middlewares produced (brotli is not available, gzip only)
+    "contents.middleware.MeteredGZipMiddleware",
+    # Times the queries of every middleware and view below it
+    "contents.middleware.SlowQueryMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -80,6 +85,35 @@ WSGI_APPLICATION = "contentapi.wsgi.application"
 
 DATABASES = {"default": env.db()}
 
+# How the processes hold their postgres connections, set per process type with DATABASE_CONNECTIONS:
+# - "pool": a psycopg pool per process, opt-in for the web servers (requests run in threads and coroutines).
+#   Size it so every process's DATABASE_POOL_MAX_SIZE fits in the server's max_connections. Threads beyond
+#   the pool size wait for a connection, up to DATABASE_POOL_TIMEOUT.
+# - "persistent" (default): a connection per thread, kept DATABASE_CONN_MAX_AGE seconds, for the celery
+#   workers (one task at a time per worker process) and the management commands.
+# - "pgbouncer": persistent connections to a pgbouncer in transaction pooling mode, no session state is
+#   kept across transactions (no server side cursors nor prepared statements).
+# - "none": a new connection per request and task, django's default.
+DATABASE_CONNECTIONS = env("DATABASE_CONNECTIONS", default="persistent")
+# Connections recycled by the pool, postgres or pgbouncer are checked before being reused
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+if DATABASE_CONNECTIONS == "pool":
+    DATABASES["default"]["OPTIONS"] = {
+        **DATABASES["default"].get("OPTIONS", {}),
+        "pool": {
+            "min_size": env.int("DATABASE_POOL_MIN_SIZE", default=2),
+            "max_size": env.int("DATABASE_POOL_MAX_SIZE", default=10),
+            # Seconds a request waits for a free connection before failing
+            "timeout": env.float("DATABASE_POOL_TIMEOUT", default=10),
+        },
+    }
+elif DATABASE_CONNECTIONS in ("persistent", "pgbouncer"):
+    DATABASES["default"]["CONN_MAX_AGE"] = env.int("DATABASE_CONN_MAX_AGE", default=600)
+    # Named cursors (`QuerySet.iterator()`) live in a session, pgbouncer may run each fetch on another server
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = DATABASE_CONNECTIONS == "pgbouncer"
+elif DATABASE_CONNECTIONS != "none":
+    raise ImproperlyConfigured(f"Unknown DATABASE_CONNECTIONS: {DATABASE_CONNECTIONS}")
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -140,6 +174,77 @@ CELERY_TASK_STORE_API_URL = "http://localhost:3000/contents/"
 CELERY_TASK_PULL_API_URL = "https://example.com/api/pull_data"
 API_BASE_URL = "https://hackapi.hellozelf.com"
 
+# Seconds before the pull lock expires if its heartbeat stops (e.g. the worker died)
+CONTENT_PULL_LOCK_TTL = 60
+# Seconds a page claim is kept, it must outlive a whole pull cycle
+CONTENT_PULL_CLAIM_TTL = 60 * 60
+
+# Days of daily engagement leaderboards kept in redis, bounds the `days` of the trending api
+TRENDING_RETENTION_DAYS = 30
+# Seconds a merged (ZUNIONSTORE) leaderboard is reused before it is rebuilt
+TRENDING_UNION_TTL = 60
+# Seconds a queued rebuild of the missing trending days blocks another one, in case the worker never runs it
+TRENDING_REBUILD_TTL = 60 * 10
+
+# Months of content stat history kept, older monthly partitions are dropped
+STAT_SNAPSHOT_RETENTION_MONTHS = 12
+
+# Seconds the first page of a user's order history is cached, new orders invalidate it earlier
+ORDER_HISTORY_CACHE_TTL = 60 * 5
+
+# Recommendations kept per product by the co-occurrence refresh
+PRODUCT_RECOMMENDATIONS_TOP_K = 20
+
+# HackAPI comment pushing: seconds before a call times out, and between two posted comments (api rate limit)
+COMMENT_API_TIMEOUT = 10
+COMMENT_POST_INTERVAL = 30
+# Consecutive failures opening an endpoint's circuit breaker, and seconds before it lets a call through again
+COMMENT_BREAKER_FAILURE_THRESHOLD = 5
+COMMENT_BREAKER_RESET_TIMEOUT = 60
+# Upper bound of the AIMD adapted number of concurrent comment generation calls, shared by all workers
+COMMENT_GENERATION_MAX_CONCURRENCY = 16
+# Failed push attempts before a content is given up
+COMMENT_PUSH_MAX_ATTEMPTS = 5
+
+# Authors/tags kept in the in-process LRU of every ingest worker, and seconds they are kept in redis
+INGEST_LOCAL_CACHE_SIZE = 10_000
+INGEST_CACHE_TTL = 60 * 60 * 24
+
+# Queries slower than this many milliseconds are recorded (contents.slow_queries), for the given share of them
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_SAMPLE_RATE = 1.0
+# The first slow run of a query is explained, with EXPLAIN ANALYZE bounded by this many milliseconds
+SLOW_QUERY_CAPTURE_PLANS = True
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = 10_000
+
+# Live contents feed: events buffered per SSE connection before it is told to resync, seconds between
+# keep-alive comments, and seconds before the listener (and the clients) reconnect
+CONTENT_FEED_QUEUE_SIZE = 100
+CONTENT_FEED_HEARTBEAT = 15
+CONTENT_FEED_RECONNECT_DELAY = 5
+# LISTEN needs a session: behind pgbouncer in transaction pooling mode, the feed listener connects to this
+# postgres url directly
+CONTENT_FEED_DATABASE_URL = env("CONTENT_FEED_DATABASE_URL", default=None)
+
+# Related tags kept per tag, counted over the contents of the last TAG_COOCCURRENCE_DAYS days
+TAG_COOCCURRENCE_TOP_K = 20
+TAG_COOCCURRENCE_DAYS = 90
+# Seconds the tag daily stats refresh looks back before its watermark: a stat snapshot is captured at its
+# content's `updated_at`, and only committed once its whole ingest page is processed
+TAG_STATS_REFRESH_MARGIN = 60 * 15
+
+# Batch lookup of contents by unique id: ids accepted per request, and seconds a found content stays cached
+CONTENT_LOOKUP_MAX_IDS = 5000
+CONTENT_LOOKUP_CACHE_TTL = 60 * 5
+
+# Seconds between two reads of the discount codes version, a changed code is used by every process within it
+DISCOUNT_VERSION_CHECK_INTERVAL = 5
+
+# Warehouses going below their reorder point are posted to this url (contents.tasks.notify_reorder_point),
+# they are only logged when it is not set
+REORDER_WEBHOOK_URL = env("REORDER_WEBHOOK_URL", default=None)
+REORDER_WEBHOOK_TIMEOUT = 10
+
 
 CELERY_BROKER_URL = "redis://127.0.0.1:6379/0"
 CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379/0"
\ No newline at end of file
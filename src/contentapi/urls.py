@@ -1,11 +1,37 @@
 from django.contrib import admin
 from django.urls import path
 
-from contents.views import ContentAPIView, ContentStatsAPIView
+from contents.views import (
+    ContentAPIView, ContentFeedView, ContentLookupAPIView, ContentStatsAPIView, AuthorStatsAPIView,
+    TrendingContentAPIView, ContentGrowthAPIView, TagStatsAPIView, RelatedTagAPIView, SalesReportAPIView,
+    TopRatedProductAPIView, ProductRecommendationAPIView, OrderHistoryAPIView, MetricsAPIView,
+)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
 
+    path("api/contents/<int:content_id>/growth/", ContentGrowthAPIView.as_view(), name="api-contents-growth"),
+    path("api/contents/trending/", TrendingContentAPIView.as_view(), name="api-contents-trending"),
+    path("api/contents/feed/", ContentFeedView.as_view(), name="api-contents-feed"),
+    path("api/contents/batch/", ContentLookupAPIView.as_view(), name="api-contents-batch"),
     path("api/contents/stats/", ContentStatsAPIView.as_view(), name="api-contents-stats"),
     path("api/contents/", ContentAPIView.as_view(), name="api-contents"),
+
+    path("api/authors/stats/", AuthorStatsAPIView.as_view(), name="api-authors-stats"),
+
+    path("api/tags/stats/", TagStatsAPIView.as_view(), name="api-tags-stats"),
+    path("api/tags/<str:tag>/related/", RelatedTagAPIView.as_view(), name="api-tags-related"),
+
+    path("api/reports/sales/", SalesReportAPIView.as_view(), name="api-reports-sales"),
+
+    path("api/products/top-rated/", TopRatedProductAPIView.as_view(), name="api-products-top-rated"),
+    path(
+        "api/products/<int:product_id>/recommendations/",
+        ProductRecommendationAPIView.as_view(),
+        name="api-products-recommendations",
+    ),
+
+    path("api/orders/history/", OrderHistoryAPIView.as_view(), name="api-orders-history"),
+
+    path("api/metrics/", MetricsAPIView.as_view(), name="api-metrics"),
 ]
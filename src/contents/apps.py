@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ContentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "contents"
+
+    def ready(self):
+        # Connects the signals invalidating the discount snapshots
+        from contents import discounts  # noqa: F401
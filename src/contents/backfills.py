@@ -0,0 +1,161 @@
+import time
+
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from contents.ingest_cache import invalidate_ingest_cache
+from contents.models import BackfillChunk
+
+
+class Backfill:
+    """
+    A rewrite of `table` split in primary key ranges. Every statement is run once per chunk with the
+    `%(start)s` / `%(end)s` bounds and must only touch the rows of that range, so chunks can run in any
+    order and in parallel. Statements must be safe to run again on an already processed range.
+    Backfills writing authors or tags set `invalidates_ingest_cache`, the ingest cache is dropped after
+    every chunk.
+    """
+    def __init__(self, name, table, statements, description="", pk="id", invalidates_ingest_cache=False):
+        self.name = name
+        self.table = table
+        self.statements = statements
+        self.description = description
+        self.pk = pk
+        self.invalidates_ingest_cache = invalidates_ingest_cache
+
+    def run_chunk(self, cursor, start, end):
+        rows = 0
+        for sql in self.statements:
+            cursor.execute(sql, {"start": start, "end": end})
+            rows += max(cursor.rowcount, 0)
+        return rows
+
+
+BACKFILLS = {
+    backfill.name: backfill
+    for backfill in [
+        Backfill(
+            "merge_duplicate_tags",
+            "contents_tag",
+            [
+                # Point the content tags of a duplicated tag to the oldest tag of that name, then drop it
+                """
+                UPDATE contents_contenttag SET tag_id = canonical.id
+                FROM contents_tag duplicate, contents_tag canonical
+                WHERE contents_contenttag.tag_id = duplicate.id
+                  AND duplicate.id >= %(start)s AND duplicate.id < %(end)s
+                  AND canonical.id = (SELECT MIN(id) FROM contents_tag WHERE name = duplicate.name)
+                  AND canonical.id <> duplicate.id
+                """,
+                """
+                DELETE FROM contents_tag
+                WHERE id >= %(start)s AND id < %(end)s
+                  AND EXISTS (
+                      SELECT 1 FROM contents_tag older
+                      WHERE older.name = contents_tag.name AND older.id < contents_tag.id
+                  )
+                """,
+            ],
+            description="Merges the tags having the same name into the oldest one. Run dedupe_content_tags after it.",
+            # The deleted duplicates may be cached
+            invalidates_ingest_cache=True,
+        ),
+        Backfill(
+            "dedupe_content_tags",
+            "contents_contenttag",
+            [
+                """
+                DELETE FROM contents_contenttag
+                WHERE id >= %(start)s AND id < %(end)s
+                  AND EXISTS (
+                      SELECT 1 FROM contents_contenttag older
+                      WHERE older.content_id = contents_contenttag.content_id
+                        AND older.tag_id = contents_contenttag.tag_id
+                        AND older.id < contents_contenttag.id
+                  )
+                """,
+            ],
+            description="Deletes the repeated (content, tag) pairs, the oldest row of a pair is kept.",
+        ),
+        Backfill(
+            "copy_contents_to_partitioned",
+            "contents_content",
+            [
+                # The rows of the range are locked first: they can't change until the chunk commits, and the
+                # next statements (new snapshot) see every copy the sync trigger already made of them.
+                """
+                SELECT COUNT(*) FROM (
+                    SELECT 1 FROM contents_content WHERE id >= %(start)s AND id < %(end)s FOR SHARE
+                ) locked
+                """,
+                "DELETE FROM contents_content_partitioned WHERE id >= %(start)s AND id < %(end)s",
+                """
+                INSERT INTO contents_content_partitioned
+                SELECT * FROM contents_content WHERE id >= %(start)s AND id < %(end)s
+                """,
+            ],
+            description="Copies the contents in the partitioned table, run by `partition_contents copy`.",
+        ),
+    ]
+}
+
+
+def plan_chunks(backfill, chunk_size):
+    """
+    Adds the chunks covering the table up to its current max primary key. Already planned ranges are kept,
+    so planning again only covers the rows inserted since, with the `chunk_size` of the new call.
+    """
+    planned_end = BackfillChunk.objects.filter(backfill=backfill.name).aggregate(end=Max("end_pk"))["end"]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({backfill.pk}), MAX({backfill.pk}) FROM {backfill.table}")
+        first, last = cursor.fetchone()
+    if last is None:
+        return 0
+
+    start = first if planned_end is None else planned_end
+    chunks = [
+        BackfillChunk(backfill=backfill.name, start_pk=chunk_start, end_pk=min(chunk_start + chunk_size, last + 1))
+        for chunk_start in range(start, last + 1, chunk_size)
+    ]
+    BackfillChunk.objects.bulk_create(chunks, ignore_conflicts=True)
+    return len(chunks)
+
+
+def run_next_chunk(backfill):
+    """
+    Claims an open chunk and processes it, in one transaction. Chunks being processed by other workers are
+    skipped. Returns the completed chunk, or None when there is no open chunk left.
+    """
+    with transaction.atomic():
+        chunk = (
+            BackfillChunk.objects.select_for_update(skip_locked=True)
+            .filter(backfill=backfill.name, completed_at__isnull=True)
+            .order_by("start_pk")
+            .first()
+        )
+        if chunk is None:
+            return None
+
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            chunk.rows = backfill.run_chunk(cursor, chunk.start_pk, chunk.end_pk)
+        chunk.duration = time.perf_counter() - started
+        chunk.completed_at = timezone.now()
+        chunk.save(update_fields=["rows", "duration", "completed_at"])
+    if backfill.invalidates_ingest_cache:
+        invalidate_ingest_cache()
+    return chunk
+
+
+def get_progress(backfill):
+    chunks = BackfillChunk.objects.filter(backfill=backfill.name)
+    return {
+        "chunks": chunks.count(),
+        "completed": chunks.filter(completed_at__isnull=False).count(),
+        "rows": chunks.aggregate(rows=Sum("rows"))["rows"] or 0,
+    }
+
+
+def reset(backfill):
+    return BackfillChunk.objects.filter(backfill=backfill.name).delete()[0]
@@ -0,0 +1,166 @@
+import datetime
+import hashlib
+import time
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django_redis import get_redis_connection
+
+KEY_PREFIX = "contents:data_version"
+# Bumped by bulk writes (loads, backfills) that can touch the contents of any author
+EPOCH_KEY = f"{KEY_PREFIX}:epoch"
+METRICS_KEY = "contents:http_metrics"
+ETAG_SIZE_TTL = 60 * 60 * 24
+
+
+def scope_key(author_id=None):
+    return f"{KEY_PREFIX}:author:{author_id}" if author_id else f"{KEY_PREFIX}:all"
+
+
+def bump_data_versions(author_ids):
+    """
+    Called by the ingest paths once their content writes are done: the cached responses of every content
+    filter and of the filters on one of `author_ids` stop matching.
+    """
+    now = time.time()
+    pipeline = get_redis_connection("default").pipeline(transaction=False)
+    for author_id in [None, *set(author_ids)]:
+        pipeline.hincrby(scope_key(author_id), "version", 1)
+        pipeline.hset(scope_key(author_id), "modified", now)
+    pipeline.execute()
+
+
+def bump_data_epoch():
+    get_redis_connection("default").incr(EPOCH_KEY)
+
+
+def get_data_version(author_id=None):
+    """
+    `(version, modified)` of the contents of one author, or of all contents.
+    A missing version (redis was flushed) starts from the current time, so it never matches an old ETag.
+    """
+    redis = get_redis_connection("default")
+    key = scope_key(author_id)
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.hmget(key, "version", "modified")
+    pipeline.get(EPOCH_KEY)
+    (version, modified), epoch = pipeline.execute()
+    if version is None:
+        now = time.time()
+        redis.hsetnx(key, "version", int(now * 1000))
+        redis.hsetnx(key, "modified", now)
+        version, modified = redis.hmget(key, "version", "modified")
+    return f"{int(epoch or 0)}.{int(version)}", float(modified)
+
+
+def get_validators(request, time_bucket=None):
+    """
+    Weak ETag and Last-Modified of a content list/stats request, computed from redis only.
+
+    The ETag combines the request (path and query) with the data version of its scope: the author of the
+    `author_id` filter, or all contents. `time_bucket` (the start of the current bucket, see `timeframe_bucket`)
+    is added for responses that also change with time (e.g. the `timeframe` filter) without any data change,
+    and Last-Modified is never before it, or `If-Modified-Since` would keep matching once the bucket moved.
+    """
+    author_id = request.query_params.get("author_id")
+    version, modified = get_data_version(author_id if author_id and author_id.isdigit() else None)
+
+    query = sorted(request.query_params.lists())
+    bucket = time_bucket.isoformat() if time_bucket else ""
+    digest = hashlib.sha1(f"{request.path}|{query}|{bucket}".encode()).hexdigest()[:20]
+    etag = f'W/"{digest}-{version}"'
+    last_modified = datetime.datetime.fromtimestamp(int(modified), tz=datetime.timezone.utc)
+    if time_bucket:
+        last_modified = max(last_modified, time_bucket)
+    return etag, last_modified
+
+
+def timeframe_bucket(request):
+    """
+    Start of the current minute when the request has a `timeframe` filter: its cutoff is counted from the
+    current minute (see `contents.views.apply_content_filters`), the results move with it.
+    """
+    if not request.query_params.get("timeframe"):
+        return None
+    return timezone.now().replace(second=0, microsecond=0)
+
+
+def record_response(name, response):
+    """
+    Counts a response of a conditional endpoint. A 304 adds the size of the full response it replaced
+    (the last one sent with the same ETag) to the bytes saved.
+    """
+    redis = get_redis_connection("default")
+    etag = response.get("ETag")
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.hincrby(METRICS_KEY, f"{name}:responses", 1)
+    if response.status_code == 304:
+        pipeline.hincrby(METRICS_KEY, f"{name}:not_modified", 1)
+        size = redis.get(f"{METRICS_KEY}:etag_size:{etag}") if etag else None
+        if size:
+            pipeline.hincrby(METRICS_KEY, f"{name}:bytes_saved", int(size))
+    elif etag and not response.streaming:
+        pipeline.set(f"{METRICS_KEY}:etag_size:{etag}", len(response.content), ex=ETAG_SIZE_TTL)
+    pipeline.execute()
+
+
+def record_compression(original_size, compressed_size):
+    pipeline = get_redis_connection("default").pipeline(transaction=False)
+    pipeline.hincrby(METRICS_KEY, "gzip:bytes_in", original_size)
+    pipeline.hincrby(METRICS_KEY, "gzip:bytes_out", compressed_size)
+    pipeline.execute()
+
+
+def get_http_metrics():
+    metrics = get_redis_connection("default").hgetall(METRICS_KEY)
+    stats = {name.decode(): int(value) for name, value in metrics.items()}
+    endpoints = {}
+    for name, value in stats.items():
+        endpoint, counter = name.rsplit(":", 1)
+        if endpoint != "gzip":
+            endpoints.setdefault(endpoint, {"responses": 0, "not_modified": 0, "bytes_saved": 0})[counter] = value
+    for counters in endpoints.values():
+        responses = counters["responses"]
+        counters["not_modified_ratio"] = round(counters["not_modified"] / responses, 3) if responses else 0
+
+    bytes_in, bytes_out = stats.get("gzip:bytes_in", 0), stats.get("gzip:bytes_out", 0)
+    return {
+        "conditional": endpoints,
+        "gzip": {"bytes_in": bytes_in, "bytes_out": bytes_out, "bytes_saved": bytes_in - bytes_out},
+    }
+
+
+
+class ConditionalGet:
+    """
+    ETag / Last-Modified handling of a GET endpoint, see `get_validators`:
+
+        conditional_get = ConditionalGet(request, "contents")
+        not_modified = conditional_get.not_modified()
+        if not_modified:
+            return not_modified
+        ...
+        return conditional_get.finalize(Response(data))
+    """
+    def __init__(self, request, endpoint, time_bucket=None):
+        self.request = request
+        self.endpoint = endpoint
+        self.etag, self.last_modified = get_validators(request, time_bucket)
+
+    def not_modified(self):
+        """
+        The 304 response when the client's `If-None-Match` / `If-Modified-Since` still match, else None.
+        """
+        response = get_conditional_response(
+            self.request, etag=self.etag, last_modified=int(self.last_modified.timestamp())
+        )
+        return self.finalize(response) if response is not None else None
+
+    def finalize(self, response):
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response["ETag"] = self.etag
+            response["Last-Modified"] = http_date(self.last_modified.timestamp())
+            # Read by `contents.middleware.MeteredGZipMiddleware`
+            response.conditional_endpoint = self.endpoint
+        return response
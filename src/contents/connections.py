@@ -0,0 +1,19 @@
+from django.db import connection
+
+
+def reserve_pool_connections(count):
+    """
+    Grows the connection pool of this process (`DATABASE_CONNECTIONS=pool`) to at least `count` connections,
+    for the commands holding a connection per thread. Does nothing without a pool. Call it before the threads
+    start: a pool already opened is closed and opened again with the new size.
+    """
+    pool_options = connection.settings_dict["OPTIONS"].get("pool")
+    if not pool_options:
+        return
+    pool_options = pool_options if isinstance(pool_options, dict) else {}
+    if pool_options.get("max_size", 0) >= count:
+        return
+    connection.close()
+    connection.close_pool()
+    # The settings are shared by the connections of every thread
+    connection.settings_dict["OPTIONS"]["pool"] = {**pool_options, "max_size": count}
@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Lookup, OuterRef
+
+from contents.models import Content, ContentTag
+from contents.serializers import ContentSerializer
+
+CACHE_KEY_PREFIX = "contents:by_unique_id"
+
+
+@models.CharField.register_lookup
+class AnyLookup(Lookup):
+    """
+    `unique_id__any=[...]`: `unique_id = ANY(%s)` with the whole list as one array parameter, where `__in`
+    sends one placeholder per value (thousands of parameters, and a different query text per list length).
+    """
+    lookup_name = "any"
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} = ANY({rhs})", [*lhs_params, *rhs_params]
+
+
+def cache_key(unique_id):
+    return f"{CACHE_KEY_PREFIX}:{unique_id}"
+
+
+def serialize_content(content):
+    """
+    A content in the shape of the items of the contents api, `content.tags` annotated.
+    """
+    data = ContentSerializer({"content": content, "author": content.author}).data
+    total_engagement = content.like_count + content.comment_count + content.share_count
+    data["content"]["engagement_rate"] = total_engagement / content.view_count if content.view_count > 0 else 0
+    data["content"]["total_engagement"] = total_engagement
+    data["content"]["tags"] = content.tags
+    return data
+
+
+def fetch_contents(unique_ids):
+    """
+    The contents of `unique_ids` with their author and tags, in one query. A unique id ingested more than once
+    resolves to its first content, like `get_or_create` does.
+    """
+    contents = (
+        Content.objects.filter(unique_id__any=unique_ids)
+        .select_related("author")
+        # A subquery rather than a join and GROUP BY, grouping by `id` is not allowed once `contents_content`
+        # is partitioned
+        .annotate(tags=ArraySubquery(
+            ContentTag.objects.filter(content_id=OuterRef("id")).order_by("id").values("tag__name")
+        ))
+        .order_by("unique_id", "id")
+        .distinct("unique_id")
+    )
+    return {content.unique_id: serialize_content(content) for content in contents}
+
+
+def get_contents(unique_ids):
+    """
+    The serialized contents of `unique_ids`, in the same order, `None` for the ids that have no content.
+    Hot ids are read from the cache in one multi-get, the others from the database in one query and cached
+    for `CONTENT_LOOKUP_CACHE_TTL` seconds. Misses are not cached, a content is served as soon as it exists.
+    """
+    wanted = list(dict.fromkeys(unique_ids))
+    cached = cache.get_many([cache_key(unique_id) for unique_id in wanted])
+    found = {unique_id: cached[cache_key(unique_id)] for unique_id in wanted if cache_key(unique_id) in cached}
+
+    missing = [unique_id for unique_id in wanted if unique_id not in found]
+    if missing:
+        fetched = fetch_contents(missing)
+        if fetched:
+            cache.set_many(
+                {cache_key(unique_id): data for unique_id, data in fetched.items()},
+                timeout=settings.CONTENT_LOOKUP_CACHE_TTL,
+            )
+        found.update(fetched)
+    return [found.get(unique_id) for unique_id in unique_ids], len(wanted) - len(missing)
+
+
+def invalidate(unique_ids):
+    """
+    Called by the ingest paths: once their transaction commits, the cached contents of `unique_ids` are dropped.
+    Author changes are not tracked, they show within `CONTENT_LOOKUP_CACHE_TTL`.
+    """
+    keys = [cache_key(unique_id) for unique_id in set(unique_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys), robust=True)
@@ -0,0 +1,296 @@
+import datetime
+
+from django.db import connection, transaction
+
+from contents.backfills import BACKFILLS, get_progress, reset
+from contents.partitions import (
+    PARTITION_SUFFIX_FORMAT, add_monthly_partitions, create_default_partition, create_monthly_partitions,
+    is_partitioned, list_partitions, month_start, partition_name, scanned_relations,
+)
+
+# `contents_content` is range partitioned on `timestamp` in place, without downtime:
+#   prepare: the partitioned table is created next to it and kept in sync by a trigger
+#   copy:    the `copy_contents_to_partitioned` backfill copies the existing rows in chunks
+#   swap:    both tables are renamed, under a lock held for a few catalog statements only
+# The unpartitioned table is kept after the swap, until it is dropped.
+CONTENT_TABLE = "contents_content"
+PARTITIONED_TABLE = "contents_content_partitioned"
+UNPARTITIONED_TABLE = "contents_content_unpartitioned"
+# Contents without a timestamp, or with one outside of the monthly partitions
+DEFAULT_PARTITION = "contents_content_default"
+SYNC_FUNCTION = "contents_content_sync_partitioned"
+COPY_BACKFILL = BACKFILLS["copy_contents_to_partitioned"]
+
+# The indexes of the partitioned table get their final name at the swap, index names are unique per schema
+NEW_INDEX_SUFFIX = "_pt"
+OLD_INDEX_SUFFIX = "_up"
+
+CREATE_SYNC_TRIGGER_SQL = f"""
+    CREATE OR REPLACE FUNCTION {SYNC_FUNCTION}() RETURNS trigger AS $$
+    BEGIN
+        -- A new timestamp can move the row to another partition, it is deleted then inserted again
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM {PARTITIONED_TABLE} WHERE id = OLD.id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO {PARTITIONED_TABLE} VALUES (NEW.*);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    CREATE TRIGGER {SYNC_FUNCTION} AFTER INSERT OR UPDATE OR DELETE ON {CONTENT_TABLE}
+        FOR EACH ROW EXECUTE FUNCTION {SYNC_FUNCTION}();
+"""
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def index_name(name, suffix):
+    # Postgres truncates identifiers to 63 characters
+    return f"{name[:63 - len(suffix)]}{suffix}"
+
+
+def table_exists(cursor, table):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [table])
+    return cursor.fetchone()[0]
+
+
+def get_indexes(cursor, table):
+    """
+    `(name, definition)` of the indexes of `table`, apart from the one of its primary key.
+    """
+    cursor.execute(
+        """
+        SELECT index.relname, pg_get_indexdef(pg_index.indexrelid)
+        FROM pg_index JOIN pg_class index ON index.oid = pg_index.indexrelid
+        WHERE pg_index.indrelid = %s::regclass AND NOT pg_index.indisprimary
+        ORDER BY index.relname
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def get_referencing_constraints(cursor, table):
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def prepare(since=None, months_ahead=2):
+    """
+    Creates the partitioned table with its partitions, indexes and foreign keys, and the trigger copying
+    every write of `contents_content` in it. Monthly partitions start at the month of `since` (default: the
+    oldest content), older contents go to the default partition.
+    """
+    if is_partitioned(CONTENT_TABLE):
+        raise PartitioningError(f"{CONTENT_TABLE} is already partitioned")
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if table_exists(cursor, PARTITIONED_TABLE):
+            raise PartitioningError(f"{PARTITIONED_TABLE} already exists, abort the conversion to start again")
+        # A foreign key can only reference a partitioned table on a unique key including the partition key
+        referencing = get_referencing_constraints(cursor, CONTENT_TABLE)
+        if referencing:
+            raise PartitioningError(
+                f"Foreign keys reference {CONTENT_TABLE}, migrate the database first: {referencing}"
+            )
+
+        if since is None:
+            cursor.execute(f"SELECT MIN(timestamp) FROM {CONTENT_TABLE}")
+            since = cursor.fetchone()[0] or datetime.date.today()
+
+        # The unique key stands in for the primary key, which would have to include the nullable timestamp
+        cursor.execute(
+            f"""
+            CREATE TABLE {PARTITIONED_TABLE} (
+                LIKE {CONTENT_TABLE} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS,
+                CONSTRAINT {CONTENT_TABLE}_id_timestamp_key UNIQUE (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+            """
+        )
+        for name, definition in get_indexes(cursor, CONTENT_TABLE):
+            definition = definition.replace(f" ON public.{CONTENT_TABLE} ", f" ON public.{PARTITIONED_TABLE} ")
+            cursor.execute(definition.replace(
+                f"INDEX {name} ", f"INDEX {index_name(name, NEW_INDEX_SUFFIX)} ", 1
+            ))
+        # Constraint names are per table, the foreign keys keep theirs
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            """,
+            [CONTENT_TABLE],
+        )
+        for name, definition in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {PARTITIONED_TABLE} ADD CONSTRAINT {name} {definition}")
+
+        partitions = create_monthly_partitions(
+            PARTITIONED_TABLE, months_ahead=months_ahead, start=since, prefix=CONTENT_TABLE
+        )
+        create_default_partition(PARTITIONED_TABLE, DEFAULT_PARTITION)
+        cursor.execute(CREATE_SYNC_TRIGGER_SQL)
+    # Chunks planned before the trigger existed could miss rows, a previous attempt is forgotten
+    reset(COPY_BACKFILL)
+    return partitions
+
+
+def get_status():
+    with connection.cursor() as cursor:
+        if is_partitioned(CONTENT_TABLE):
+            return {
+                "state": "partitioned",
+                "partitions": len(list_partitions(CONTENT_TABLE)),
+                "unpartitioned_table_kept": table_exists(cursor, UNPARTITIONED_TABLE),
+                "default_partition_future_rows": count_future_default_rows(),
+            }
+        if not table_exists(cursor, PARTITIONED_TABLE):
+            return {"state": "not_started"}
+        cursor.execute(f"SELECT (SELECT COUNT(*) FROM {CONTENT_TABLE}), (SELECT COUNT(*) FROM {PARTITIONED_TABLE})")
+        rows, copied_rows = cursor.fetchone()
+    progress = get_progress(COPY_BACKFILL)
+    return {
+        "state": "copying",
+        "chunks": progress["chunks"],
+        "completed_chunks": progress["completed"],
+        "rows": rows,
+        "copied_rows": copied_rows,
+    }
+
+
+def swap(lock_timeout="5s"):
+    """
+    Replaces `contents_content` by the partitioned table, once every copy chunk is done. The rows written since
+    the copy was planned are in both tables through the trigger. Fails without waiting behind long transactions
+    for more than `lock_timeout`.
+    """
+    progress = get_progress(COPY_BACKFILL)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {CONTENT_TABLE})")
+        copy_planned = progress["chunks"] or not cursor.fetchone()[0]
+        if not copy_planned or progress["completed"] < progress["chunks"]:
+            raise PartitioningError(
+                f"The copy is not done ({progress['completed']}/{progress['chunks']} chunks), "
+                f"run `run_backfill {COPY_BACKFILL.name}`"
+            )
+
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [lock_timeout])
+        cursor.execute(f"LOCK TABLE {CONTENT_TABLE}, {PARTITIONED_TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"DROP TRIGGER {SYNC_FUNCTION} ON {CONTENT_TABLE}")
+        cursor.execute(f"DROP FUNCTION {SYNC_FUNCTION}()")
+
+        for name, _ in get_indexes(cursor, CONTENT_TABLE):
+            cursor.execute(f"ALTER INDEX {name} RENAME TO {index_name(name, OLD_INDEX_SUFFIX)}")
+            cursor.execute(f"ALTER INDEX {index_name(name, NEW_INDEX_SUFFIX)} RENAME TO {name}")
+
+        cursor.execute(f"SELECT pg_get_serial_sequence('{CONTENT_TABLE}', 'id')")
+        old_sequence = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {CONTENT_TABLE} RENAME TO {UNPARTITIONED_TABLE}")
+        cursor.execute(f"ALTER SEQUENCE {old_sequence} RENAME TO {UNPARTITIONED_TABLE}_id_seq")
+        cursor.execute(f"ALTER TABLE {PARTITIONED_TABLE} RENAME TO {CONTENT_TABLE}")
+        cursor.execute(f"SELECT pg_get_serial_sequence('{CONTENT_TABLE}', 'id')")
+        new_sequence = cursor.fetchone()[0]
+        cursor.execute(f"ALTER SEQUENCE {new_sequence} RENAME TO {CONTENT_TABLE}_id_seq")
+        # New ids continue after the ones handed out by the old table
+        cursor.execute(
+            f"SELECT setval('{CONTENT_TABLE}_id_seq', last_value, is_called) FROM {UNPARTITIONED_TABLE}_id_seq"
+        )
+    reset(COPY_BACKFILL)
+
+
+def abort():
+    """
+    Drops the partitioned table and its trigger, before the swap.
+    """
+    if is_partitioned(CONTENT_TABLE):
+        raise PartitioningError(f"{CONTENT_TABLE} is already swapped, drop {UNPARTITIONED_TABLE} instead")
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {SYNC_FUNCTION} ON {CONTENT_TABLE}")
+        cursor.execute(f"DROP FUNCTION IF EXISTS {SYNC_FUNCTION}()")
+        cursor.execute(f"DROP TABLE IF EXISTS {PARTITIONED_TABLE}")
+    reset(COPY_BACKFILL)
+
+
+def drop_unpartitioned():
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {UNPARTITIONED_TABLE}")
+
+
+def maintain_partitions(months_ahead=2):
+    """
+    Creates the missing monthly partitions up to `months_ahead` months from now, nothing is done before the table
+    is partitioned. Returns the created partitions -> number of contents moved in them from the default partition
+    (timestamps past the last partition when they were written). Contents are never dropped, unlike the stat
+    snapshots.
+    """
+    if not is_partitioned(CONTENT_TABLE):
+        return {}
+    return add_monthly_partitions(CONTENT_TABLE, "timestamp", DEFAULT_PARTITION, months_ahead=months_ahead)
+
+
+def count_future_default_rows():
+    """
+    Contents of the default partition past the last monthly partition. They are moved when the partition of their
+    month is created, so they only stay there when their timestamp is far in the future.
+    """
+    prefix = f"{CONTENT_TABLE}_p"
+    months = [name[len(prefix):] for name in list_partitions(CONTENT_TABLE) if name.startswith(prefix)]
+    if not months:
+        return 0
+    end = month_start(datetime.datetime.strptime(max(months), PARTITION_SUFFIX_FORMAT).date(), 1)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {DEFAULT_PARTITION} WHERE timestamp >= %s", [end])
+        return cursor.fetchone()[0]
+
+
+def timeframe_querysets(timeframe):
+    """
+    `(name, queryset)` of the queries the `timeframe` filter of the content endpoints runs.
+    """
+    from contents.models import Content
+    from contents.views import apply_content_filters
+
+    query_params = {"timeframe": str(timeframe)}
+    tag_params = {**query_params, "tag": "tag"}
+    stats = apply_content_filters(Content.objects.all(), query_params)
+    return [
+        ("contents", apply_content_filters(Content.objects.all(), query_params).order_by("-id")[:100]),
+        ("contents tag filter", apply_content_filters(Content.objects.all(), tag_params).order_by("-id")[:100]),
+        ("contents stats", stats),
+        ("contents stats tag filter", apply_content_filters(Content.objects.all(), tag_params)),
+        ("authors stats", stats.values("author_id").order_by()),
+    ]
+
+
+def verify_pruning(timeframes=(1, 7, 30, 90, 365)):
+    """
+    Explains every timeframe query: a query passes when its plan only scans the monthly partitions from the
+    month of its cutoff on, and the default partition.
+    """
+    if not is_partitioned(CONTENT_TABLE):
+        raise PartitioningError(f"{CONTENT_TABLE} is not partitioned")
+    partitions = set(list_partitions(CONTENT_TABLE))
+
+    results = []
+    for timeframe in timeframes:
+        # The cutoff is `timeframe` days before the current minute, the same day or later
+        day = datetime.date.today() - datetime.timedelta(days=timeframe)
+        first_month = partition_name(CONTENT_TABLE, month_start(day))
+        for name, queryset in timeframe_querysets(timeframe):
+            expected = {
+                partition for partition in partitions
+                if partition == DEFAULT_PARTITION or partition >= first_month
+            }
+            scanned = scanned_relations(queryset) & partitions
+            results.append({
+                "query": f"{name}, timeframe={timeframe}",
+                "scanned": len(scanned),
+                "expected": len(expected),
+                "partitions": len(partitions),
+                "pruned": scanned <= expected,
+            })
+    return results
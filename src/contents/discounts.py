@@ -0,0 +1,122 @@
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Round
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from contents.models import MarketingCampaign, Order, OrderItem
+from contents.orders import invalidate_order_history
+
+DISCOUNTS_VERSION_KEY = "discounts:version"
+
+
+class InvalidDiscountCode(ValueError):
+    pass
+
+
+def normalize_code(code):
+    return code.strip().upper()
+
+
+class DiscountSnapshot:
+    """
+    The active discount codes (normalized) -> percentage, as of `version` of `DISCOUNTS_VERSION_KEY`.
+    Never changed once built: a refresh builds a new snapshot, the requests holding the previous one keep
+    reading it.
+    """
+    __slots__ = ("version", "percentages")
+
+    def __init__(self, version, percentages):
+        self.version = version
+        self.percentages = MappingProxyType(percentages)
+
+    @classmethod
+    def load(cls, version):
+        # A percentage outside of (0, 100] would make a negative discount or one larger than the price
+        campaigns = MarketingCampaign.objects.filter(
+            discount_code__isnull=False, discount_percentage__gt=0, discount_percentage__lte=100
+        ).exclude(discount_code="").values_list("discount_code", "discount_percentage")
+        return cls(version, {normalize_code(code): percentage for code, percentage in campaigns})
+
+
+_snapshot = None
+_checked_at = 0.0
+_refresh_lock = threading.Lock()
+
+
+def get_snapshot():
+    """
+    The discount snapshot of this process. The version key is read at most every
+    `DISCOUNT_VERSION_CHECK_INTERVAL` seconds, the codes are reloaded from the database only when it changed.
+    While a thread reloads them, the others keep using the previous snapshot.
+    """
+    global _snapshot, _checked_at
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _checked_at < settings.DISCOUNT_VERSION_CHECK_INTERVAL:
+        return snapshot
+    if not _refresh_lock.acquire(blocking=snapshot is None):
+        return snapshot
+    try:
+        # The version is read before the codes: a change committed during the load is reloaded on the next check
+        version = cache.get(DISCOUNTS_VERSION_KEY)
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = DiscountSnapshot.load(version)
+        _checked_at = time.monotonic()
+        return _snapshot
+    finally:
+        _refresh_lock.release()
+
+
+def get_discount_percentage(code):
+    """
+    The percentage of an active discount code, `None` for an unknown code. Codes are case insensitive.
+    """
+    return get_snapshot().percentages.get(normalize_code(code))
+
+
+def invalidate_discounts():
+    """
+    Every process reloads its snapshot on its next version check. Called when a campaign is saved or deleted,
+    code updating campaigns in bulk (`QuerySet.update`) calls it itself.
+    """
+    cache.add(DISCOUNTS_VERSION_KEY, 0, timeout=None)
+    cache.incr(DISCOUNTS_VERSION_KEY)
+
+
+def on_campaign_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_discounts)
+
+
+post_save.connect(on_campaign_changed, sender=MarketingCampaign, dispatch_uid="discounts_campaign_saved")
+post_delete.connect(on_campaign_changed, sender=MarketingCampaign, dispatch_uid="discounts_campaign_deleted")
+
+
+def apply_discount_code(code, orders):
+    """
+    Sets the `discount_amount` of every item of `orders` (an `Order` queryset) to the percentage of `code`,
+    in a single UPDATE. Returns the number of order items updated.
+    """
+    percentage = get_discount_percentage(code)
+    if percentage is None:
+        raise InvalidDiscountCode(code)
+
+    with transaction.atomic():
+        updated = OrderItem.objects.filter(order__in=orders.values("id")).update(
+            discount_amount=Round(
+                F("item_price") * F("quantity") * Value(percentage / 100),
+                2,
+                output_field=OrderItem._meta.get_field("discount_amount"),
+            ),
+            # Picked up by the incremental refresh of the sales summary
+            updated_at=timezone.now(),
+        )
+        user_ids = set(Order.objects.filter(id__in=orders.values("id")).values_list("user_id", flat=True))
+    for user_id in user_ids:
+        invalidate_order_history(user_id)
+    return updated
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from contents.models import Author, Tag
+
+KEY_PREFIX = "contents:ingest"
+STATS_KEY = f"{KEY_PREFIX}:stats"
+VERSION_KEY = f"{KEY_PREFIX}:version"
+
+# Author fields the third party api can change, payload key -> Author field
+AUTHOR_FIELDS = {
+    "unique_name": "username",
+    "full_name": "name",
+    "url": "url",
+    "title": "title",
+    "big_metadata": "big_metadata",
+    "secret_value": "secret_value",
+}
+
+
+class LRUCache:
+    """
+    Small in-process LRU, shared by the threads of the process.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+
+# One per process, they outlive the ingest runs
+AUTHOR_CACHE = LRUCache(settings.INGEST_LOCAL_CACHE_SIZE)
+TAG_CACHE = LRUCache(settings.INGEST_LOCAL_CACHE_SIZE)
+
+
+def author_fields(author_data):
+    return {field: author_data.get(key) for key, field in AUTHOR_FIELDS.items()}
+
+
+def fingerprint(fields):
+    return hashlib.sha1(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class IngestCache:
+    """
+    Resolves the authors and tags of an ingest run to their ids, without a query for the ones seen recently.
+
+    Lookups go through an in-process LRU, then redis, then the database. An author is cached with a fingerprint
+    of its mutable fields, so it is only written when the payload actually changed it. Use one instance per run:
+    `get_stats()` gives the hit ratios of that run.
+
+    Entries are keyed by the `VERSION_KEY` read when the run starts, the paths writing authors or tags outside
+    of it call `invalidate_ingest_cache()` so the next runs stop using them.
+    """
+    def __init__(self):
+        self.stats = Counter()
+        self.version = cache.get(VERSION_KEY, 0)
+        # Authors whose fields were written, their contents' api responses changed
+        self.changed_author_ids = set()
+
+    def get_author_id(self, author_data):
+        unique_id = author_data["unique_external_id"]
+        fields = author_fields(author_data)
+        current_fingerprint = fingerprint(fields)
+
+        cached = AUTHOR_CACHE.get((self.version, unique_id))
+        if cached:
+            self.stats["author_local_hits"] += 1
+        else:
+            cached = cache.get(self.author_key(unique_id))
+            if cached:
+                self.stats["author_redis_hits"] += 1
+                AUTHOR_CACHE.set((self.version, unique_id), cached)
+
+        if cached:
+            author_id, cached_fingerprint = cached
+            if cached_fingerprint != current_fingerprint:
+                self.stats["author_updates"] += 1
+                self.changed_author_ids.add(author_id)
+                Author.objects.filter(pk=author_id).update(**fields, updated_at=timezone.now())
+                self.cache_author(unique_id, author_id, current_fingerprint)
+            return author_id
+
+        self.stats["author_misses"] += 1
+        author, created = Author.objects.get_or_create(unique_id=unique_id, defaults=fields)
+        if created:
+            self.stats["author_creates"] += 1
+        elif fingerprint({field: getattr(author, field) for field in fields}) != current_fingerprint:
+            self.stats["author_updates"] += 1
+            self.changed_author_ids.add(author.pk)
+            Author.objects.filter(pk=author.pk).update(**fields, updated_at=timezone.now())
+        self.cache_author(unique_id, author.pk, current_fingerprint)
+        return author.pk
+
+    def cache_author(self, unique_id, author_id, author_fingerprint):
+        value = (author_id, author_fingerprint)
+        AUTHOR_CACHE.set((self.version, unique_id), value)
+        cache.set(self.author_key(unique_id), value, timeout=settings.INGEST_CACHE_TTL)
+
+    def get_tag_ids(self, names):
+        """
+        Ids of the tags named `names`, in the same order, the missing tags are created.
+        """
+        tag_ids = {}
+        redis_lookups = []
+        for name in set(names):
+            tag_id = TAG_CACHE.get((self.version, name))
+            if tag_id:
+                self.stats["tag_local_hits"] += 1
+                tag_ids[name] = tag_id
+            else:
+                redis_lookups.append(name)
+
+        if redis_lookups:
+            found = cache.get_many([self.tag_key(name) for name in redis_lookups])
+            for name in redis_lookups:
+                tag_id = found.get(self.tag_key(name))
+                if tag_id:
+                    self.stats["tag_redis_hits"] += 1
+                    tag_ids[name] = tag_id
+                    TAG_CACHE.set((self.version, name), tag_id)
+
+        for name in set(names) - set(tag_ids):
+            self.stats["tag_misses"] += 1
+            # Tag names may still be duplicated (see the `merge_duplicate_tags` backfill), the oldest one is used
+            tag = Tag.objects.filter(name=name).order_by("pk").first() or Tag.objects.create(name=name)
+            tag_ids[name] = tag.pk
+            TAG_CACHE.set((self.version, name), tag.pk)
+            cache.set(self.tag_key(name), tag.pk, timeout=settings.INGEST_CACHE_TTL)
+        return [tag_ids[name] for name in names]
+
+    def author_key(self, unique_id):
+        return f"{KEY_PREFIX}:{self.version}:author:{unique_id}"
+
+    def tag_key(self, name):
+        return f"{KEY_PREFIX}:{self.version}:tag:{name}"
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        for kind in ("author", "tag"):
+            local, redis = self.stats[f"{kind}_local_hits"], self.stats[f"{kind}_redis_hits"]
+            lookups = local + redis + self.stats[f"{kind}_misses"]
+            if lookups:
+                stats[f"{kind}_local_hit_ratio"] = round(local / lookups, 3)
+                stats[f"{kind}_hit_ratio"] = round((local + redis) / lookups, 3)
+        return stats
+
+    def flush_stats(self):
+        """
+        Adds the counters of this run to the totals of `get_total_stats`, and starts a new run.
+        """
+        if self.stats:
+            pipeline = get_redis_connection("default").pipeline(transaction=False)
+            for name, value in self.stats.items():
+                pipeline.hincrby(STATS_KEY, name, value)
+            pipeline.execute()
+        self.stats = Counter()
+
+
+def invalidate_ingest_cache():
+    """
+    The next ingest runs stop using the cached authors and tags, the previous entries expire with
+    `INGEST_CACHE_TTL`. Called by the paths writing authors or tags in SQL (bulk loads, backfills) and when an
+    author or tag is deleted, a cached id could point to a deleted row.
+    """
+    cache.add(VERSION_KEY, 0, timeout=None)
+    cache.incr(VERSION_KEY)
+
+
+def on_author_or_tag_deleted(sender, **kwargs):
+    transaction.on_commit(invalidate_ingest_cache)
+
+
+post_delete.connect(on_author_or_tag_deleted, sender=Author, dispatch_uid="ingest_cache_author_deleted")
+post_delete.connect(on_author_or_tag_deleted, sender=Tag, dispatch_uid="ingest_cache_tag_deleted")
+
+
+def get_total_stats():
+    stats = get_redis_connection("default").hgetall(STATS_KEY)
+    return {name.decode(): int(value) for name, value in stats.items()}
@@ -0,0 +1,124 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from contents.models import Order, OrderItem, Product, WarehouseStock
+from contents.orders import invalidate_order_history
+from contents.tasks import notify_reorder_point
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+        super().__init__(f"Not enough stock of product {product_id} for {quantity} units")
+
+
+class InvalidOrderLine(ValueError):
+    pass
+
+
+def place_order(user, lines, shipping_method, order_status="placed"):
+    """
+    Reserves the stock of every `(product_id, quantity)` line and creates the order with its items,
+    all in one transaction: either every line is reserved or nothing is. Lines with a non-positive quantity
+    or an unknown product raise `InvalidOrderLine` before anything is locked.
+
+    The product totals are reserved with conditional updates (`product_stock >= quantity`), so two orders
+    can never both take the last units. Rows are locked in product id order, which keeps multi-line orders
+    on the same products from deadlocking each other.
+    """
+    quantities = Counter()
+    for product_id, quantity in lines:
+        # A negative line would put the units back in stock
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise InvalidOrderLine(f"Invalid quantity {quantity!r} of product {product_id}")
+        quantities[product_id] += quantity
+    if not quantities:
+        raise InvalidOrderLine("An order needs at least one line")
+    product_ids = sorted(quantities)
+    products = Product.objects.in_bulk(product_ids)
+    unknown_ids = [product_id for product_id in product_ids if product_id not in products]
+    if unknown_ids:
+        raise InvalidOrderLine(f"Unknown products {unknown_ids}")
+
+    reorder_events = []
+    with transaction.atomic():
+        for product_id in product_ids:
+            quantity = quantities[product_id]
+            reserved = Product.objects.filter(pk=product_id, product_stock__gte=quantity).update(
+                product_stock=F("product_stock") - quantity
+            )
+            if not reserved:
+                raise InsufficientStock(product_id, quantity)
+            reorder_events += allocate_from_warehouses(product_id, quantity)
+
+        order = Order.objects.create(
+            order_id=0,
+            user=user,
+            order_date=timezone.now(),
+            order_status=order_status,
+            shipping_method=shipping_method,
+        )
+        # Orders placed here have no external id, they use their own
+        Order.objects.filter(pk=order.pk).update(order_id=order.pk)
+        order.order_id = order.pk
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=product_id,
+                quantity=quantities[product_id],
+                item_price=products[product_id].product_price,
+                list_price=products[product_id].product_price,
+            )
+            for product_id in product_ids
+        ])
+
+        transaction.on_commit(lambda: invalidate_order_history(user.pk), robust=True)
+        # `robust`: the order is committed at that point, a broker outage must not make it look failed
+        for event in reorder_events:
+            transaction.on_commit(lambda event=event: notify_reorder_point.delay(**event), robust=True)
+    return order
+
+
+def allocate_from_warehouses(product_id, quantity):
+    """
+    Takes `quantity` units of the product from its warehouses, the fullest first.
+    Returns the reorder events of the warehouses that went below their reorder point.
+
+    Rows locked by another order are skipped in the first pass so it can use other warehouses,
+    the second pass waits for them when the unlocked ones were not enough.
+    """
+    reorder_events = []
+    allocated_ids = []
+    remaining = quantity
+    for skip_locked in (True, False):
+        stocks = (
+            WarehouseStock.objects.select_for_update(skip_locked=skip_locked, of=("self",))
+            .select_related("warehouse")
+            .filter(product_id=product_id, quantity__gt=0)
+            .exclude(pk__in=allocated_ids)
+            .order_by("-quantity", "pk")
+        )
+        for stock in stocks:
+            taken = min(stock.quantity, remaining)
+            WarehouseStock.objects.filter(pk=stock.pk).update(quantity=F("quantity") - taken)
+            allocated_ids.append(stock.pk)
+            remaining -= taken
+
+            reorder_point = stock.warehouse.reorder_point
+            if stock.quantity >= reorder_point > stock.quantity - taken:
+                reorder_events.append({
+                    "warehouse_id": stock.warehouse_id,
+                    "product_id": product_id,
+                    "quantity": stock.quantity - taken,
+                    "reorder_point": reorder_point,
+                })
+            if not remaining:
+                return reorder_events
+
+    # The product total and the warehouses are out of sync, the transaction is rolled back
+    raise InsufficientStock(product_id, quantity)
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+
+from contents.models import Content, ContentTag
+
+CHANNEL = "contents_feed"
+# NOTIFY payloads must stay under 8000 bytes, summaries are sent in as many notifications as needed
+MAX_PAYLOAD_SIZE = 7000
+SUMMARY_TITLE_LENGTH = 200
+# Sent to a subscriber that missed events (its queue overflowed, or the listener reconnected)
+RESYNC = object()
+
+
+def get_summaries(content_ids):
+    tags = {}
+    for content_id, name in ContentTag.objects.filter(content_id__in=content_ids).values_list("content_id", "tag__name"):
+        tags.setdefault(content_id, set()).add(name)
+
+    # Tags are read apart: grouping by `id` alone is not allowed once `contents_content` is partitioned
+    summaries = Content.objects.filter(id__in=content_ids).values(
+        "id", "author_id", "title", "url", "thumbnail_url", "timestamp",
+        "like_count", "comment_count", "share_count", "view_count",
+        author_username=F("author__username"),
+    ).order_by("id")
+    for summary in summaries:
+        summary["title"] = (summary["title"] or "")[:SUMMARY_TITLE_LENGTH]
+        summary["timestamp"] = summary["timestamp"].isoformat() if summary["timestamp"] else None
+        summary["tags"] = sorted(tags.get(summary["id"], ()))
+        yield summary
+
+
+def send_summaries(content_ids):
+    payloads, batch, size = [], [], 2
+    for summary in get_summaries(content_ids):
+        encoded = json.dumps(summary)
+        if batch and size + len(encoded) + 1 > MAX_PAYLOAD_SIZE:
+            payloads.append(f"[{','.join(batch)}]")
+            batch, size = [], 2
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        payloads.append(f"[{','.join(batch)}]")
+
+    with connection.cursor() as cursor:
+        for payload in payloads:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+
+def publish_contents(content_ids):
+    """
+    Called by the ingest paths: once their transaction commits, the summaries of the contents are sent to the
+    feed subscribers of every process.
+    """
+    content_ids = list(content_ids)
+    if content_ids:
+        # A failed notification is logged, it does not fail the ingest
+        transaction.on_commit(lambda: send_summaries(content_ids), robust=True)
+
+
+class Subscriber:
+    """
+    An SSE connection, with its `author_id` / `tag` filter. Events are queued on its event loop, at most
+    `CONTENT_FEED_QUEUE_SIZE`: a client that does not keep up is sent a resync instead of buffering forever.
+    """
+    def __init__(self, loop, author_id=None, tag=None):
+        self.loop = loop
+        self.author_id = author_id
+        self.tag = tag.lower() if tag else None
+        self.queue = asyncio.Queue(maxsize=settings.CONTENT_FEED_QUEUE_SIZE)
+
+    def matches(self, summary):
+        if self.author_id is not None and summary["author_id"] != self.author_id:
+            return False
+        return self.tag is None or self.tag in (tag.lower() for tag in summary["tags"])
+
+    def put(self, event):
+        # Runs on the subscriber's loop
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = RESYNC
+        self.queue.put_nowait(event)
+
+
+class FeedListener:
+    """
+    The single LISTEN connection of a process, started with the first subscriber. It runs in a thread and
+    hands every notification to the event loops of the matching subscribers.
+    """
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="contents-feed-listener", daemon=True)
+                self.thread.start()
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def dispatch(self, summaries):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            for summary in summaries:
+                if subscriber.matches(summary):
+                    subscriber.loop.call_soon_threadsafe(subscriber.put, summary)
+
+    def resync_all(self):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.put, RESYNC)
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception as e:
+                print(f"Contents feed listener disconnected: {e!r}")
+            # Notifications sent while reconnecting are lost, the subscribers start over from the contents api
+            self.resync_all()
+            time.sleep(settings.CONTENT_FEED_RECONNECT_DELAY)
+
+    def connect(self):
+        # A connection of its own, never one of the pool: it is held as long as the process runs
+        wrapper = connections["default"]
+        if settings.CONTENT_FEED_DATABASE_URL:
+            return wrapper.Database.connect(settings.CONTENT_FEED_DATABASE_URL, autocommit=True)
+        params = wrapper.get_connection_params()
+        # Django's cursor classes are only meant for its own connections
+        params.pop("cursor_factory", None)
+        return wrapper.Database.connect(**params, autocommit=True)
+
+    def listen(self):
+        with self.connect() as listen_connection:
+            listen_connection.execute(f"LISTEN {CHANNEL}")
+            while True:
+                # Returns every `CONTENT_FEED_HEARTBEAT` seconds when nothing is sent, a dead connection raises
+                for notify in listen_connection.notifies(timeout=settings.CONTENT_FEED_HEARTBEAT):
+                    self.dispatch(json.loads(notify.payload))
+
+
+listener = FeedListener()
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream(author_id=None, tag=None):
+    """
+    The `text/event-stream` of a subscriber: `content` events, a comment line every `CONTENT_FEED_HEARTBEAT`
+    seconds to keep proxies from closing the connection, and a final `resync` event when events were lost
+    (the client then reloads the first page of the contents api and reconnects).
+    """
+    subscriber = Subscriber(asyncio.get_running_loop(), author_id=author_id, tag=tag)
+    listener.subscribe(subscriber)
+    try:
+        yield f"retry: {settings.CONTENT_FEED_RECONNECT_DELAY * 1000}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), settings.CONTENT_FEED_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is RESYNC:
+                yield format_event("resync", {})
+                return
+            yield format_event("content", event)
+    finally:
+        listener.unsubscribe(subscriber)
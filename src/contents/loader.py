@@ -0,0 +1,260 @@
+import csv
+import datetime
+import io
+import json
+import re
+
+from django.db import connection, transaction
+
+from contents import conditional, content_lookup
+from contents.ingest_cache import invalidate_ingest_cache
+
+# Records are staged as raw json, in the shape of the third party api (see `ContentPostSerializer`),
+# every field is then read in SQL so merging a batch is a handful of set based statements.
+CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS contents_load_staging (seq bigint, record jsonb) ON COMMIT DELETE ROWS
+"""
+
+COPY_STAGING_SQL = "COPY contents_load_staging (seq, record) FROM STDIN WITH (FORMAT csv)"
+
+# The last record of an id in the batch wins
+MERGE_AUTHORS_SQL = """
+    INSERT INTO contents_author
+        (unique_id, username, name, url, title, big_metadata, secret_value, followers, created_at, updated_at)
+    SELECT DISTINCT ON (author->>'unique_external_id')
+        author->>'unique_external_id', COALESCE(author->>'unique_name', ''), COALESCE(author->>'full_name', ''),
+        COALESCE(author->>'url', ''), COALESCE(author->>'title', ''), author->'big_metadata',
+        author->'secret_value', 0, now(), now()
+    FROM (SELECT seq, record->'author' AS author FROM contents_load_staging) staged
+    WHERE author->>'unique_external_id' IS NOT NULL
+    ORDER BY author->>'unique_external_id', seq DESC
+    ON CONFLICT (unique_id) DO UPDATE SET
+        username = EXCLUDED.username, name = EXCLUDED.name, url = EXCLUDED.url, title = EXCLUDED.title,
+        big_metadata = EXCLUDED.big_metadata, secret_value = EXCLUDED.secret_value, updated_at = now()
+    WHERE (contents_author.username, contents_author.name, contents_author.url, contents_author.title,
+           contents_author.big_metadata, contents_author.secret_value)
+          IS DISTINCT FROM
+          (EXCLUDED.username, EXCLUDED.name, EXCLUDED.url, EXCLUDED.title,
+           EXCLUDED.big_metadata, EXCLUDED.secret_value)
+    RETURNING xmax = 0 AS inserted
+"""
+
+STAGED_CONTENTS_CTE = """
+    WITH staged AS (
+        SELECT DISTINCT ON (record->>'unq_external_id')
+            record->>'unq_external_id' AS unique_id,
+            a.id AS author_id,
+            COALESCE(record->>'url', '') AS url,
+            COALESCE(record->>'title', '') AS title,
+            record->>'thumbnail_view_url' AS thumbnail_url,
+            (record->>'timestamp')::timestamptz AS timestamp,
+            COALESCE((record->'stats'->>'likes')::bigint, 0) AS like_count,
+            COALESCE((record->'stats'->>'comments')::bigint, 0) AS comment_count,
+            COALESCE((record->'stats'->>'views')::bigint, 0) AS view_count,
+            COALESCE((record->'stats'->>'shares')::bigint, 0) AS share_count,
+            record->'big_metadata' AS big_metadata,
+            record->'secret_value' AS secret_value
+        FROM contents_load_staging s
+        JOIN contents_author a ON a.unique_id = s.record->'author'->>'unique_external_id'
+        WHERE record->>'unq_external_id' IS NOT NULL
+        ORDER BY record->>'unq_external_id', seq DESC
+    )
+"""
+
+# `Content.unique_id` is not unique, so there is no conflict target: existing contents are updated
+# by a join, then the ids that are still missing are inserted. Both record a stat snapshot.
+UPDATE_CONTENTS_SQL = STAGED_CONTENTS_CTE + """
+    , updated AS (
+        UPDATE contents_content c SET
+            author_id = s.author_id, url = s.url, title = s.title, thumbnail_url = s.thumbnail_url,
+            timestamp = s.timestamp, like_count = s.like_count, comment_count = s.comment_count,
+            view_count = s.view_count, share_count = s.share_count, big_metadata = s.big_metadata,
+            secret_value = s.secret_value, updated_at = now()
+        FROM staged s
+        WHERE c.unique_id = s.unique_id
+          AND (c.author_id, c.url, c.title, c.thumbnail_url, c.timestamp, c.like_count, c.comment_count,
+               c.view_count, c.share_count, c.big_metadata, c.secret_value)
+              IS DISTINCT FROM
+              (s.author_id, s.url, s.title, s.thumbnail_url, s.timestamp, s.like_count, s.comment_count,
+               s.view_count, s.share_count, s.big_metadata, s.secret_value)
+        RETURNING c.id, c.like_count, c.comment_count, c.view_count, c.share_count, c.updated_at
+    )
+    INSERT INTO contents_contentstatsnapshot
+        (content_id, captured_at, like_count, comment_count, view_count, share_count)
+    SELECT id, updated_at, like_count, comment_count, view_count, share_count FROM updated
+"""
+
+INSERT_CONTENTS_SQL = STAGED_CONTENTS_CTE + """
+    , inserted AS (
+        INSERT INTO contents_content
+            (unique_id, author_id, url, title, thumbnail_url, timestamp, like_count, comment_count,
+             view_count, share_count, big_metadata, secret_value, created_at, updated_at,
+             is_pushed, push_attempts, push_failure)
+        SELECT s.unique_id, s.author_id, s.url, s.title, s.thumbnail_url, s.timestamp, s.like_count,
+               s.comment_count, s.view_count, s.share_count, s.big_metadata, s.secret_value, now(), now(),
+               false, 0, ''
+        FROM staged s
+        WHERE NOT EXISTS (SELECT 1 FROM contents_content c WHERE c.unique_id = s.unique_id)
+        RETURNING id, like_count, comment_count, view_count, share_count, updated_at
+    )
+    INSERT INTO contents_contentstatsnapshot
+        (content_id, captured_at, like_count, comment_count, view_count, share_count)
+    SELECT id, updated_at, like_count, comment_count, view_count, share_count FROM inserted
+"""
+
+STAGED_TAGS_CTE = """
+    WITH staged_tags AS (
+        SELECT DISTINCT record->>'unq_external_id' AS content_unique_id, tag.name
+        FROM contents_load_staging, jsonb_array_elements_text(
+            CASE WHEN jsonb_typeof(record->'hashtags') = 'array' THEN record->'hashtags' ELSE '[]' END
+        ) AS tag(name)
+        WHERE tag.name <> ''
+    )
+"""
+
+# Tag names are not unique yet (see the `merge_duplicate_tags` backfill), the oldest tag of a name is used
+INSERT_TAGS_SQL = STAGED_TAGS_CTE + """
+    INSERT INTO contents_tag (name)
+    SELECT DISTINCT name FROM staged_tags
+    WHERE NOT EXISTS (SELECT 1 FROM contents_tag t WHERE t.name = staged_tags.name)
+"""
+
+INSERT_CONTENT_TAGS_SQL = STAGED_TAGS_CTE + """
+    INSERT INTO contents_contenttag (content_id, tag_id)
+    SELECT DISTINCT c.id, t.id
+    FROM staged_tags st
+    JOIN contents_content c ON c.unique_id = st.content_unique_id
+    JOIN (SELECT name, MIN(id) AS id FROM contents_tag GROUP BY name) t ON t.name = st.name
+    WHERE NOT EXISTS (
+        SELECT 1 FROM contents_contenttag ct WHERE ct.content_id = c.id AND ct.tag_id = t.id
+    )
+"""
+
+# Flat CSV columns -> key of the record in the api shape
+CSV_AUTHOR_PREFIX = "author_"
+CSV_STAT_COLUMNS = ("likes", "comments", "views", "shares")
+
+# What the batch SQL casts to bigint
+STAT_NAMES = CSV_STAT_COLUMNS
+BIGINT_MIN, BIGINT_MAX = -2 ** 63, 2 ** 63 - 1
+BIGINT_PATTERN = re.compile(r"[+-]?\d+")
+CSV_JSON_COLUMNS = ("big_metadata", "secret_value", "author_big_metadata", "author_secret_value")
+
+
+def read_ndjson(file):
+    """
+    Yields `(line_number, record)`, the lines that are not a json object are yielded with a None record.
+    """
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def read_csv(file):
+    """
+    Yields `(line_number, record)` from a CSV with a header row. Author columns are prefixed with `author_`,
+    the stats are the `likes`, `comments`, `views` and `shares` columns and `hashtags` are separated by `|`.
+    """
+    for line_number, row in enumerate(csv.DictReader(file), start=2):
+        record, author, stats = {}, {}, {}
+        try:
+            for column, value in row.items():
+                if column is None or value is None or value == "":
+                    continue
+                if column in CSV_JSON_COLUMNS:
+                    value = json.loads(value)
+                if column in CSV_STAT_COLUMNS:
+                    stats[column] = int(value)
+                elif column == "hashtags":
+                    record["hashtags"] = [tag.strip() for tag in value.split("|") if tag.strip()]
+                elif column.startswith(CSV_AUTHOR_PREFIX):
+                    author[column[len(CSV_AUTHOR_PREFIX):]] = value
+                else:
+                    record[column] = value
+        except ValueError:
+            yield line_number, None
+            continue
+        record["author"] = author
+        record["stats"] = stats
+        yield line_number, record
+
+
+def is_bigint(value):
+    if isinstance(value, str) and BIGINT_PATTERN.fullmatch(value.strip()):
+        value = int(value)
+    return isinstance(value, int) and not isinstance(value, bool) and BIGINT_MIN <= value <= BIGINT_MAX
+
+
+def clean_record(record):
+    """
+    Returns why the batch SQL could not merge `record`, `None` when it can (one record failing a cast in SQL
+    would abort its whole batch). The timestamp is rewritten in the ISO format postgres reads.
+    """
+    if not isinstance(record.get("unq_external_id"), str) or not record["unq_external_id"]:
+        return "missing unq_external_id"
+    author = record.get("author")
+    if not isinstance(author, dict) or not isinstance(author.get("unique_external_id"), str) \
+            or not author["unique_external_id"]:
+        return "missing author.unique_external_id"
+    stats = record.get("stats")
+    if stats is not None and not isinstance(stats, dict):
+        return "stats is not an object"
+    for name, value in (stats or {}).items():
+        if name in STAT_NAMES and value is not None and not is_bigint(value):
+            return f"stats.{name} is not an integer"
+    timestamp = record.get("timestamp")
+    if timestamp is not None:
+        try:
+            record["timestamp"] = datetime.datetime.fromisoformat(timestamp).isoformat()
+        except (TypeError, ValueError):
+            return "timestamp is not an ISO 8601 date"
+    return None
+
+
+def copy_batch(cursor, batch):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for seq, record in batch:
+        writer.writerow([seq, json.dumps(record)])
+    with cursor.copy(COPY_STAGING_SQL) as copy:
+        copy.write(buffer.getvalue())
+
+
+def merge_batch(batch):
+    """
+    Copies the `(seq, record)` batch in the staging table and merges it, in one transaction.
+    Returns the counts of rows written per table.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(CREATE_STAGING_SQL)
+        copy_batch(cursor, batch)
+        cursor.execute("ANALYZE contents_load_staging")
+
+        cursor.execute(MERGE_AUTHORS_SQL)
+        authors = [inserted for inserted, in cursor.fetchall()]
+        cursor.execute(UPDATE_CONTENTS_SQL)
+        updated_contents = cursor.rowcount
+        cursor.execute(INSERT_CONTENTS_SQL)
+        inserted_contents = cursor.rowcount
+        cursor.execute(INSERT_TAGS_SQL)
+        tags = cursor.rowcount
+        cursor.execute(INSERT_CONTENT_TAGS_SQL)
+        content_tags = cursor.rowcount
+    # Any author's contents may have changed, every conditional GET of the contents api stops matching
+    conditional.bump_data_epoch()
+    # The authors and tags were written without the ingest cache, its fingerprints may be stale
+    invalidate_ingest_cache()
+    content_lookup.invalidate(record["unq_external_id"] for _, record in batch if record.get("unq_external_id"))
+    return {
+        "authors_inserted": sum(authors),
+        "authors_updated": len(authors) - sum(authors),
+        "contents_inserted": inserted_contents,
+        "contents_updated": updated_contents,
+        "tags_inserted": tags,
+        "content_tags_inserted": content_tags,
+    }
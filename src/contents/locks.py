@@ -0,0 +1,118 @@
+import threading
+import uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+# Only touch the key if we still own it, otherwise a slow run could extend or
+# delete a lock that already expired and was taken over by another worker.
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLock:
+    """
+    Singleton lock stored in redis (`SET NX PX`), renewed by a heartbeat thread while it is held.
+    """
+
+    def __init__(self, key, ttl=None, heartbeat_interval=None):
+        self.redis = get_redis_connection("default")
+        self.key = key
+        self.ttl = ttl or settings.CONTENT_PULL_LOCK_TTL
+        self.heartbeat_interval = heartbeat_interval or self.ttl / 3
+        self.token = uuid.uuid4().hex
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread = None
+
+    def acquire(self):
+        acquired = self.redis.set(self.key, self.token, nx=True, px=int(self.ttl * 1000))
+        if acquired:
+            self._start_heartbeat()
+        return bool(acquired)
+
+    def release(self):
+        self._stop_heartbeat.set()
+        if self._heartbeat_thread:
+            self._heartbeat_thread.join()
+        self.redis.eval(RELEASE_SCRIPT, 1, self.key, self.token)
+
+    def renew(self):
+        return bool(self.redis.eval(RENEW_SCRIPT, 1, self.key, self.token, int(self.ttl * 1000)))
+
+    def _start_heartbeat(self):
+        self._stop_heartbeat.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._heartbeat_thread.start()
+
+    def _heartbeat(self):
+        while not self._stop_heartbeat.wait(self.heartbeat_interval):
+            if not self.renew():
+                print(f"Lost lock {self.key}, stopping heartbeat")
+                return
+
+
+class PullCoordinator:
+    """
+    Splits the pages of one pull cycle between the runs that overlap with it.
+
+    The first run to grab the singleton lock starts a new cycle (generation). Runs fired by beat while that
+    run is still going join the same generation instead of starting over, and every page is processed by the
+    run that claims it first. Once a run sees the last page, the others stop as soon as they pass it.
+    """
+    KEY_PREFIX = "contents:pull"
+
+    def __init__(self):
+        self.redis = get_redis_connection("default")
+        self.lock = RedisLock(f"{self.KEY_PREFIX}:lock")
+        self.claim_ttl = settings.CONTENT_PULL_CLAIM_TTL
+        self.role = None
+        self.generation = None
+
+    def start(self):
+        if self.lock.acquire():
+            self.role = "leader"
+            self.generation = self.redis.incr(f"{self.KEY_PREFIX}:generation")
+        else:
+            self.role = "helper"
+            self.generation = int(self.redis.get(f"{self.KEY_PREFIX}:generation") or 0)
+        return self.generation
+
+    def finish(self):
+        if self.role == "leader":
+            self.lock.release()
+
+    def claim_page(self, page_number):
+        """
+        Returns `True` if this run owns the page and should process it.
+        """
+        claimed = self.redis.set(
+            self._key("page", page_number), self.lock.token, nx=True, ex=self.claim_ttl
+        )
+        self.redis.hincrby(self._key("stats"), "claimed" if claimed else "skipped", 1)
+        self.redis.expire(self._key("stats"), self.claim_ttl)
+        return bool(claimed)
+
+    def is_past_last_page(self, page_number):
+        last_page = self.redis.get(self._key("last_page"))
+        return last_page is not None and page_number > int(last_page)
+
+    def mark_last_page(self, page_number):
+        self.redis.set(self._key("last_page"), page_number, ex=self.claim_ttl)
+
+    def get_stats(self):
+        stats = self.redis.hgetall(self._key("stats"))
+        return {key.decode(): int(value) for key, value in stats.items()}
+
+    def _key(self, *parts):
+        return ":".join([self.KEY_PREFIX, str(self.generation), *map(str, parts)])
@@ -0,0 +1,113 @@
+import copy
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import environ
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import ConnectionHandler
+
+# The first page of the contents api
+DEFAULT_QUERY = "SELECT * FROM contents_content ORDER BY id DESC LIMIT 20"
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests per second of concurrent threads that each run requests the way Django does: take the thread's "
+        "connection, run a query, release the connection. Compares a new connection per request (`none`), "
+        "persistent connections (`persistent`), the psycopg pool (`pool`) and, with --pgbouncer-url, persistent "
+        "connections through pgbouncer (`pgbouncer`)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=16, help="Threads running the requests")
+        parser.add_argument("--pool-size", type=int, default=10, help="pool: most connections opened")
+        parser.add_argument("--query", default=DEFAULT_QUERY, help="The query of every request")
+        parser.add_argument("--modes", default="none,persistent,pool", help="Comma separated modes to run")
+        parser.add_argument("--pgbouncer-url", help="pgbouncer (transaction pooling) url of the database")
+
+    def handle(self, *args, **options):
+        modes = options["modes"].split(",")
+        if options["pgbouncer_url"] and "pgbouncer" not in modes:
+            modes.append("pgbouncer")
+        databases = {mode: self.get_database(mode, options) for mode in modes}
+
+        self.stdout.write(
+            f"{options['requests']} requests, {options['concurrency']} threads, query: {options['query']}"
+        )
+        self.stdout.write(f"{'mode':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'backends':>10}")
+        for mode, database in databases.items():
+            result = self.run(f"benchmark_{mode}", database, options)
+            self.stdout.write(
+                f"{mode:<12}{result['rps']:>10.0f}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+                f"{result['max']:>10.2f}{result['backends']:>10}"
+            )
+
+    def get_database(self, mode, options):
+        database = copy.deepcopy(settings.DATABASES["default"])
+        database["OPTIONS"] = {key: value for key, value in database.get("OPTIONS", {}).items() if key != "pool"}
+        database["CONN_MAX_AGE"] = 0
+        database["CONN_HEALTH_CHECKS"] = True
+        if mode == "persistent":
+            database["CONN_MAX_AGE"] = None
+        elif mode == "pool":
+            database["OPTIONS"]["pool"] = {"min_size": 1, "max_size": options["pool_size"]}
+        elif mode == "pgbouncer":
+            if not options["pgbouncer_url"]:
+                raise CommandError("The pgbouncer mode needs --pgbouncer-url")
+            database.update(environ.Env.db_url_config(options["pgbouncer_url"]))
+            database["CONN_MAX_AGE"] = None
+            database["DISABLE_SERVER_SIDE_CURSORS"] = True
+        elif mode != "none":
+            raise CommandError(f"Unknown mode: {mode}")
+        return database
+
+    def run(self, alias, database, options):
+        # Pools are kept per alias, the benchmark ones must not be the pool of `default`
+        handler = ConnectionHandler({"default": settings.DATABASES["default"], alias: database})
+        timings, backends = [], set()
+        lock = threading.Lock()
+
+        def request():
+            started = time.perf_counter()
+            connection = handler[alias]
+            # What the request_started / request_finished signals do
+            connection.close_if_unusable_or_obsolete()
+            with connection.cursor() as cursor:
+                cursor.execute(options["query"])
+                cursor.fetchall()
+                cursor.execute("SELECT pg_backend_pid()")
+                backend = cursor.fetchone()[0]
+            connection.close_if_unusable_or_obsolete()
+            with lock:
+                timings.append((time.perf_counter() - started) * 1000)
+                backends.add(backend)
+
+        def worker(count):
+            try:
+                for _ in range(count):
+                    request()
+            finally:
+                handler[alias].close()
+
+        concurrency, total = options["concurrency"], options["requests"]
+        counts = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, counts))
+        elapsed = time.perf_counter() - started
+        if database["OPTIONS"].get("pool"):
+            handler[alias].close_pool()
+
+        timings.sort()
+        return {
+            "rps": len(timings) / elapsed,
+            "p50": statistics.median(timings),
+            "p95": timings[int(len(timings) * 0.95) - 1],
+            "max": timings[-1],
+            # Server connections the requests ran on
+            "backends": len(backends),
+        }
@@ -0,0 +1,156 @@
+import datetime
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from contents.models import OrderItem
+from contents.reports import get_sales_report, refresh_sales_summary
+
+SEED_USERS_SQL = """
+    INSERT INTO contents_user
+        (password, is_superuser, is_staff, is_active, date_joined, username, email, password_hash,
+         first_name, last_name, date_of_birth, phone_number, is_admin, created_at, updated_at)
+    SELECT '', false, false, true, now(), 'bench_user_' || g, 'bench_user_' || g || '@example.com', '',
+           'Bench', 'User', DATE '1990-01-01', '', false, now(), now()
+    FROM generate_series(1, %(users)s) g
+    ON CONFLICT DO NOTHING
+"""
+
+SEED_DIMENSIONS_SQL = [
+    """
+    INSERT INTO contents_category (name, parent_id, created_at, updated_at)
+    SELECT 'Bench category ' || g, NULL, now(), now() FROM generate_series(1, 25) g
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO contents_brand (name, created_at, updated_at)
+    SELECT 'Bench brand ' || g, now(), now() FROM generate_series(1, 80) g
+    ON CONFLICT DO NOTHING
+    """,
+]
+
+SEED_PRODUCTS_SQL = """
+    INSERT INTO contents_product
+        (product_id, product_name, product_description, product_price, category_id, brand_id,
+         product_stock, created_at, updated_at)
+    SELECT (SELECT COALESCE(MAX(product_id), 0) FROM contents_product) + g, 'Bench product ' || g, '',
+           round((random() * 200 + 1)::numeric, 2), categories.ids[1 + g %% 25], brands.ids[1 + g %% 80],
+           1000, now(), now()
+    FROM generate_series(1, %(products)s) g,
+         (SELECT array_agg(id) AS ids FROM contents_category WHERE name LIKE 'Bench category %%') categories,
+         (SELECT array_agg(id) AS ids FROM contents_brand WHERE name LIKE 'Bench brand %%') brands
+"""
+
+SEED_ORDERS_SQL = """
+    INSERT INTO contents_order
+        (order_id, user_id, order_date, order_status, shipping_method, created_at, updated_at)
+    SELECT g, users.min_id + (g %% users.total), now() - random() * interval '730 days', 'delivered', 'standard',
+           now(), now()
+    FROM generate_series(%(start)s, %(end)s) g,
+         (SELECT min(user_id) AS min_id, count(*) AS total FROM contents_user
+          WHERE username LIKE 'bench\\_user\\_%%') users
+"""
+
+SEED_ORDER_ITEMS_SQL = """
+    INSERT INTO contents_orderitem
+        (order_id, product_id, quantity, item_price, list_price, discount_amount, created_at, updated_at)
+    SELECT orders.min_id + (g %% orders.total), products.min_id + (g * 7919 %% products.total),
+           1 + (g %% 5), round((random() * 200 + 1)::numeric, 2), round((random() * 200 + 1)::numeric, 2),
+           CASE WHEN g %% 10 = 0 THEN round((random() * 20)::numeric, 2) ELSE 0 END, now(), now()
+    FROM generate_series(%(start)s, %(end)s) g,
+         (SELECT min(id) AS min_id, count(*) AS total FROM contents_order
+          WHERE shipping_method = 'standard' AND order_status = 'delivered') orders,
+         (SELECT min(id) AS min_id, count(*) AS total FROM contents_product
+          WHERE product_name LIKE 'Bench product %%') products
+"""
+
+RAW_REPORT_SQL = """
+    SELECT (o.order_date AT TIME ZONE 'UTC')::date AS day,
+           SUM(oi.item_price * oi.quantity - oi.discount_amount), SUM(oi.quantity), SUM(oi.discount_amount)
+    FROM contents_orderitem oi
+    JOIN contents_order o ON o.id = oi.order_id
+    JOIN contents_product p ON p.id = oi.product_id
+    WHERE o.order_date >= now() - interval '90 days'
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic order dataset (10M order items by default) and compares the sales report "
+        "read from the raw OrderItem/Order join against the DailySalesSummary table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--order-items", type=int, default=10_000_000)
+        parser.add_argument("--items-per-order", type=int, default=4)
+        parser.add_argument("--products", type=int, default=50_000)
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--batch-size", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--skip-seed", action="store_true", help="Reuse the dataset of a previous run")
+
+    def handle(self, *args, **options):
+        if not options["skip_seed"]:
+            self.seed(options)
+
+        repeat = options["repeat"]
+        self.report("raw join, last 90 days by day", repeat, self.run_raw_report)
+
+        started = time.perf_counter()
+        refresh_sales_summary(full=True)
+        self.stdout.write(f"full summary refresh: {time.perf_counter() - started:.2f}s")
+
+        start = timezone.now().date() - datetime.timedelta(days=90)
+        self.report("summary, last 90 days by day", repeat, lambda: get_sales_report("day", start=start))
+        self.report("summary, all days by category", repeat, lambda: get_sales_report("category"))
+        self.report("summary, all days by brand", repeat, lambda: get_sales_report("brand"))
+
+        changed = list(OrderItem.objects.order_by("-id").values_list("id", flat=True)[:1000])
+        OrderItem.objects.filter(id__in=changed).update(updated_at=timezone.now())
+        started = time.perf_counter()
+        result = refresh_sales_summary()
+        self.stdout.write(
+            f"incremental summary refresh ({len(changed)} items, {result['days']} days): "
+            f"{time.perf_counter() - started:.2f}s"
+        )
+
+    def seed(self, options):
+        with connection.cursor() as cursor:
+            self.stdout.write("Seeding users and products")
+            cursor.execute(SEED_USERS_SQL, {"users": options["users"]})
+            for sql in SEED_DIMENSIONS_SQL:
+                cursor.execute(sql)
+            cursor.execute(SEED_PRODUCTS_SQL, {"products": options["products"]})
+
+            total_orders = max(options["order_items"] // options["items_per_order"], 1)
+            self.insert_in_batches(cursor, SEED_ORDERS_SQL, total_orders, options["batch_size"], "orders")
+            self.insert_in_batches(
+                cursor, SEED_ORDER_ITEMS_SQL, options["order_items"], options["batch_size"], "order items"
+            )
+            cursor.execute("ANALYZE contents_order, contents_orderitem, contents_product")
+
+    def insert_in_batches(self, cursor, sql, total, batch_size, label):
+        for start in range(1, total + 1, batch_size):
+            end = min(start + batch_size - 1, total)
+            cursor.execute(sql, {"start": start, "end": end})
+            self.stdout.write(f"Seeded {end}/{total} {label}")
+
+    def run_raw_report(self):
+        with connection.cursor() as cursor:
+            cursor.execute(RAW_REPORT_SQL)
+            return cursor.fetchall()
+
+    def report(self, label, repeat, run):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f"{label}: median {statistics.median(timings):.1f}ms, min {min(timings):.1f}ms over {repeat} runs"
+        )
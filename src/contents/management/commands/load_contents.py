@@ -0,0 +1,67 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contents.loader import merge_batch, read_csv, read_ndjson, clean_record
+
+READERS = {
+    "ndjson": read_ndjson,
+    "csv": read_csv,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads content records (the third party api shape: content with its author, stats and hashtags) from "
+        "NDJSON or CSV files. Records are streamed in batches through COPY into a staging table and merged in "
+        "Author, Content, Tag and ContentTag with set based statements, so memory stays bounded by the batch size. "
+        "Every batch is committed on its own, loading a file again only writes what changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument(
+            "--format", choices=sorted(READERS), help="Defaults to the file extension (.csv, anything else ndjson)"
+        )
+        parser.add_argument("--batch-size", type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        totals = Counter()
+        started = time.perf_counter()
+        for path in options["paths"]:
+            file_format = options["format"] or ("csv" if path.lower().endswith(".csv") else "ndjson")
+            try:
+                with open(path, newline="", encoding="utf-8") as file:
+                    self.load_file(path, READERS[file_format](file), options["batch_size"], totals)
+            except OSError as e:
+                raise CommandError(f"Cannot read {path}: {e}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['records']} records in {elapsed:.1f}s ({totals['records'] / elapsed if elapsed else 0:.0f}/s), "
+            + ", ".join(f"{key} {value}" for key, value in sorted(totals.items()) if key != "records")
+        ))
+
+    def load_file(self, path, records, batch_size, totals):
+        batch = []
+        for line_number, record in records:
+            error = "not a valid record" if record is None else clean_record(record)
+            if error:
+                totals["invalid"] += 1
+                self.stderr.write(f"{path}:{line_number}: {error}, skipped")
+                continue
+            batch.append((line_number, record))
+            if len(batch) == batch_size:
+                self.merge(path, batch, totals)
+                batch = []
+        if batch:
+            self.merge(path, batch, totals)
+
+    def merge(self, path, batch, totals):
+        totals.update(merge_batch(batch))
+        totals["records"] += len(batch)
+        self.stdout.write(f"{path}: merged up to line {batch[-1][0]}, {totals['records']} records so far")
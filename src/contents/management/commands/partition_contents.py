@@ -0,0 +1,65 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contents import content_partitioning
+from contents.content_partitioning import COPY_BACKFILL, PartitioningError
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts contents_content to monthly range partitions on timestamp, online. Run the steps in order: "
+        f"`prepare`, then `run_backfill {COPY_BACKFILL.name}` (resumable, any number of workers), then `swap`. "
+        "`verify` explains the timeframe queries of the content endpoints and checks their partitions are pruned."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("step", choices=["prepare", "status", "swap", "verify", "abort", "drop-unpartitioned"])
+        parser.add_argument(
+            "--since", type=datetime.date.fromisoformat,
+            help="prepare: month of the first monthly partition (YYYY-MM-DD), default the oldest content",
+        )
+        parser.add_argument("--months-ahead", type=int, default=2, help="prepare: future partitions created")
+        parser.add_argument("--lock-timeout", default="5s", help="swap: longest wait for the table lock")
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, options["step"].replace("-", "_"))(options)
+        except PartitioningError as e:
+            raise CommandError(str(e))
+
+    def prepare(self, options):
+        partitions = content_partitioning.prepare(since=options["since"], months_ahead=options["months_ahead"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {content_partitioning.PARTITIONED_TABLE} with {len(partitions)} monthly partitions, "
+            f"now run `run_backfill {COPY_BACKFILL.name}`"
+        ))
+
+    def status(self, options):
+        for name, value in content_partitioning.get_status().items():
+            self.stdout.write(f"{name}: {value}")
+
+    def swap(self, options):
+        content_partitioning.swap(lock_timeout=options["lock_timeout"])
+        self.stdout.write(self.style.SUCCESS(
+            f"contents_content is partitioned, the old table is kept as {content_partitioning.UNPARTITIONED_TABLE}"
+        ))
+
+    def verify(self, options):
+        results = content_partitioning.verify_pruning()
+        for result in results:
+            style = self.style.SUCCESS if result["pruned"] else self.style.ERROR
+            self.stdout.write(style(
+                f"{'ok' if result['pruned'] else 'NOT PRUNED'} {result['query']}: "
+                f"{result['scanned']} partitions scanned, {result['expected']} expected of {result['partitions']}"
+            ))
+        if not all(result["pruned"] for result in results):
+            raise CommandError("Some timeframe queries scan partitions outside of their timeframe")
+
+    def abort(self, options):
+        content_partitioning.abort()
+        self.stdout.write(f"Dropped {content_partitioning.PARTITIONED_TABLE}")
+
+    def drop_unpartitioned(self, options):
+        content_partitioning.drop_unpartitioned()
+        self.stdout.write(f"Dropped {content_partitioning.UNPARTITIONED_TABLE}")
@@ -0,0 +1,99 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from contents import conditional
+from contents.backfills import BACKFILLS, get_progress, plan_chunks, reset, run_next_chunk
+from contents.connections import reserve_pool_connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a backfill of contents.backfills in primary key chunks, each chunk in its own short transaction. "
+        "Progress is kept in BackfillChunk: an interrupted run continues where it stopped when started again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("backfill", nargs="?", choices=sorted(BACKFILLS))
+        parser.add_argument("--chunk-size", type=int, default=10_000)
+        parser.add_argument("--workers", type=int, default=1, help="Chunks processed in parallel")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds a worker waits between chunks")
+        parser.add_argument("--status", action="store_true", help="Only print the progress")
+        parser.add_argument("--reset", action="store_true", help="Forget the progress, to run the backfill again")
+
+    def handle(self, *args, **options):
+        if not options["backfill"]:
+            for name, backfill in sorted(BACKFILLS.items()):
+                self.stdout.write(f"{name} ({backfill.table}): {backfill.description}")
+            return
+        backfill = BACKFILLS[options["backfill"]]
+
+        if options["reset"]:
+            self.stdout.write(f"Removed {reset(backfill)} chunks")
+            return
+        if options["status"]:
+            self.write_status(backfill)
+            return
+        if options["chunk_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-size and --workers must be positive")
+        reserve_pool_connections(options["workers"] + 1)
+
+        planned = plan_chunks(backfill, options["chunk_size"])
+        progress = get_progress(backfill)
+        remaining = progress["chunks"] - progress["completed"]
+        self.stdout.write(f"{backfill.name}: {planned} new chunks planned, {remaining} left to process")
+
+        started = time.perf_counter()
+        done = {"chunks": 0, "rows": 0}
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while not errors:
+                    chunk = run_next_chunk(backfill)
+                    if chunk is None:
+                        return
+                    with lock:
+                        done["chunks"] += 1
+                        done["rows"] += chunk.rows
+                        self.write_chunk(chunk, done, remaining, time.perf_counter() - started)
+                    if options["sleep"]:
+                        time.sleep(options["sleep"])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["workers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if done["rows"]:
+            # The rewritten rows may be part of the contents api responses
+            conditional.bump_data_epoch()
+        if errors:
+            raise CommandError(f"Backfill stopped, run it again to resume: {errors[0]!r}")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{backfill.name}: {done['chunks']} chunks, {done['rows']} rows in {elapsed:.1f}s"
+        ))
+
+    def write_chunk(self, chunk, done, remaining, elapsed):
+        rate = done["rows"] / elapsed if elapsed else 0
+        # The chunks left are estimated to take as long as the ones done so far in this run
+        eta = elapsed / done["chunks"] * (remaining - done["chunks"])
+        self.stdout.write(
+            f"[{done['chunks']}/{remaining}] ids {chunk.start_pk}-{chunk.end_pk - 1}: {chunk.rows} rows "
+            f"in {chunk.duration:.2f}s, {rate:.0f} rows/s, ETA {eta:.0f}s"
+        )
+
+    def write_status(self, backfill):
+        progress = get_progress(backfill)
+        self.stdout.write(
+            f"{backfill.name}: {progress['completed']}/{progress['chunks']} chunks done, {progress['rows']} rows"
+        )
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from contents.models import SlowQuery, SlowQueryPlan
+
+ORDERINGS = {
+    "total": F("total_duration").desc(),
+    "calls": F("calls").desc(),
+    "max": F("max_duration").desc(),
+    "mean": (F("total_duration") / F("calls")).desc(),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints the slowest queries recorded by contents.slow_queries (per fingerprint and view/task), "
+        "or the captured plan of one fingerprint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--order", choices=sorted(ORDERINGS), default="total")
+        parser.add_argument("--source", help="Only the queries of this view or task (substring)")
+        parser.add_argument("--plan", metavar="FINGERPRINT", help="Print the plan captured for a fingerprint")
+        parser.add_argument("--reset", action="store_true", help="Delete the recorded queries and plans")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            SlowQuery.objects.all().delete()
+            SlowQueryPlan.objects.all().delete()
+            return
+        if options["plan"]:
+            self.write_plan(options["plan"])
+            return
+
+        queries = SlowQuery.objects.order_by(ORDERINGS[options["order"]])
+        if options["source"]:
+            queries = queries.filter(source__icontains=options["source"])
+        planned = set(SlowQueryPlan.objects.values_list("fingerprint", flat=True))
+
+        self.stdout.write(f"{'fingerprint':<17}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}  source / sql")
+        for query in queries[:options["limit"]]:
+            self.stdout.write(
+                f"{query.fingerprint:<17}{query.calls:>8}{query.total_duration:>12.0f}"
+                f"{query.total_duration / query.calls:>10.1f}{query.max_duration:>10.1f}  {query.source}"
+                f"{'' if query.fingerprint in planned else ' (no plan)'}"
+            )
+            self.stdout.write(f"{'':<17}{query.sql[:200]}")
+
+    def write_plan(self, fingerprint):
+        plan = SlowQueryPlan.objects.filter(fingerprint=fingerprint).first()
+        if plan is None:
+            raise CommandError(f"No plan captured for {fingerprint}")
+        self.stdout.write(plan.sql)
+        self.stdout.write(f"params: {plan.params}")
+        self.stdout.write(
+            f"{plan.duration:.1f} ms when sampled on {plan.captured_at:%Y-%m-%d %H:%M}, "
+            f"{'EXPLAIN (ANALYZE, BUFFERS)' if plan.analyzed else 'EXPLAIN'}:"
+        )
+        root = plan.plan[0]
+        self.write_node(root["Plan"], 0)
+        if "Execution Time" in root:
+            self.stdout.write(f"Planning {root['Planning Time']:.1f} ms, execution {root['Execution Time']:.1f} ms")
+
+    def write_node(self, node, depth):
+        relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+        index = f" using {node['Index Name']}" if "Index Name" in node else ""
+        details = f"cost={node['Total Cost']:.0f} rows={node['Plan Rows']}"
+        if "Actual Total Time" in node:
+            details += (
+                f" actual={node['Actual Total Time']:.1f}ms rows={node['Actual Rows']} loops={node['Actual Loops']}"
+                f" shared hit={node.get('Shared Hit Blocks', 0)} read={node.get('Shared Read Blocks', 0)}"
+            )
+        self.stdout.write(f"{'  ' * depth}-> {node['Node Type']}{relation}{index} ({details})")
+        for child in node.get("Plans", []):
+            self.write_node(child, depth + 1)
@@ -0,0 +1,121 @@
+import threading
+import uuid
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from contents.connections import reserve_pool_connections
+from contents.inventory import InsufficientStock, place_order
+from contents.models import Product, Warehouse, WarehouseStock
+
+
+class Command(BaseCommand):
+    help = (
+        "Places orders for the same SKUs from hundreds of threads at once and checks that the stock is never "
+        "oversold and that the product totals match the warehouses. Creates its own products and warehouses. "
+        "Every thread holds its own database connection, keep --threads below the server's max_connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=200)
+        parser.add_argument("--orders-per-thread", type=int, default=5)
+        parser.add_argument("--products", type=int, default=3)
+        parser.add_argument("--warehouses", type=int, default=3)
+        parser.add_argument("--stock-per-warehouse", type=int, default=100)
+
+    def handle(self, *args, **options):
+        # The threads and this one, all at once
+        reserve_pool_connections(options["threads"] + 1)
+        run_id = uuid.uuid4().hex[:8]
+        user, products = self.set_up(run_id, options)
+        product_ids = [product.pk for product in products]
+        initial_stock = options["warehouses"] * options["stock_per_warehouse"]
+
+        results = Counter()
+        ordered_units = Counter()
+        results_lock = threading.Lock()
+        start = threading.Barrier(options["threads"])
+
+        def worker(worker_number):
+            start.wait()
+            try:
+                for order_number in range(options["orders_per_thread"]):
+                    # Multi-line orders in different line orders, to also exercise the lock ordering
+                    quantity = 1 + (worker_number + order_number) % 3
+                    lines = [(product_id, quantity) for product_id in product_ids]
+                    if worker_number % 2:
+                        lines.reverse()
+                    try:
+                        place_order(user, lines, shipping_method="stress-test")
+                    except InsufficientStock:
+                        with results_lock:
+                            results["rejected"] += 1
+                    else:
+                        with results_lock:
+                            results["placed"] += 1
+                            for product_id, line_quantity in lines:
+                                ordered_units[product_id] += line_quantity
+            except Exception as e:
+                with results_lock:
+                    results[f"error: {e.__class__.__name__}: {e}"] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(options["threads"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(f"Orders: {dict(results)}")
+        failures = []
+        for product in Product.objects.filter(pk__in=product_ids):
+            warehouse_total = WarehouseStock.objects.filter(product=product).aggregate(total=Sum("quantity"))["total"]
+            self.stdout.write(
+                f"Product {product.pk}: ordered {ordered_units[product.pk]}, "
+                f"left {product.product_stock} (warehouses {warehouse_total}) of {initial_stock}"
+            )
+            if product.product_stock < 0 or ordered_units[product.pk] + product.product_stock != initial_stock:
+                failures.append(f"product {product.pk} stock does not add up")
+            if warehouse_total != product.product_stock:
+                failures.append(f"product {product.pk} total does not match its warehouses")
+
+        if failures or any(key.startswith("error") for key in results):
+            raise CommandError(", ".join(failures) or "Some orders failed with unexpected errors")
+        self.stdout.write(self.style.SUCCESS("No oversell, stock is consistent"))
+
+    def set_up(self, run_id, options):
+        user = get_user_model().objects.create(
+            username=f"stress_{run_id}",
+            email=f"stress_{run_id}@example.com",
+            date_of_birth="1990-01-01",
+        )
+        warehouses = [
+            Warehouse.objects.create(
+                warehouse_id=number,
+                warehouse_name=f"Stress {run_id} #{number}",
+                warehouse_location="",
+                shelf_number="",
+                reorder_point=options["stock_per_warehouse"] // 10,
+            )
+            for number in range(options["warehouses"])
+        ]
+
+        products = []
+        for number in range(options["products"]):
+            product = Product.objects.create(
+                product_id=int(uuid.uuid4().int % 2_000_000_000),
+                product_name=f"Stress {run_id} #{number}",
+                product_description="",
+                product_price=10,
+                product_stock=options["warehouses"] * options["stock_per_warehouse"],
+            )
+            WarehouseStock.objects.bulk_create([
+                WarehouseStock(warehouse=warehouse, product=product, quantity=options["stock_per_warehouse"])
+                for warehouse in warehouses
+            ])
+            products.append(product)
+        return user, products
@@ -0,0 +1,53 @@
+import logging
+
+from django.db import connection
+from django.middleware.gzip import GZipMiddleware
+from kombu.exceptions import KombuError
+
+from contents import conditional, slow_queries
+from contents.tasks import record_slow_queries
+
+logger = logging.getLogger(__name__)
+
+
+class MeteredGZipMiddleware(GZipMiddleware):
+    """
+    `GZipMiddleware` that also records the bytes compression saved, and the 304/200 responses of the
+    endpoints serving conditional GETs (views flag them with `conditional_endpoint` on the response).
+    """
+    def process_response(self, request, response):
+        # Events must reach the client as they are written
+        if response.get("Content-Type", "").startswith("text/event-stream"):
+            return response
+        endpoint = getattr(response, "conditional_endpoint", None)
+        if endpoint:
+            conditional.record_response(endpoint, response)
+
+        original_size = None if response.streaming else len(response.content)
+        response = super().process_response(request, response)
+        if original_size and response.get("Content-Encoding") == "gzip":
+            conditional.record_compression(original_size, len(response.content))
+        return response
+
+
+class SlowQueryMiddleware:
+    """
+    Records the slow queries of a request (see `contents.slow_queries`) under its view name. Only their timing
+    is kept during the request, the `record_slow_queries` task stores them and captures their plans.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = slow_queries.SlowQueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        if recorder.queries:
+            match = request.resolver_match
+            source = f"{request.method} {match.view_name if match else request.path}"
+            # The response is never failed by the recording, its writes may already be committed
+            try:
+                record_slow_queries.delay(source, slow_queries.to_task_queries(recorder.queries))
+            except KombuError:
+                logger.exception("Could not send the slow queries of %s", source)
+        return response
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:52
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SNAPSHOT_TABLE = "contents_contentstatsnapshot"
+
+
+def month_start(day, offset):
+    month_index = day.year * 12 + day.month - 1 + offset
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def create_initial_partitions(apps, schema_editor):
+    # This month and the next two, the later ones are created by `maintain_stat_snapshot_partitions`. The SQL is
+    # inlined so the migration does not change with `contents.partitions`.
+    today = datetime.date.today()
+    for offset in range(3):
+        month = month_start(today, offset)
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{SNAPSHOT_TABLE}_p{month:%Y%m}" PARTITION OF "{SNAPSHOT_TABLE}" '
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [month, month_start(month, 1)],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0002_author_created_at_author_updated_at_and_more'),
+    ]
+
+    operations = [
+        # Postgres needs the partition key in the primary key of a partitioned table,
+        # the django model still only sees `id`.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=f"""
+                    CREATE TABLE "{SNAPSHOT_TABLE}" (
+                        "id" bigint GENERATED BY DEFAULT AS IDENTITY,
+                        "captured_at" timestamp with time zone NOT NULL,
+                        "like_count" bigint NOT NULL,
+                        "comment_count" bigint NOT NULL,
+                        "view_count" bigint NOT NULL,
+                        "share_count" bigint NOT NULL,
+                        "content_id" bigint NOT NULL
+                            REFERENCES "contents_content" ("id") DEFERRABLE INITIALLY DEFERRED,
+                        PRIMARY KEY ("id", "captured_at")
+                    ) PARTITION BY RANGE ("captured_at");
+                    CREATE INDEX "contents_co_content_d19145_idx"
+                        ON "{SNAPSHOT_TABLE}" ("content_id", "captured_at");
+                    """,
+                    reverse_sql=f'DROP TABLE "{SNAPSHOT_TABLE}";',
+                ),
+                migrations.RunPython(create_initial_partitions, migrations.RunPython.noop),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='ContentStatSnapshot',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('captured_at', models.DateTimeField()),
+                        ('like_count', models.BigIntegerField(default=0)),
+                        ('comment_count', models.BigIntegerField(default=0)),
+                        ('view_count', models.BigIntegerField(default=0)),
+                        ('share_count', models.BigIntegerField(default=0)),
+                        ('content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contents.content')),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['content', 'captured_at'], name='contents_co_content_d19145_idx')],
+                    },
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0003_contentstatsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('product_category', models.CharField(max_length=100)),
+                ('product_brand', models.CharField(max_length=100)),
+                ('gross_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('discounts', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('units', models.BigIntegerField(default=0)),
+                ('order_items', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product_category', 'day'], name='contents_da_product_954308_idx'), models.Index(fields=['product_brand', 'day'], name='contents_da_product_32e41e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'product_category', 'product_brand'), name='unique_daily_sales_summary')],
+            },
+        ),
+    ]
@@ -0,0 +1,113 @@
+from django.db import migrations, transaction
+
+# Every batch is committed on its own (the migration is not atomic), so the tables are never locked
+# for the whole backfill and an interrupted run can simply be started again.
+BATCH_SIZE = 10_000
+
+CREATE_DIMENSIONS_SQL = [
+    """
+    INSERT INTO contents_brand (name, created_at, updated_at)
+    SELECT DISTINCT product_brand, now(), now() FROM contents_product WHERE product_brand <> ''
+    ON CONFLICT (name) DO NOTHING
+    """,
+    """
+    INSERT INTO contents_category (name, parent_id, created_at, updated_at)
+    SELECT DISTINCT product_category, NULL::bigint, now(), now() FROM contents_product WHERE product_category <> ''
+    ON CONFLICT (name) WHERE parent_id IS NULL DO NOTHING
+    """,
+    """
+    INSERT INTO contents_category (name, parent_id, created_at, updated_at)
+    SELECT DISTINCT p.product_subcategory, c.id, now(), now()
+    FROM contents_product p
+    JOIN contents_category c ON c.name = p.product_category AND c.parent_id IS NULL
+    WHERE p.product_subcategory <> ''
+    ON CONFLICT (parent_id, name) DO NOTHING
+    """,
+]
+
+LINK_DIMENSIONS_SQL = """
+    UPDATE contents_product p
+    SET category_id = c.id, subcategory_id = s.id, brand_id = b.id
+    FROM contents_product src
+    LEFT JOIN contents_category c ON c.name = src.product_category AND c.parent_id IS NULL
+    LEFT JOIN contents_category s ON s.name = src.product_subcategory AND s.parent_id = c.id
+    LEFT JOIN contents_brand b ON b.name = src.product_brand
+    WHERE p.id = src.id AND p.id >= %(start)s AND p.id < %(end)s
+"""
+
+# The duplicated product rows are the only place the price of past orders was kept
+SNAPSHOT_LIST_PRICE_SQL = """
+    UPDATE contents_orderitem oi
+    SET list_price = p.product_price
+    FROM contents_product p
+    WHERE p.id = oi.product_id AND oi.list_price IS NULL AND oi.id >= %(start)s AND oi.id < %(end)s
+"""
+
+# The most recent row of a `product_id` is kept, it has the latest catalog data
+DUPLICATES_CTE = """
+    WITH duplicates AS (
+        SELECT p.id AS duplicate_id, latest.id AS canonical_id
+        FROM contents_product p
+        JOIN (
+            SELECT product_id, MAX(id) AS id
+            FROM contents_product
+            WHERE product_id >= %(start)s AND product_id < %(end)s
+            GROUP BY product_id
+            HAVING COUNT(*) > 1
+        ) latest ON latest.product_id = p.product_id
+        WHERE p.id <> latest.id
+    )
+"""
+
+COLLAPSE_DUPLICATES_SQL = [
+    DUPLICATES_CTE + """
+    UPDATE contents_orderitem t SET product_id = d.canonical_id FROM duplicates d WHERE t.product_id = d.duplicate_id
+    """,
+    DUPLICATES_CTE + """
+    UPDATE contents_wishlist t SET product_id = d.canonical_id FROM duplicates d WHERE t.product_id = d.duplicate_id
+    """,
+    DUPLICATES_CTE + """
+    UPDATE contents_reviewinformation t SET product_id = d.canonical_id
+    FROM duplicates d WHERE t.product_id = d.duplicate_id
+    """,
+    DUPLICATES_CTE + """
+    DELETE FROM contents_product p USING duplicates d WHERE p.id = d.duplicate_id
+    """,
+]
+
+
+def run_in_batches(connection, table, column, statements):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({column}), MAX({column}) FROM {table}")
+        first, last = cursor.fetchone()
+    if first is None:
+        return
+
+    for start in range(first, last + 1, BATCH_SIZE):
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql, {"start": start, "end": start + BATCH_SIZE})
+
+
+def normalize_catalog(apps, schema_editor):
+    connection = schema_editor.connection
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for sql in CREATE_DIMENSIONS_SQL:
+            cursor.execute(sql)
+
+    run_in_batches(connection, "contents_product", "id", [LINK_DIMENSIONS_SQL])
+    run_in_batches(connection, "contents_orderitem", "id", [SNAPSHOT_LIST_PRICE_SQL])
+    run_in_batches(connection, "contents_product", "product_id", COLLAPSE_DUPLICATES_SQL)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('contents', '0005_catalog_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_catalog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:55
+
+from django.db import migrations, models
+
+# The name `AlterField(unique=True)` gives the constraint, later schema changes look it up by that name
+PRODUCT_ID_CONSTRAINT = "contents_product_product_id_29a67a23_uniq"
+PRODUCT_ID_INDEX = "contents_product_product_id_uniq_idx"
+
+# The unique index is built without locking out the writes of `contents_product`, then becomes the constraint
+# (a catalog change). An index left INVALID by a failed build is dropped first, so the migration can be run again.
+ADD_PRODUCT_ID_UNIQUE_SQL = [
+    f'DROP INDEX CONCURRENTLY IF EXISTS "{PRODUCT_ID_INDEX}"',
+    f'CREATE UNIQUE INDEX CONCURRENTLY "{PRODUCT_ID_INDEX}" ON "contents_product" ("product_id")',
+    f'ALTER TABLE "contents_product" ADD CONSTRAINT "{PRODUCT_ID_CONSTRAINT}" UNIQUE USING INDEX "{PRODUCT_ID_INDEX}"',
+]
+
+DROP_PRODUCT_ID_UNIQUE_SQL = f'ALTER TABLE "contents_product" DROP CONSTRAINT IF EXISTS "{PRODUCT_ID_CONSTRAINT}"'
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction, like the batches of 0006
+    atomic = False
+
+    dependencies = [
+        ('contents', '0006_collapse_duplicate_products'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='contents_pr_product_d6369e_idx',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='product_brand',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='product_category',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='product_subcategory',
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(ADD_PRODUCT_ID_UNIQUE_SQL, DROP_PRODUCT_ID_UNIQUE_SQL),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='product',
+                    name='product_id',
+                    field=models.IntegerField(unique=True),
+                ),
+            ],
+        ),
+    ]
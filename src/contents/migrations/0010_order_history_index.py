@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0009_warehousestock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-order_date', '-id'], name='order_user_date_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='contents_or_user_id_b7770f_idx',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0011_product_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('backfill', models.CharField(max_length=100)),
+                ('start_pk', models.BigIntegerField()),
+                ('end_pk', models.BigIntegerField()),
+                ('rows', models.BigIntegerField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['name'], name='contents_ta_name_00b031_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='backfillchunk',
+            constraint=models.UniqueConstraint(fields=('backfill', 'start_pk'), name='unique_backfill_chunk'),
+        ),
+    ]
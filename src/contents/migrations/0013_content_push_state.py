@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0012_backfill_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='content',
+            name='is_pushed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='content',
+            name='push_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='content',
+            name='push_failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='content',
+            name='push_failure',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='content',
+            index=models.Index(condition=models.Q(('is_pushed', False), ('push_failed_at__isnull', True)), fields=['id'], name='content_pending_push_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0013_content_push_state'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contentstatsnapshot',
+            name='content',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='contents.content'),
+        ),
+        migrations.AlterField(
+            model_name='contenttag',
+            name='content',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='contents.content'),
+        ),
+    ]
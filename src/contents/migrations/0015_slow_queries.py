@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0014_content_fks_without_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQueryPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=16, unique=True)),
+                ('sql', models.TextField()),
+                ('params', models.TextField(blank=True)),
+                ('duration', models.FloatField()),
+                ('plan', models.JSONField()),
+                ('analyzed', models.BooleanField(default=False)),
+                ('captured_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=16)),
+                ('source', models.CharField(max_length=200)),
+                ('sql', models.TextField()),
+                ('calls', models.BigIntegerField(default=0)),
+                ('total_duration', models.FloatField(default=0)),
+                ('max_duration', models.FloatField(default=0)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fingerprint', 'source'), name='unique_slow_query_source')],
+            },
+        ),
+    ]
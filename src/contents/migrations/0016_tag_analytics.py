@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0015_slow_queries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100)),
+                ('related_tag', models.CharField(max_length=100)),
+                ('contents', models.BigIntegerField()),
+                ('share', models.FloatField()),
+                ('rank', models.SmallIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tag', 'rank'), name='unique_tag_cooccurrence_rank')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TagDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('tag', models.CharField(max_length=100)),
+                ('contents', models.BigIntegerField(default=0)),
+                ('like_count', models.BigIntegerField(default=0)),
+                ('comment_count', models.BigIntegerField(default=0)),
+                ('share_count', models.BigIntegerField(default=0)),
+                ('view_count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'tag'), name='unique_tag_daily_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+from contents.partitions import create_index_concurrently
+
+CONTENT_TABLE = "contents_content"
+INDEX_NAME = "content_unique_id_idx"
+
+
+def create_unique_id_index(apps, schema_editor):
+    create_index_concurrently(CONTENT_TABLE, INDEX_NAME, ["unique_id"], using=schema_editor.connection)
+
+
+def drop_unique_id_index(apps, schema_editor):
+    # Drops the index of every partition with it
+    schema_editor.execute(f'DROP INDEX IF EXISTS "{INDEX_NAME}"')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('contents', '0016_tag_analytics'),
+    ]
+
+    operations = [
+        # `contents_content` is large and written by every ingest, it may also be partitioned (see
+        # `contents.content_partitioning`), the index is built without locking out its writes.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_unique_id_index, drop_unique_id_index),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='content',
+                    index=models.Index(fields=['unique_id'], name=INDEX_NAME),
+                ),
+            ],
+        ),
+    ]
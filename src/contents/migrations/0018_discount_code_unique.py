@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:31
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# A code grants a single percentage at checkout: the most recent campaign of a duplicated code keeps it
+CLEAR_DUPLICATE_CODES_SQL = """
+    UPDATE contents_marketingcampaign c SET discount_code = NULL
+    FROM (
+        SELECT upper(discount_code) AS code, MAX(id) AS id
+        FROM contents_marketingcampaign
+        WHERE discount_code <> ''
+        GROUP BY upper(discount_code)
+        HAVING COUNT(*) > 1
+    ) latest
+    WHERE upper(c.discount_code) = latest.code AND c.id <> latest.id
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0017_content_unique_id_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CLEAR_DUPLICATE_CODES_SQL, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='marketingcampaign',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('discount_code'), condition=models.Q(('discount_code', ''), _negated=True), name='unique_discount_code'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:38
+
+import django.core.validators
+from django.db import migrations, models
+
+# Ratings outside of 1-5 are dropped (the review is kept, unrated): the aggregates of their products are
+# recomputed without them first, then the ratings are cleared
+RECOMPUTE_AFFECTED_PRODUCTS_SQL = """
+    UPDATE contents_product p
+    SET rating_count = agg.rating_count,
+        rating_sum = agg.rating_sum,
+        rating_average = CASE WHEN agg.rating_count > 0 THEN agg.rating_sum::numeric / agg.rating_count ELSE 0 END
+    FROM (
+        SELECT product_id,
+               COUNT(*) FILTER (WHERE review_rating BETWEEN 1 AND 5) AS rating_count,
+               COALESCE(SUM(review_rating) FILTER (WHERE review_rating BETWEEN 1 AND 5), 0) AS rating_sum
+        FROM contents_reviewinformation
+        GROUP BY product_id
+        HAVING bool_or(review_rating NOT BETWEEN 1 AND 5)
+    ) agg
+    WHERE p.id = agg.product_id
+"""
+
+CLEAR_OUT_OF_RANGE_RATINGS_SQL = """
+    UPDATE contents_reviewinformation SET review_rating = NULL WHERE review_rating NOT BETWEEN 1 AND 5
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0018_discount_code_unique'),
+    ]
+
+    operations = [
+        migrations.RunSQL(RECOMPUTE_AFFECTED_PRODUCTS_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(CLEAR_OUT_OF_RANGE_RATINGS_SQL, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name='reviewinformation',
+            name='review_rating',
+            field=models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddConstraint(
+            model_name='reviewinformation',
+            constraint=models.CheckConstraint(condition=models.Q(('review_rating__gte', 1), ('review_rating__lte', 5)), name='review_rating_range'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-19 13:05
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# Codes are trimmed when saved, the existing ones are trimmed too. Codes only made of spaces become empty.
+TRIM_CODES_SQL = """
+    UPDATE contents_marketingcampaign SET discount_code = trim(discount_code)
+    WHERE discount_code <> trim(discount_code)
+"""
+
+# Codes differing by surrounding spaces are now the same code: the most recent campaign keeps it
+CLEAR_DUPLICATE_CODES_SQL = """
+    UPDATE contents_marketingcampaign c SET discount_code = NULL
+    FROM (
+        SELECT upper(discount_code) AS code, MAX(id) AS id
+        FROM contents_marketingcampaign
+        WHERE discount_code <> ''
+        GROUP BY upper(discount_code)
+        HAVING COUNT(*) > 1
+    ) latest
+    WHERE upper(c.discount_code) = latest.code AND c.id <> latest.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0019_review_rating_range'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='marketingcampaign',
+            name='unique_discount_code',
+        ),
+        migrations.RunSQL(TRIM_CODES_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(CLEAR_DUPLICATE_CODES_SQL, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='marketingcampaign',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper(django.db.models.functions.text.Trim('discount_code')), condition=models.Q(('discount_code', ''), _negated=True), name='unique_discount_code'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+# An index left INVALID by a failed build is dropped first, so the migration can be run again
+CREATE_INDEXES_SQL = [
+    'DROP INDEX CONCURRENTLY IF EXISTS "order_updated_at_idx"',
+    'CREATE INDEX CONCURRENTLY "order_updated_at_idx" ON "contents_order" ("updated_at")',
+    'DROP INDEX CONCURRENTLY IF EXISTS "orderitem_updated_at_idx"',
+    'CREATE INDEX CONCURRENTLY "orderitem_updated_at_idx" ON "contents_orderitem" ("updated_at")',
+]
+
+DROP_INDEXES_SQL = [
+    'DROP INDEX CONCURRENTLY IF EXISTS "order_updated_at_idx"',
+    'DROP INDEX CONCURRENTLY IF EXISTS "orderitem_updated_at_idx"',
+]
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('contents', '0020_discount_code_trimmed'),
+    ]
+
+    operations = [
+        # The order tables are large and written by every checkout, the indexes are built without locking out
+        # their writes
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CREATE_INDEXES_SQL, DROP_INDEXES_SQL),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='order',
+                    index=models.Index(fields=['updated_at'], name='order_updated_at_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='orderitem',
+                    index=models.Index(fields=['updated_at'], name='orderitem_updated_at_idx'),
+                ),
+            ],
+        ),
+    ]
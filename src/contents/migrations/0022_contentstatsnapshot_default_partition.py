@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-19 15:45
+
+from django.db import migrations
+
+# Without it, a snapshot of a month whose partition was not created yet (the maintenance task did not run)
+# fails the whole ingest page. Its rows are moved out when the partition of their month is created.
+CREATE_DEFAULT_PARTITION_SQL = """
+    CREATE TABLE IF NOT EXISTS "contents_contentstatsnapshot_default"
+        PARTITION OF "contents_contentstatsnapshot" DEFAULT
+"""
+
+DROP_DEFAULT_PARTITION_SQL = 'DROP TABLE IF EXISTS "contents_contentstatsnapshot_default"'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0021_order_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_DEFAULT_PARTITION_SQL, DROP_DEFAULT_PARTITION_SQL),
+    ]
@@ -1,6 +1,10 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Trim, Upper
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 
 
 class Author(models.Model):
@@ -38,6 +42,87 @@ class Content(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # AI comment pushing, see `contents.utils.ContentPusher`
+    is_pushed = models.BooleanField(default=False)
+    push_attempts = models.PositiveSmallIntegerField(default=0)
+    push_failed_at = models.DateTimeField(blank=True, null=True)
+    push_failure = models.CharField(max_length=255, blank=True, default="")
+
+    # Stat name in the third party api -> Content field
+    STAT_FIELDS = {
+        "likes": "like_count",
+        "comments": "comment_count",
+        "views": "view_count",
+        "shares": "share_count",
+    }
+
+    @property
+    def total_engagement(self):
+        return self.like_count + self.comment_count + self.share_count
+
+    def apply_stats(self, stats):
+        """
+        Copies the counts of the third party api `stats` on the content, returns the fields that changed.
+        """
+        changed_fields = []
+        for stat_name, field_name in self.STAT_FIELDS.items():
+            if stat_name in stats and getattr(self, field_name) != stats[stat_name]:
+                setattr(self, field_name, stats[stat_name])
+                changed_fields.append(field_name)
+        return changed_fields
+
+    def mark_push_failed(self, reason):
+        """
+        The comment of this content can't be pushed, it is not tried again.
+        """
+        self.push_failed_at = timezone.now()
+        self.push_failure = reason[:255]
+        self.save(update_fields=["push_failed_at", "push_failure", "push_attempts"])
+
+    class Meta:
+        indexes = [
+            # Only the contents still waiting for their comment, the pusher scans them in id order
+            models.Index(
+                fields=["id"],
+                condition=models.Q(is_pushed=False, push_failed_at__isnull=True),
+                name="content_pending_push_idx",
+            ),
+            # Lookups by unique id: ingest upserts and the batch lookup api
+            models.Index(fields=["unique_id"], name="content_unique_id_idx"),
+        ]
+
+
+class ContentStatSnapshot(models.Model):
+    """
+    Append-only history of the stats of a content, a row is added only when an ingest changes them.
+    In postgres the table is partitioned by month on `captured_at` (see `contents.partitions`),
+    so old history is removed by dropping partitions. A default partition takes the snapshots of the months
+    the maintenance task did not create a partition for yet.
+    """
+    # No database constraint, `contents_content` can be partitioned (see `contents.content_partitioning`)
+    content = models.ForeignKey(Content, on_delete=models.CASCADE, db_constraint=False)
+    captured_at = models.DateTimeField()
+    like_count = models.BigIntegerField(default=0)
+    comment_count = models.BigIntegerField(default=0)
+    view_count = models.BigIntegerField(default=0)
+    share_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["content", "captured_at"]),
+        ]
+
+    @classmethod
+    def from_content(cls, content, captured_at):
+        return cls(
+            content=content,
+            captured_at=captured_at,
+            like_count=content.like_count,
+            comment_count=content.comment_count,
+            view_count=content.view_count,
+            share_count=content.share_count,
+        )
+
 
 class Tag(models.Model):
     """
@@ -47,15 +132,60 @@ class Tag(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Finding the duplicates of a name, see the `merge_duplicate_tags` backfill
+            models.Index(fields=["name"]),
+        ]
+
 
 class ContentTag(models.Model):
     """
     TODO: The content and tag is being duplicated, need to do something in the database
     """
-    content = models.ForeignKey(Content, on_delete=models.CASCADE)
+    # No database constraint, `contents_content` can be partitioned (see `contents.content_partitioning`)
+    content = models.ForeignKey(Content, on_delete=models.CASCADE, db_constraint=False)
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
 
 
+
+class TagDailyStats(models.Model):
+    """
+    Contents and engagement of every tag (lowercased name) per content day. Rebuilt incrementally by
+    `contents.tag_analytics.refresh_tag_daily_stats`, the tag analytics read this table instead of joining
+    `ContentTag` to `Content`.
+    """
+    day = models.DateField()
+    tag = models.CharField(max_length=100)
+    contents = models.BigIntegerField(default=0)
+    like_count = models.BigIntegerField(default=0)
+    comment_count = models.BigIntegerField(default=0)
+    share_count = models.BigIntegerField(default=0)
+    view_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "tag"], name="unique_tag_daily_stats"),
+        ]
+
+
+class TagCooccurrence(models.Model):
+    """
+    Top-K of the tags found on the same contents as `tag`, over the last `TAG_COOCCURRENCE_DAYS` days.
+    `share` is the part of the contents of `tag` also tagged `related_tag`. Rebuilt in bulk by
+    `contents.tag_analytics.refresh_tag_cooccurrences`.
+    """
+    tag = models.CharField(max_length=100)
+    related_tag = models.CharField(max_length=100)
+    contents = models.BigIntegerField()
+    share = models.FloatField()
+    rank = models.SmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tag", "rank"], name="unique_tag_cooccurrence_rank"),
+        ]
+
 # Written by Mahiuddin. Normalizing Start
 class User(AbstractUser):
     user_id = models.AutoField(primary_key=True)
@@ -91,16 +221,61 @@ class Address(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+RATING_DECIMAL = DecimalField(max_digits=3, decimal_places=2)
+# Wide enough for a sum of ratings, the average is rounded to `RATING_DECIMAL` when stored
+RATING_SUM_DECIMAL = DecimalField(max_digits=20, decimal_places=4)
+
+
+class Category(models.Model):
+    """
+    Product category, a subcategory is a category with a `parent`.
+    """
+    name = models.CharField(max_length=100)
+    parent = models.ForeignKey("self", on_delete=models.CASCADE, null=True, blank=True, related_name="subcategories")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def _str_(self):
+        return self.name
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["parent", "name"], name="unique_category_name_per_parent"),
+            models.UniqueConstraint(
+                fields=["name"], condition=models.Q(parent__isnull=True), name="unique_top_level_category_name"
+            ),
+        ]
+
+
+class Brand(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def _str_(self):
+        return self.name
+
+
 class Product(models.Model):
-    product_id = models.IntegerField()  # Not unique, as it's repeated for each order
+    """
+    One row per catalog product, the price paid in past orders is kept on `OrderItem.list_price`.
+    """
+    product_id = models.IntegerField(unique=True)
     product_name = models.CharField(max_length=255)
     product_description = models.TextField()
-    product_price = models.DecimalField(max_digits=10, decimal_places=2) # TODO: could be a separate model
-    product_category = models.CharField(max_length=100) # TODO: could be a separate model
-    product_subcategory = models.CharField(max_length=100)
-    product_brand = models.CharField(max_length=100)
+    product_price = models.DecimalField(max_digits=10, decimal_places=2)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, null=True, blank=True, related_name="products")
+    subcategory = models.ForeignKey(
+        Category, on_delete=models.PROTECT, null=True, blank=True, related_name="subcategory_products"
+    )
+    brand = models.ForeignKey(Brand, on_delete=models.PROTECT, null=True, blank=True)
     product_stock = models.IntegerField()
-    # product_ratings = models.JSONField(default=list)
+    # Kept in sync with the reviews by `ReviewInformation.save/delete` or `recompute_ratings`
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.BigIntegerField(default=0)
+    rating_average = models.DecimalField(max_digits=3, decimal_places=2, default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -110,9 +285,59 @@ class Product(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=["product_id"]),
+            models.Index(fields=["category", "-rating_average"], name="product_category_rating_idx"),
         ]
 
+    @classmethod
+    def apply_rating_change(cls, product_id, old_rating=None, new_rating=None):
+        """
+        Moves the rating aggregates of a product from `old_rating` to `new_rating` (`None` means no rating)
+        with a single `UPDATE`, the new values are computed by the database so concurrent reviews do not
+        overwrite each other.
+        """
+        count_delta = (new_rating is not None) - (old_rating is not None)
+        sum_delta = (new_rating or 0) - (old_rating or 0)
+        if not count_delta and not sum_delta:
+            return
+
+        rating_count = F("rating_count") + count_delta
+        rating_sum = F("rating_sum") + sum_delta
+        cls.objects.filter(pk=product_id).update(
+            rating_count=rating_count,
+            rating_sum=rating_sum,
+            rating_average=Case(
+                When(rating_count__gt=-count_delta, then=Cast(rating_sum, RATING_SUM_DECIMAL) / rating_count),
+                default=Value(0),
+                output_field=RATING_DECIMAL,
+            ),
+        )
+
+    @classmethod
+    def recompute_ratings(cls, product_ids):
+        """
+        Recomputes the rating aggregates of `product_ids` from their reviews in one `UPDATE`,
+        used after bulk review imports which bypass `ReviewInformation.save`.
+        """
+        reviews = (
+            ReviewInformation.objects.filter(product=OuterRef("pk"), review_rating__isnull=False)
+            .order_by()
+            .values("product")
+        )
+        rating_count = Coalesce(Subquery(reviews.annotate(count=Count("id")).values("count")), 0)
+        rating_sum = Coalesce(Subquery(reviews.annotate(total=Sum("review_rating")).values("total")), 0)
+        return cls.objects.filter(pk__in=product_ids).update(
+            rating_count=rating_count,
+            rating_sum=rating_sum,
+            rating_average=Coalesce(
+                Subquery(
+                    reviews.annotate(average=Cast(Sum("review_rating"), RATING_SUM_DECIMAL) / Count("id"))
+                    .values("average")
+                ),
+                Value(0),
+                output_field=RATING_DECIMAL,
+            ),
+        )
+
 
 class Order(models.Model):
     order_id = models.IntegerField()
@@ -128,12 +353,22 @@ class Order(models.Model):
     def _str_(self):
         return f"{self.user} - Order {self.order_id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The day the sales summary counts this order in, see `contents.reports`
+        instance._saved_order_date = instance.__dict__.get("order_date")
+        return instance
+
     class Meta:
         indexes = [
-            models.Index(fields=["user"]),
+            # Order history of a user, newest first (`id` breaks ties for keyset paging)
+            models.Index(fields=["user", "-order_date", "-id"], name="order_user_date_idx"),
             models.Index(fields=["order_id"]),
             models.Index(fields=["tracking_number"]),
             models.Index(fields=["order_status"]), # TODO: Remove this index if not needed in report or query
+            # Changes since the last sales summary refresh
+            models.Index(fields=["updated_at"], name="order_updated_at_idx"),
         ]
 
 
@@ -142,6 +377,8 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     item_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Catalog price of the product when the order was placed
+    list_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -154,8 +391,37 @@ class OrderItem(models.Model):
             models.Index(fields=["order"]),
             models.Index(fields=["product"]),
             models.Index(fields=["item_price"]),
+            # Changes since the last sales summary refresh
+            models.Index(fields=["updated_at"], name="orderitem_updated_at_idx"),
         ]
 
+class DailySalesSummary(models.Model):
+    """
+    Revenue, units and discounts of the order items per order day, category and brand.
+    Rebuilt incrementally by `contents.reports.refresh_sales_summary`, reports read this table
+    instead of scanning `OrderItem` joined to `Order`.
+    """
+    day = models.DateField()
+    product_category = models.CharField(max_length=100)
+    product_brand = models.CharField(max_length=100)
+    gross_revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    discounts = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    units = models.BigIntegerField(default=0)
+    order_items = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "product_category", "product_brand"], name="unique_daily_sales_summary"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["product_category", "day"]),
+            models.Index(fields=["product_brand", "day"]),
+        ]
+
+
 class Payment(models.Model):
     payment_id = models.CharField(max_length=100)
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
@@ -201,6 +467,24 @@ class Warehouse(models.Model):
             models.Index(fields=["warehouse_id"]),
         ]
 
+class WarehouseStock(models.Model):
+    """
+    Units of a product available in a warehouse, `Product.product_stock` is the total over all warehouses.
+    Only decremented through `contents.inventory.place_order`.
+    """
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "warehouse"], name="unique_warehouse_stock"),
+            models.CheckConstraint(condition=models.Q(quantity__gte=0), name="warehouse_stock_not_negative"),
+        ]
+
 class SupportTicket(models.Model):
     # TODO: Could add a model for support ticket rating review
     support_ticket_id = models.IntegerField(null=True, blank=True)
@@ -228,6 +512,18 @@ class MarketingCampaign(models.Model):
         indexes = [
             models.Index(fields=["campaign_id"]),
         ]
+        constraints = [
+            # Codes are case insensitive and trimmed at checkout (see `contents.discounts.normalize_code`), the
+            # index also serves lookups
+            models.UniqueConstraint(
+                Upper(Trim("discount_code")), condition=~models.Q(discount_code=""), name="unique_discount_code"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.discount_code:
+            self.discount_code = self.discount_code.strip()
+        super().save(*args, **kwargs)
 
 class WishList(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -242,12 +538,53 @@ class WishList(models.Model):
             models.Index(fields=["product"]),
         ]
 
+class ProductCooccurrence(models.Model):
+    """
+    Number of users who wishlisted `product` and bought `other_product`, maintained incrementally by
+    `contents.recommendations.refresh_cooccurrences`.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    other_product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "other_product"], name="unique_product_cooccurrence"),
+        ]
+
+
+class ProductRecommendation(models.Model):
+    """
+    Top-K of `ProductCooccurrence` per product: "users who wanted this also bought".
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="recommendations")
+    recommended_product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    score = models.IntegerField()
+    rank = models.SmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "rank"], name="unique_product_recommendation_rank"),
+        ]
+
+
+class CooccurrenceCheckpoint(models.Model):
+    """
+    Last `WishList` / `OrderItem` ids counted in `ProductCooccurrence`, a single row.
+    """
+    last_wishlist_id = models.BigIntegerField(default=0)
+    last_order_item_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
 class ReviewInformation(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     review_text = models.TextField(null=True, blank=True)
-    review_rating = models.IntegerField(null=True, blank=True)
+    review_rating = models.IntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1), MaxValueValidator(5)]
+    )
     review_date = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -257,17 +594,91 @@ class ReviewInformation(models.Model):
         indexes = [
             models.Index(fields=["review_rating"]),
         ]
+        constraints = [
+            # `Product.rating_average` holds averages up to 9.99
+            models.CheckConstraint(
+                condition=models.Q(review_rating__gte=1, review_rating__lte=5), name="review_rating_range"
+            ),
+        ]
 
-    # def save(self, *args, **kwargs):
-    #     if self.review_rating:
-    #         self.product.total_review_count += 1
-    #         self.product.product_ratings = (
-    #                                                self.product.product_ratings + self.review_rating
-    #                                        ) / self.product.total_review_count
-    #         self.product.save()
-    #     super().save(*args, **kwargs)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the product aggregates currently count for this review
+        instance._saved_rating = (instance.product_id, instance.review_rating)
+        return instance
+
+    def save(self, *args, **kwargs):
+        saved_product_id, saved_rating = getattr(self, "_saved_rating", (None, None))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if saved_product_id is not None and saved_product_id != self.product_id:
+                Product.apply_rating_change(saved_product_id, old_rating=saved_rating)
+                saved_rating = None
+            Product.apply_rating_change(self.product_id, old_rating=saved_rating, new_rating=self.review_rating)
+        self._saved_rating = (self.product_id, self.review_rating)
+
+    def delete(self, *args, **kwargs):
+        saved_product_id, saved_rating = getattr(self, "_saved_rating", (self.product_id, self.review_rating))
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            Product.apply_rating_change(saved_product_id, old_rating=saved_rating)
+        return deleted
+
+
+
+class BackfillChunk(models.Model):
+    """
+    A primary key range `[start_pk, end_pk)` of a backfill (see `contents.backfills`).
+    `completed_at` is set in the same transaction as the chunk's writes, so a crashed run resumes
+    from the chunks that are still open without redoing or skipping any.
+    """
+    backfill = models.CharField(max_length=100)
+    start_pk = models.BigIntegerField()
+    end_pk = models.BigIntegerField()
+    rows = models.BigIntegerField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["backfill", "start_pk"], name="unique_backfill_chunk"),
+        ]
+
+
+class SlowQuery(models.Model):
+    """
+    Queries slower than `SLOW_QUERY_THRESHOLD_MS` (see `contents.slow_queries`), per normalized SQL
+    fingerprint and source (view or celery task). Durations are in milliseconds.
+    """
+    fingerprint = models.CharField(max_length=16)
+    source = models.CharField(max_length=200)
+    sql = models.TextField()
+    calls = models.BigIntegerField(default=0)
+    total_duration = models.FloatField(default=0)
+    max_duration = models.FloatField(default=0)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["fingerprint", "source"], name="unique_slow_query_source"),
+        ]
 
 
+class SlowQueryPlan(models.Model):
+    """
+    The plan of the first sampled run of a slow query fingerprint, with the SQL and params it was explained with.
+    `analyzed` plans come from `EXPLAIN (ANALYZE, BUFFERS)`, the others from the planner only.
+    """
+    fingerprint = models.CharField(max_length=16, unique=True)
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    duration = models.FloatField()
+    plan = models.JSONField()
+    analyzed = models.BooleanField(default=False)
+    captured_at = models.DateTimeField()
+
 # class MegaEcommerce(models.Model):
 #     """
 #     TODO: Normalize the model
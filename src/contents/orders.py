@@ -0,0 +1,80 @@
+import base64
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch, Q
+
+from contents.models import Order, OrderItem
+from contents.serializers import OrderHistorySerializer
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order):
+    value = f"{order.order_date.isoformat()}|{order.pk}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        order_date, order_pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(order_date), int(order_pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def history_version_key(user_id):
+    return f"orders:history:{user_id}:version"
+
+
+def invalidate_order_history(user_id):
+    """
+    Called when a user places an order, the cached first pages of the previous version are never read again.
+    """
+    try:
+        cache.incr(history_version_key(user_id))
+    except ValueError:
+        cache.set(history_version_key(user_id), 1, timeout=None)
+
+
+def get_order_history_page(user, page_size, cursor=None):
+    """
+    One page of the orders of `user`, newest first, with their items and payments.
+
+    Keyset paging on (order_date, id) walks the `order_user_date_idx` index, so deep pages cost the same as
+    the first one, and the items/payments are prefetched: 3 queries per page whatever its size.
+    The first page, the one every app open asks for, is cached until the user places a new order.
+    """
+    cache_key = None
+    if cursor is None:
+        version = cache.get_or_set(history_version_key(user.pk), 1, timeout=None)
+        cache_key = f"orders:history:{user.pk}:{version}:{page_size}"
+        page = cache.get(cache_key)
+        if page is not None:
+            return page
+
+    queryset = (
+        Order.objects.filter(user=user)
+        .order_by("-order_date", "-id")
+        .prefetch_related(
+            Prefetch("orderitem_set", queryset=OrderItem.objects.select_related("product").order_by("id")),
+            "payment_set",
+        )
+    )
+    if cursor is not None:
+        order_date, order_pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(order_date__lt=order_date) | Q(order_date=order_date, id__lt=order_pk))
+
+    # One extra row tells whether there is a next page
+    orders = list(queryset[:page_size + 1])
+    page = {
+        "results": OrderHistorySerializer(orders[:page_size], many=True).data,
+        "next_cursor": encode_cursor(orders[page_size - 1]) if len(orders) > page_size else None,
+    }
+
+    if cache_key:
+        cache.set(cache_key, page, timeout=settings.ORDER_HISTORY_CACHE_TTL)
+    return page
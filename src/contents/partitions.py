@@ -0,0 +1,231 @@
+import datetime
+import json
+
+from django.db import DatabaseError, connection, transaction
+
+PARTITION_SUFFIX_FORMAT = "%Y%m"
+
+
+def month_start(day, offset=0):
+    """
+    First day of the month `offset` months away from the month of `day`.
+    """
+    month_index = day.year * 12 + day.month - 1 + offset
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month.strftime(PARTITION_SUFFIX_FORMAT)}"
+
+
+def create_monthly_partitions(table, months_ahead=2, start=None, using=None, prefix=None):
+    """
+    Creates the monthly range partitions of `table` from the month of `start` (default: this month)
+    up to `months_ahead` months after the current one. Existing partitions are left untouched.
+    The partitions are named after `prefix`, `table` by default.
+    """
+    using = using or connection
+    prefix = prefix or table
+    today = datetime.date.today()
+    month = month_start(start or today)
+    last_month = month_start(today, months_ahead)
+
+    created = []
+    with using.cursor() as cursor:
+        while month <= last_month:
+            name = partition_name(prefix, month)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [month, month_start(month, 1)],
+            )
+            created.append(name)
+            month = month_start(month, 1)
+    return created
+
+
+def create_monthly_partition(table, month, key, default_partition, using=None, lock_timeout="5s"):
+    """
+    Creates the partition of `month` of `table` (partitioned on `key`) and moves in it the rows of that month its
+    default partition holds: Postgres refuses a new partition while the default one has rows of its range. The
+    default partition is detached meanwhile, in the same transaction, so that nothing else scans it.
+    Returns the number of rows moved.
+    """
+    using = using or connection
+    name = partition_name(table, month)
+    bounds = [month, month_start(month, 1)]
+    with transaction.atomic(using=using.alias), using.cursor() as cursor:
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [lock_timeout])
+        cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{default_partition}"')
+        cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', bounds)
+        # The default partition is detached, the moved rows are routed to the new partition
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM "{default_partition}" WHERE "{key}" >= %s AND "{key}" < %s RETURNING *
+            )
+            INSERT INTO "{table}" SELECT * FROM moved
+            """,
+            bounds,
+        )
+        moved = cursor.rowcount
+        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default_partition}" DEFAULT')
+    return moved
+
+
+def add_monthly_partitions(table, key, default_partition, months_ahead=2, using=None):
+    """
+    Creates the missing monthly partitions of `table` from this month up to `months_ahead` months after it,
+    see `create_monthly_partition`. Returns the created partitions -> number of rows moved in them from the
+    default partition. Without a default partition, the partitions are only created.
+    """
+    using = using or connection
+    existing = set(list_partitions(table, using=using))
+    if default_partition not in existing:
+        return {name: 0 for name in create_monthly_partitions(table, months_ahead=months_ahead, using=using)}
+
+    created = {}
+    today = datetime.date.today()
+    month, last_month = month_start(today), month_start(today, months_ahead)
+    while month <= last_month:
+        if partition_name(table, month) not in existing:
+            created[partition_name(table, month)] = create_monthly_partition(
+                table, month, key, default_partition, using=using
+            )
+        month = month_start(month, 1)
+    return created
+
+
+def create_default_partition(table, name, using=None):
+    """
+    The partition of the rows no monthly partition covers, including the NULL partition keys.
+    """
+    using = using or connection
+    with using.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" DEFAULT')
+    return name
+
+
+def is_partitioned(table, using=None):
+    using = using or connection
+    with using.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_partitioned_table JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid
+                WHERE pg_class.relname = %s
+            )
+            """,
+            [table],
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions(table, using=None):
+    using = using or connection
+    with using.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s
+            ORDER BY child.relname
+            """,
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def drop_invalid_index(cursor, name):
+    """
+    Drops the index `name` when a failed or cancelled `CREATE INDEX CONCURRENTLY` left it INVALID, so that it is
+    built again. Returns whether it did.
+    """
+    cursor.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+            WHERE pg_class.relname = %s AND NOT pg_index.indisvalid
+        )
+        """,
+        [name],
+    )
+    if not cursor.fetchone()[0]:
+        return False
+    cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+    return True
+
+
+def create_index_concurrently(table, name, columns, using=None):
+    """
+    Creates the index `name` on `columns` of `table` without blocking its writes. A partitioned table cannot be
+    indexed concurrently: the index is created on the parent only, then concurrently on every partition and
+    attached to it, it becomes valid with the last partition (and the partitions created later get it).
+    Runs outside of a transaction, and can be run again after a failure: the invalid indexes a failed build
+    left behind are dropped and built again.
+    """
+    using = using or connection
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    with using.cursor() as cursor:
+        if not is_partitioned(table, using=using):
+            drop_invalid_index(cursor, name)
+            cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({column_list})')
+            return
+        # The parent index stays invalid until every partition's index is attached, it is kept
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON ONLY "{table}" ({column_list})')
+        for partition in list_partitions(table, using=using):
+            # Postgres truncates identifiers to 63 bytes
+            partition_index = f"{partition}_{'_'.join(columns)}"[:59] + "_idx"
+            drop_invalid_index(cursor, partition_index)
+            cursor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{partition_index}" ON "{partition}" ({column_list})'
+            )
+            cursor.execute(
+                "SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = %s::regclass)", [partition_index]
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(f'ALTER INDEX "{name}" ATTACH PARTITION "{partition_index}"')
+        cursor.execute(
+            """
+            SELECT pg_index.indisvalid FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+            WHERE pg_class.relname = %s
+            """,
+            [name],
+        )
+        if not cursor.fetchone()[0]:
+            raise DatabaseError(f"{name} is still invalid after indexing every partition of {table}")
+
+
+def drop_monthly_partitions(table, keep_months, using=None):
+    """
+    Drops the partitions of `table` older than the last `keep_months` months.
+    Dropping a partition is a metadata operation, no rows are deleted one by one.
+    """
+    using = using or connection
+    oldest_kept = partition_name(table, month_start(datetime.date.today(), -keep_months))
+
+    dropped = []
+    with using.cursor() as cursor:
+        for name in list_partitions(table, using=using):
+            # Names sort by month thanks to the `%Y%m` suffix, a default partition never matches
+            if name.startswith(f"{table}_p") and name < oldest_kept:
+                cursor.execute(f'DROP TABLE IF EXISTS "{name}"')
+                dropped.append(name)
+    return dropped
+
+
+def scanned_relations(queryset):
+    """
+    Names of the tables (partitions included) in the plan of `queryset`, the partitions pruned by the planner
+    are not part of it.
+    """
+    relations = set()
+    nodes = [plan["Plan"] for plan in json.loads(queryset.explain(format="json"))]
+    while nodes:
+        node = nodes.pop()
+        if "Relation Name" in node:
+            relations.add(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return relations
@@ -0,0 +1,147 @@
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from scipy import sparse
+
+from contents.models import CooccurrenceCheckpoint, OrderItem, WishList
+
+UPSERT_COOCCURRENCES_SQL = """
+    INSERT INTO contents_productcooccurrence (product_id, other_product_id, count)
+    SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::integer[])
+    ON CONFLICT (product_id, other_product_id)
+    DO UPDATE SET count = contents_productcooccurrence.count + EXCLUDED.count
+"""
+
+REBUILD_TOP_K_SQL = """
+    INSERT INTO contents_productrecommendation (product_id, recommended_product_id, score, rank)
+    SELECT product_id, other_product_id, count, rank
+    FROM (
+        SELECT product_id, other_product_id, count,
+               ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY count DESC, other_product_id) AS rank
+        FROM contents_productcooccurrence
+        WHERE product_id = ANY(%s) AND count > 0
+    ) ranked
+    WHERE rank <= %s
+"""
+
+
+def presence_matrix(pairs, user_index, product_index):
+    """
+    Sparse users x products matrix with a 1 for every (user, product) pair, duplicates count once.
+    """
+    matrix = sparse.csr_matrix(
+        (
+            np.ones(len(pairs), dtype=np.int32),
+            (
+                np.fromiter((user_index[user] for user, _ in pairs), dtype=np.int64, count=len(pairs)),
+                np.fromiter((product_index[product] for _, product in pairs), dtype=np.int64, count=len(pairs)),
+            ),
+        ),
+        shape=(len(user_index), len(product_index)),
+    )
+    matrix.data[:] = 1
+    return matrix
+
+
+def split_pairs(rows, last_seen_id):
+    """
+    Splits `(id, user, product)` rows into the pairs already counted and the pairs first seen after
+    `last_seen_id`. A pair seen again (e.g. the product bought a second time) is not new.
+    """
+    old_pairs, new_pairs = set(), set()
+    for row_id, user_id, product_id in rows:
+        (old_pairs if row_id <= last_seen_id else new_pairs).add((user_id, product_id))
+    return old_pairs, new_pairs - old_pairs
+
+
+def compute_cooccurrence_delta(user_ids, checkpoint, max_wishlist_id, max_order_item_id):
+    """
+    Change of the co-occurrence counts brought by the rows of `user_ids` added since the checkpoint.
+
+    With W the wishlist and B the purchase matrices of these users, the counts are Wᵀ·B, and adding
+    W_new/B_new changes them by W_newᵀ·B_after + W_oldᵀ·B_new. Only the users with new rows are loaded.
+    """
+    wished_rows = WishList.objects.filter(user_id__in=user_ids, id__lte=max_wishlist_id).values_list(
+        "id", "user_id", "product_id"
+    )
+    bought_rows = OrderItem.objects.filter(order__user_id__in=user_ids, id__lte=max_order_item_id).values_list(
+        "id", "order__user_id", "product_id"
+    )
+    wished_old, wished_new = split_pairs(wished_rows, checkpoint.last_wishlist_id)
+    bought_old, bought_new = split_pairs(bought_rows, checkpoint.last_order_item_id)
+
+    all_pairs = wished_old | wished_new | bought_old | bought_new
+    user_index = {user_id: index for index, user_id in enumerate({user for user, _ in all_pairs})}
+    products = sorted({product for _, product in all_pairs})
+    product_index = {product_id: index for index, product_id in enumerate(products)}
+
+    def matrix(pairs):
+        return presence_matrix(list(pairs), user_index, product_index)
+
+    delta = (
+        matrix(wished_new).T @ matrix(bought_old | bought_new)
+        + matrix(wished_old).T @ matrix(bought_new)
+    ).tocoo()
+
+    products = np.array(products, dtype=np.int64)
+    product_ids, other_product_ids = products[delta.row], products[delta.col]
+    # Buying the product you wished for is not a recommendation
+    keep = (product_ids != other_product_ids) & (delta.data > 0)
+    return product_ids[keep], other_product_ids[keep], delta.data[keep]
+
+
+def refresh_cooccurrences(user_batch_size=5000):
+    """
+    Adds the wishlist and order rows created since the last run to the co-occurrence counts, then rebuilds
+    the top-K recommendations of the products whose counts changed.
+
+    Runs in one transaction holding the checkpoint row lock, so overlapping runs wait instead of counting
+    the same rows twice.
+    """
+    top_k = settings.PRODUCT_RECOMMENDATIONS_TOP_K
+    with transaction.atomic():
+        checkpoint, _ = CooccurrenceCheckpoint.objects.get_or_create(pk=1)
+        checkpoint = CooccurrenceCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+
+        max_wishlist_id = WishList.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+        max_order_item_id = OrderItem.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+
+        user_ids = set(
+            WishList.objects.filter(id__gt=checkpoint.last_wishlist_id, id__lte=max_wishlist_id)
+            .values_list("user_id", flat=True)
+            .distinct()
+        )
+        user_ids |= set(
+            OrderItem.objects.filter(id__gt=checkpoint.last_order_item_id, id__lte=max_order_item_id)
+            .values_list("order__user_id", flat=True)
+            .distinct()
+        )
+
+        changed_products = set()
+        user_ids = sorted(user_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(user_ids), user_batch_size):
+                product_ids, other_product_ids, counts = compute_cooccurrence_delta(
+                    user_ids[start:start + user_batch_size], checkpoint, max_wishlist_id, max_order_item_id
+                )
+                if not len(counts):
+                    continue
+                cursor.execute(
+                    UPSERT_COOCCURRENCES_SQL,
+                    [product_ids.tolist(), other_product_ids.tolist(), counts.tolist()],
+                )
+                changed_products.update(product_ids.tolist())
+
+            if changed_products:
+                changed_products = sorted(changed_products)
+                cursor.execute(
+                    "DELETE FROM contents_productrecommendation WHERE product_id = ANY(%s)", [changed_products]
+                )
+                cursor.execute(REBUILD_TOP_K_SQL, [changed_products, top_k])
+
+        checkpoint.last_wishlist_id = max_wishlist_id
+        checkpoint.last_order_item_id = max_order_item_id
+        checkpoint.save()
+
+    return {"users": len(user_ids), "products": len(changed_products)}
@@ -0,0 +1,174 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from contents.locks import RedisLock
+from contents.models import DailySalesSummary, Order, OrderItem
+
+SALES_SUMMARY_WATERMARK_KEY = "reports:sales_summary:watermark"
+SALES_SUMMARY_LOCK_KEY = "reports:sales_summary:lock"
+# Days an order moved out of (its `order_date` changed), refreshed by the next incremental refresh
+SALES_SUMMARY_MOVED_DAYS_KEY = "reports:sales_summary:moved_days"
+
+SALES_REPORT_GROUPS = {
+    "day": "day",
+    "category": "product_category",
+    "brand": "product_brand",
+}
+
+SALES_SUMMARY_INSERT_SQL = """
+    INSERT INTO contents_dailysalessummary
+        (day, product_category, product_brand, gross_revenue, discounts, revenue, units, order_items)
+    SELECT
+        (o.order_date AT TIME ZONE %(tz)s)::date,
+        COALESCE(c.name, ''),
+        COALESCE(b.name, ''),
+        SUM(oi.item_price * oi.quantity),
+        SUM(oi.discount_amount),
+        SUM(oi.item_price * oi.quantity - oi.discount_amount),
+        SUM(oi.quantity),
+        COUNT(*)
+    FROM contents_orderitem oi
+    JOIN contents_order o ON o.id = oi.order_id
+    JOIN contents_product p ON p.id = oi.product_id
+    LEFT JOIN contents_category c ON c.id = p.category_id
+    LEFT JOIN contents_brand b ON b.id = p.brand_id
+    {where}
+    GROUP BY 1, 2, 3
+"""
+
+
+def get_changed_days(since):
+    """
+    Order days having an order or order item created/updated after `since`. One query per table, each walking
+    its `updated_at` index: an OR across the join would scan every order item.
+    """
+    tzinfo = timezone.get_current_timezone()
+    items = (
+        OrderItem.objects.filter(updated_at__gt=since)
+        .annotate(day=TruncDate("order__order_date", tzinfo=tzinfo))
+        .values_list("day", flat=True)
+    )
+    orders = (
+        Order.objects.filter(updated_at__gt=since)
+        .annotate(day=TruncDate("order_date", tzinfo=tzinfo))
+        .values_list("day", flat=True)
+    )
+    return set(items.union(orders))
+
+
+def on_order_saved(sender, instance, **kwargs):
+    """
+    Remembers the previous day of an order whose `order_date` changed: the changed days only give its new day.
+    Bulk updates (`QuerySet.update`) of `order_date` are only picked up by a full refresh.
+    """
+    saved_order_date = getattr(instance, "_saved_order_date", None)
+    if saved_order_date is not None and saved_order_date != instance.order_date:
+        day = timezone.localdate(saved_order_date).isoformat()
+        transaction.on_commit(
+            lambda: get_redis_connection("default").sadd(SALES_SUMMARY_MOVED_DAYS_KEY, day), robust=True
+        )
+    instance._saved_order_date = instance.order_date
+
+
+post_save.connect(on_order_saved, sender=Order, dispatch_uid="reports_order_saved")
+
+
+def refresh_sales_summary(full=False):
+    """
+    Rebuilds the `DailySalesSummary` rows of the days that changed since the previous refresh,
+    or of every day with `full=True` (also done when the watermark is missing).
+
+    Each day is replaced as a whole inside one transaction, so readers never see a half refreshed day.
+    Deleted order items are only picked up by a full refresh. The previous day of an order whose date moved is
+    refreshed too (see `on_order_saved`).
+
+    Runs one at a time, a run starting while another one holds the lock is skipped (the running one
+    advances the watermark).
+    """
+    lock = RedisLock(SALES_SUMMARY_LOCK_KEY)
+    if not lock.acquire():
+        return {"skipped": True, "full": full, "days": 0}
+    try:
+        return _refresh_sales_summary(full)
+    finally:
+        lock.release()
+
+
+def _refresh_sales_summary(full):
+    started_at = timezone.now()
+    watermark = None if full else cache.get(SALES_SUMMARY_WATERMARK_KEY)
+    tz_name = settings.TIME_ZONE
+    redis = get_redis_connection("default")
+    moved_days = redis.smembers(SALES_SUMMARY_MOVED_DAYS_KEY)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if watermark is None:
+            DailySalesSummary.objects.all().delete()
+            cursor.execute(SALES_SUMMARY_INSERT_SQL.format(where=""), {"tz": tz_name})
+            refreshed_days = None
+        else:
+            refreshed_days = sorted(
+                get_changed_days(watermark) | {datetime.date.fromisoformat(day.decode()) for day in moved_days}
+            )
+            if refreshed_days:
+                DailySalesSummary.objects.filter(day__in=refreshed_days).delete()
+                # The range on `order_date` keeps the day filter index friendly
+                where = """
+                    WHERE o.order_date >= %(start)s AND o.order_date < %(end)s
+                      AND (o.order_date AT TIME ZONE %(tz)s)::date = ANY(%(days)s)
+                """
+                tzinfo = timezone.get_current_timezone()
+                cursor.execute(
+                    SALES_SUMMARY_INSERT_SQL.format(where=where),
+                    {
+                        "tz": tz_name,
+                        "days": refreshed_days,
+                        "start": datetime.datetime.combine(refreshed_days[0], datetime.time.min, tzinfo),
+                        "end": datetime.datetime.combine(
+                            refreshed_days[-1] + datetime.timedelta(days=1), datetime.time.min, tzinfo
+                        ),
+                    },
+                )
+
+    # Rows updated while the refresh was running are picked up by the next one
+    cache.set(SALES_SUMMARY_WATERMARK_KEY, started_at, timeout=None)
+    if moved_days:
+        redis.srem(SALES_SUMMARY_MOVED_DAYS_KEY, *moved_days)
+    return {"full": refreshed_days is None, "days": len(refreshed_days or [])}
+
+
+def get_sales_report(group_by, start=None, end=None, category=None, brand=None):
+    """
+    Revenue, units and discounts grouped by `day`, `category` or `brand`, read from the summary table.
+    """
+    queryset = DailySalesSummary.objects.all()
+    if start:
+        queryset = queryset.filter(day__gte=start)
+    if end:
+        queryset = queryset.filter(day__lte=end)
+    if category:
+        queryset = queryset.filter(product_category=category)
+    if brand:
+        queryset = queryset.filter(product_brand=brand)
+
+    group_field = SALES_REPORT_GROUPS[group_by]
+    rows = (
+        queryset.values(group_field)
+        .annotate(
+            gross_revenue=Sum("gross_revenue"),
+            discounts=Sum("discounts"),
+            revenue=Sum("revenue"),
+            units=Sum("units"),
+            order_items=Sum("order_items"),
+        )
+        .order_by(group_field if group_by == "day" else "-revenue")
+    )
+    return list(rows)
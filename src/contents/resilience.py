@@ -0,0 +1,167 @@
+import time
+import uuid
+
+from django_redis import get_redis_connection
+
+# The state changes run as scripts so the workers sharing a breaker never overwrite each other's updates.
+# A breaker opens after `threshold` consecutive failures. Once `reset_timeout` passed, a single call is let
+# through (half open): its success closes the breaker, its failure opens it again.
+BREAKER_ALLOW_SCRIPT = """
+local state = redis.call("hget", KEYS[1], "state") or "closed"
+local now = tonumber(ARGV[1])
+local reset_timeout = tonumber(ARGV[2])
+if state == "closed" then
+    return 1
+end
+local opened_at = tonumber(redis.call("hget", KEYS[1], "opened_at") or 0)
+if now - opened_at >= reset_timeout then
+    -- Also covers a half open probe that never reported back
+    redis.call("hset", KEYS[1], "state", "half_open", "opened_at", now)
+    return 1
+end
+redis.call("hincrby", KEYS[1], "rejected", 1)
+return 0
+"""
+
+BREAKER_FAILURE_SCRIPT = """
+local state = redis.call("hget", KEYS[1], "state") or "closed"
+local failures = redis.call("hincrby", KEYS[1], "consecutive_failures", 1)
+redis.call("hincrby", KEYS[1], "failures", 1)
+if state == "half_open" or (state == "closed" and failures >= tonumber(ARGV[2])) then
+    redis.call("hset", KEYS[1], "state", "open", "opened_at", ARGV[1])
+    redis.call("hincrby", KEYS[1], "opened", 1)
+end
+return failures
+"""
+
+BREAKER_SUCCESS_SCRIPT = """
+redis.call("hset", KEYS[1], "state", "closed", "consecutive_failures", 0)
+redis.call("hincrby", KEYS[1], "successes", 1)
+return 1
+"""
+
+# In flight calls are kept in a sorted set scored by their deadline, so the slots of a worker that died
+# are given back once their deadline passed.
+LIMITER_ACQUIRE_SCRIPT = """
+redis.call("zremrangebyscore", KEYS[2], "-inf", ARGV[1])
+local limit = tonumber(redis.call("hget", KEYS[1], "limit") or ARGV[3])
+if redis.call("zcard", KEYS[2]) < math.floor(limit) then
+    redis.call("zadd", KEYS[2], ARGV[2], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+# Additive increase: +1 per window of successful calls. Multiplicative decrease: halved on overload.
+LIMITER_RELEASE_SCRIPT = """
+redis.call("zrem", KEYS[2], ARGV[1])
+local limit = tonumber(redis.call("hget", KEYS[1], "limit") or ARGV[3])
+if ARGV[2] == "1" then
+    limit = math.min(tonumber(ARGV[5]), limit + 1 / limit)
+    redis.call("hincrby", KEYS[1], "successes", 1)
+else
+    limit = math.max(tonumber(ARGV[4]), limit / 2)
+    redis.call("hincrby", KEYS[1], "overloads", 1)
+end
+redis.call("hset", KEYS[1], "limit", tostring(limit))
+return tostring(limit)
+"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of an upstream endpoint, its state is shared by every worker through redis.
+    """
+    KEY_PREFIX = "contents:breaker"
+
+    def __init__(self, name, threshold, reset_timeout):
+        self.redis = get_redis_connection("default")
+        self.name = name
+        self.key = f"{self.KEY_PREFIX}:{name}"
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+
+    def allow(self):
+        return bool(self.redis.eval(BREAKER_ALLOW_SCRIPT, 1, self.key, time.time(), self.reset_timeout))
+
+    def record_success(self):
+        self.redis.eval(BREAKER_SUCCESS_SCRIPT, 1, self.key)
+
+    def record_failure(self):
+        self.redis.eval(BREAKER_FAILURE_SCRIPT, 1, self.key, time.time(), self.threshold)
+
+    def retry_in(self):
+        """
+        Seconds before an open breaker lets a call through again, 0 when it is not open.
+        """
+        state, opened_at = self.redis.hmget(self.key, "state", "opened_at")
+        if state != b"open":
+            return 0
+        return max(float(opened_at) + self.reset_timeout - time.time(), 0)
+
+    def get_stats(self):
+        stats = {key.decode(): value.decode() for key, value in self.redis.hgetall(self.key).items()}
+        return {
+            "state": stats.get("state", "closed"),
+            "consecutive_failures": int(stats.get("consecutive_failures", 0)),
+            "successes": int(stats.get("successes", 0)),
+            "failures": int(stats.get("failures", 0)),
+            "rejected": int(stats.get("rejected", 0)),
+            "opened": int(stats.get("opened", 0)),
+            "retry_in": round(self.retry_in(), 1),
+        }
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit shared by every worker through redis, adapted with AIMD: it grows by one call per
+    window of successes and is halved when the upstream shows it is overloaded (errors, timeouts, 429).
+    """
+    KEY_PREFIX = "contents:aimd"
+
+    def __init__(self, name, min_limit, max_limit, slot_timeout):
+        self.redis = get_redis_connection("default")
+        self.name = name
+        self.key = f"{self.KEY_PREFIX}:{name}"
+        self.in_flight_key = f"{self.key}:in_flight"
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.slot_timeout = slot_timeout
+
+    def try_acquire(self):
+        """
+        Returns a slot token, or None when the limit is reached.
+        """
+        token = uuid.uuid4().hex
+        now = time.time()
+        acquired = self.redis.eval(
+            LIMITER_ACQUIRE_SCRIPT, 2, self.key, self.in_flight_key,
+            now, now + self.slot_timeout, self.min_limit, token,
+        )
+        return token if acquired else None
+
+    def acquire(self, wait, poll_interval=0.1):
+        deadline = time.monotonic() + wait
+        while True:
+            token = self.try_acquire()
+            if token or time.monotonic() >= deadline:
+                return token
+            time.sleep(poll_interval)
+
+    def release(self, token, success):
+        self.redis.eval(
+            LIMITER_RELEASE_SCRIPT, 2, self.key, self.in_flight_key,
+            token, "1" if success else "0", self.min_limit, self.min_limit, self.max_limit,
+        )
+
+    def get_limit(self):
+        return int(float(self.redis.hget(self.key, "limit") or self.min_limit))
+
+    def get_stats(self):
+        limit, successes, overloads = self.redis.hmget(self.key, "limit", "successes", "overloads")
+        return {
+            "limit": round(float(limit or self.min_limit), 2),
+            "in_flight": self.redis.zcount(self.in_flight_key, time.time(), "+inf"),
+            "successes": int(successes or 0),
+            "overloads": int(overloads or 0),
+        }
@@ -1,6 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
 
-from contents.models import Content, Author
+from contents.models import Content, Author, Product, Order, OrderItem, Payment, ProductRecommendation
 
 
 # For Reading the data from the DB
@@ -13,7 +14,8 @@ class AuthorSerializer(serializers.ModelSerializer):
 class ContentBaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Content
-        fields = '__all__'
+        # The comment push state is internal, it is not part of the content schema
+        exclude = ('is_pushed', 'push_attempts', 'push_failed_at', 'push_failure')
 
 
 class ContentSerializer(serializers.Serializer):
@@ -21,6 +23,12 @@ class ContentSerializer(serializers.Serializer):
     content = ContentBaseSerializer(read_only=True)
 
 
+class ContentLookupSerializer(serializers.Serializer):
+    unq_external_ids = serializers.ListField(
+        child=serializers.CharField(max_length=1024), min_length=1, max_length=settings.CONTENT_LOOKUP_MAX_IDS,
+    )
+
+
 # For Writing the data from third party api to our database
 class StatCountSerializer(serializers.Serializer):
     """
@@ -64,3 +72,56 @@ class ContentPostSerializer(serializers.Serializer):
     title = serializers.CharField(required=True)
     hashtags = serializers.ListField(child=serializers.CharField())
     timestamp = serializers.DateTimeField(required=True)
+
+
+class TopRatedProductSerializer(serializers.ModelSerializer):
+    category = serializers.CharField(source="category.name", default=None)
+    brand = serializers.CharField(source="brand.name", default=None)
+
+    class Meta:
+        model = Product
+        fields = (
+            "id", "product_id", "product_name", "product_price", "category", "brand",
+            "rating_count", "rating_average",
+        )
+
+
+class ProductRecommendationSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source="recommended_product.id")
+    product_id = serializers.IntegerField(source="recommended_product.product_id")
+    product_name = serializers.CharField(source="recommended_product.product_name")
+    product_price = serializers.DecimalField(
+        source="recommended_product.product_price", max_digits=10, decimal_places=2
+    )
+
+    class Meta:
+        model = ProductRecommendation
+        fields = ("id", "product_id", "product_name", "product_price", "score", "rank")
+
+
+class OrderHistoryItemSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField(source="product.product_id")
+    product_name = serializers.CharField(source="product.product_name")
+
+    class Meta:
+        model = OrderItem
+        fields = ("id", "product_id", "product_name", "quantity", "item_price", "discount_amount")
+
+
+class OrderHistoryPaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ("payment_id", "payment_method", "payment_status")
+
+
+class OrderHistorySerializer(serializers.ModelSerializer):
+    # Read from the prefetched relations, see `contents.orders.get_order_history_page`
+    items = OrderHistoryItemSerializer(source="orderitem_set", many=True)
+    payments = OrderHistoryPaymentSerializer(source="payment_set", many=True)
+
+    class Meta:
+        model = Order
+        fields = (
+            "id", "order_id", "order_date", "order_status", "shipping_method", "tracking_number",
+            "items", "payments",
+        )
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from contents.models import SlowQueryPlan
+
+logger = logging.getLogger(__name__)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+# `IN (?, ?, ?)` and multi row `VALUES (?, ?), (?, ?)` vary with the number of values, not the query
+VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+WHITESPACE = re.compile(r"\s+")
+# Statements EXPLAIN ANALYZE can run again without side effects
+READ_ONLY_STATEMENT = re.compile(
+    r"^\s*(SELECT|WITH)\b(?!.*\b(INSERT|UPDATE|DELETE|FOR UPDATE|FOR SHARE)\b)", re.IGNORECASE | re.DOTALL
+)
+
+UPSERT_SLOW_QUERY_SQL = """
+    INSERT INTO contents_slowquery
+        (fingerprint, source, sql, calls, total_duration, max_duration, first_seen, last_seen)
+    VALUES (%s, %s, %s, 1, %s, %s, %s, %s)
+    ON CONFLICT (fingerprint, source) DO UPDATE SET
+        calls = contents_slowquery.calls + 1,
+        total_duration = contents_slowquery.total_duration + EXCLUDED.total_duration,
+        max_duration = GREATEST(contents_slowquery.max_duration, EXCLUDED.max_duration),
+        last_seen = EXCLUDED.last_seen
+"""
+
+_local = threading.local()
+# Fingerprints this process knows a plan of, saves a query per slow query
+_explained = set()
+
+
+def normalize(sql):
+    """
+    The SQL with its literals and placeholders replaced by `?`, and value lists collapsed to `(...)`.
+    """
+    sql = STRING_LITERAL.sub("?", sql)
+    sql = NUMBER_LITERAL.sub("?", sql.replace("%s", "?"))
+    sql = VALUE_LIST.sub("(...)", sql)
+    return WHITESPACE.sub(" ", sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:16]
+
+
+class SlowQueryRecorder:
+    """
+    `connection.execute_wrapper` timing every query, the ones slower than `SLOW_QUERY_THRESHOLD_MS` are
+    sampled (`SLOW_QUERY_SAMPLE_RATE`) and kept in memory until the request or task is done.
+    """
+    def __init__(self):
+        self.threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        self.sample_rate = settings.SLOW_QUERY_SAMPLE_RATE
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= self.threshold and random.random() < self.sample_rate:
+                self.queries.append((sql, params, many, duration))
+
+    def flush(self, source):
+        queries, self.queries = self.queries, []
+        record_all(source, queries)
+
+
+def record_all(source, queries):
+    """
+    Adds the `(sql, params, many, duration)` slow queries to their `SlowQuery` stats, and captures the plan of
+    the fingerprints not seen before. The request or task is never failed by the recording.
+    """
+    for sql, params, many, duration in queries:
+        try:
+            record(source, sql, params, many, duration)
+        except DatabaseError:
+            logger.exception("Could not record a slow query of %s", source)
+
+
+def record(source, sql, params, many, duration):
+    normalized = normalize(sql)
+    query_fingerprint = fingerprint(normalized)
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SLOW_QUERY_SQL, [query_fingerprint, source[:200], normalized, duration, duration, now, now]
+        )
+    # executemany has no single set of params to explain, and the writes of a request are sent without theirs
+    # (see `to_task_queries`)
+    if settings.SLOW_QUERY_CAPTURE_PLANS and not many and (params is not None or "%s" not in sql):
+        capture_plan(query_fingerprint, sql, params, duration)
+
+
+def to_task_queries(queries):
+    """
+    The slow queries of a request as arguments of the `record_slow_queries` task. Params are sent as JSON text,
+    they can be psycopg adapters (e.g. `Jsonb`) the broker can't serialize. Only the read only statements keep
+    theirs: the writes may carry payloads such as `secret_value`, they are counted without a plan.
+    """
+    return [
+        (
+            sql,
+            json.dumps(params, default=str) if params is not None and READ_ONLY_STATEMENT.match(sql) else None,
+            many,
+            duration,
+        )
+        for sql, params, many, duration in queries
+    ]
+
+
+def from_task_queries(queries):
+    return [
+        (sql, json.loads(params) if params is not None else None, many, duration)
+        for sql, params, many, duration in queries
+    ]
+
+
+def capture_plan(query_fingerprint, sql, params, duration):
+    """
+    Explains a query once per fingerprint. Read only statements are run again with `EXPLAIN (ANALYZE, BUFFERS)`,
+    bounded by `SLOW_QUERY_EXPLAIN_TIMEOUT_MS`, the others (and the ones timing out) only get the planner's plan.
+    """
+    if query_fingerprint in _explained:
+        return
+    if SlowQueryPlan.objects.filter(fingerprint=query_fingerprint).exists():
+        _explained.add(query_fingerprint)
+        return
+
+    plan, analyzed = None, False
+    if READ_ONLY_STATEMENT.match(sql):
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config('statement_timeout', %s, true)", [str(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)]
+                )
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+                plan, analyzed = cursor.fetchone()[0], True
+        except DatabaseError:
+            pass
+    if plan is None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+
+    SlowQueryPlan.objects.bulk_create(
+        [
+            SlowQueryPlan(
+                fingerprint=query_fingerprint,
+                sql=sql,
+                params=json.dumps(params, default=str) if params is not None else "",
+                duration=duration,
+                plan=plan,
+                analyzed=analyzed,
+                captured_at=timezone.now(),
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    _explained.add(query_fingerprint)
+
+
+def start_recording():
+    """
+    Starts recording the queries of the current thread until `stop_recording`, for the code that does not run
+    in a request (celery tasks).
+    """
+    stop_recording(None)
+    _local.recorder = SlowQueryRecorder()
+    connection.execute_wrappers.append(_local.recorder)
+
+
+def stop_recording(source):
+    recorder = getattr(_local, "recorder", None)
+    if recorder is None:
+        return
+    _local.recorder = None
+    if recorder in connection.execute_wrappers:
+        connection.execute_wrappers.remove(recorder)
+    if source is not None:
+        recorder.flush(source)
@@ -0,0 +1,191 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast, NullIf, TruncDate
+from django.utils import timezone
+
+from contents.locks import RedisLock
+from contents.models import Content, ContentStatSnapshot, ContentTag, TagCooccurrence, TagDailyStats
+
+TAG_STATS_WATERMARK_KEY = "tag_analytics:daily_stats:watermark"
+TAG_STATS_LOCK_KEY = "tag_analytics:daily_stats:lock"
+
+# Sortable fields of the tag stats
+TAG_STATS_ORDERINGS = (
+    "total_engagement", "total_engagement_rate", "total_contents", "total_views", "total_likes",
+    "total_comments", "total_shares", "tag",
+)
+
+# Tags are counted by lowercased name, so duplicated tags (see the `merge_duplicate_tags` backfill) and case
+# variants are one tag. A content tagged twice with the same tag counts once.
+TAG_DAILY_STATS_INSERT_SQL = """
+    INSERT INTO contents_tagdailystats
+        (day, tag, contents, like_count, comment_count, share_count, view_count)
+    SELECT
+        (c.timestamp AT TIME ZONE %(tz)s)::date,
+        tagged.tag,
+        COUNT(*),
+        SUM(c.like_count),
+        SUM(c.comment_count),
+        SUM(c.share_count),
+        SUM(c.view_count)
+    FROM contents_content c
+    CROSS JOIN LATERAL (
+        SELECT DISTINCT lower(t.name) AS tag
+        FROM contents_contenttag ct JOIN contents_tag t ON t.id = ct.tag_id
+        WHERE ct.content_id = c.id
+    ) tagged
+    WHERE c.timestamp IS NOT NULL {where}
+    GROUP BY 1, 2
+"""
+
+TAG_COOCCURRENCE_INSERT_SQL = """
+    WITH tagged AS (
+        SELECT DISTINCT ct.content_id, lower(t.name) AS tag
+        FROM contents_content c
+        JOIN contents_contenttag ct ON ct.content_id = c.id
+        JOIN contents_tag t ON t.id = ct.tag_id
+        WHERE c.timestamp >= %(since)s
+    ),
+    tag_contents AS (
+        SELECT tag, COUNT(*) AS contents FROM tagged GROUP BY tag
+    ),
+    pairs AS (
+        SELECT a.tag, b.tag AS related_tag, COUNT(*) AS contents
+        FROM tagged a JOIN tagged b ON b.content_id = a.content_id AND b.tag <> a.tag
+        GROUP BY a.tag, b.tag
+    )
+    INSERT INTO contents_tagcooccurrence (tag, related_tag, contents, share, rank)
+    SELECT tag, related_tag, contents, share, rank
+    FROM (
+        SELECT pairs.tag, pairs.related_tag, pairs.contents,
+               pairs.contents::float / tag_contents.contents AS share,
+               ROW_NUMBER() OVER (PARTITION BY pairs.tag ORDER BY pairs.contents DESC, pairs.related_tag) AS rank
+        FROM pairs JOIN tag_contents ON tag_contents.tag = pairs.tag
+    ) ranked
+    WHERE rank <= %(top_k)s
+"""
+
+
+def get_changed_days(since, last_content_tag_id):
+    """
+    Content days having a content whose stats changed after `since` (every ingest of new stats records a
+    snapshot), or a content tag added after `last_content_tag_id`. Snapshots are committed after the time they
+    are captured at, the ones captured up to `TAG_STATS_REFRESH_MARGIN` before `since` are looked at again.
+    """
+    captured_since = since - datetime.timedelta(seconds=settings.TAG_STATS_REFRESH_MARGIN)
+    content_ids = set(
+        ContentStatSnapshot.objects.filter(captured_at__gt=captured_since)
+        .values_list("content_id", flat=True)
+        .distinct()
+    )
+    content_ids.update(
+        ContentTag.objects.filter(id__gt=last_content_tag_id).values_list("content_id", flat=True).distinct()
+    )
+    tzinfo = timezone.get_current_timezone()
+    return set(
+        Content.objects.filter(id__in=content_ids, timestamp__isnull=False)
+        .annotate(day=TruncDate("timestamp", tzinfo=tzinfo))
+        .values_list("day", flat=True)
+        .distinct()
+    )
+
+
+def refresh_tag_daily_stats(full=False):
+    """
+    Rebuilds the `TagDailyStats` rows of the days that changed since the previous refresh, or of every day
+    with `full=True` (also done when the watermark is missing).
+
+    Each day is replaced as a whole inside one transaction. Removed tags, and the old day of a content whose
+    timestamp moved, are only picked up by a full refresh.
+
+    Runs one at a time, a run starting while another one holds the lock is skipped (the running one
+    advances the watermark).
+    """
+    lock = RedisLock(TAG_STATS_LOCK_KEY)
+    if not lock.acquire():
+        return {"skipped": True, "full": full, "days": 0}
+    try:
+        return _refresh_tag_daily_stats(full)
+    finally:
+        lock.release()
+
+
+def _refresh_tag_daily_stats(full):
+    started_at = timezone.now()
+    watermark = None if full else cache.get(TAG_STATS_WATERMARK_KEY)
+    last_content_tag_id = ContentTag.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    tz_name = settings.TIME_ZONE
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if watermark is None:
+            TagDailyStats.objects.all().delete()
+            cursor.execute(TAG_DAILY_STATS_INSERT_SQL.format(where=""), {"tz": tz_name})
+            refreshed_days = None
+        else:
+            since, since_content_tag_id = watermark
+            refreshed_days = sorted(get_changed_days(since, since_content_tag_id))
+            if refreshed_days:
+                TagDailyStats.objects.filter(day__in=refreshed_days).delete()
+                # The range on `timestamp` prunes the partitions of `contents_content`
+                where = """
+                    AND c.timestamp >= %(start)s AND c.timestamp < %(end)s
+                    AND (c.timestamp AT TIME ZONE %(tz)s)::date = ANY(%(days)s)
+                """
+                tzinfo = timezone.get_current_timezone()
+                cursor.execute(
+                    TAG_DAILY_STATS_INSERT_SQL.format(where=where),
+                    {
+                        "tz": tz_name,
+                        "days": refreshed_days,
+                        "start": datetime.datetime.combine(refreshed_days[0], datetime.time.min, tzinfo),
+                        "end": datetime.datetime.combine(
+                            refreshed_days[-1] + datetime.timedelta(days=1), datetime.time.min, tzinfo
+                        ),
+                    },
+                )
+
+    cache.set(TAG_STATS_WATERMARK_KEY, (started_at, last_content_tag_id), timeout=None)
+    return {"full": refreshed_days is None, "days": len(refreshed_days or [])}
+
+
+def refresh_tag_cooccurrences():
+    """
+    Rebuilds the top `TAG_COOCCURRENCE_TOP_K` co-occurring tags of every tag, over the contents of the last
+    `TAG_COOCCURRENCE_DAYS` days, in one transaction: readers keep the previous table until it commits.
+    """
+    since = timezone.now() - datetime.timedelta(days=settings.TAG_COOCCURRENCE_DAYS)
+    with transaction.atomic(), connection.cursor() as cursor:
+        TagCooccurrence.objects.all().delete()
+        cursor.execute(TAG_COOCCURRENCE_INSERT_SQL, {"since": since, "top_k": settings.TAG_COOCCURRENCE_TOP_K})
+        return cursor.rowcount
+
+
+def get_tag_stats(days, ordering="-total_engagement", start=0, limit=20):
+    """
+    Contents and engagement per tag over the content days of the last `days` days (today included),
+    read from the daily aggregates.
+    """
+    order = F(ordering.lstrip("-"))
+    order = order.desc(nulls_last=True) if ordering.startswith("-") else order.asc(nulls_last=True)
+    rows = (
+        TagDailyStats.objects.filter(day__gte=timezone.localdate() - datetime.timedelta(days=days))
+        .values("tag")
+        .annotate(
+            total_contents=Sum("contents"),
+            total_likes=Sum("like_count"),
+            total_comments=Sum("comment_count"),
+            total_shares=Sum("share_count"),
+            total_views=Sum("view_count"),
+            total_engagement=Sum(F("like_count") + F("comment_count") + F("share_count")),
+        )
+        .annotate(total_engagement_rate=Cast("total_engagement", FloatField()) / NullIf("total_views", 0))
+        .order_by(order, "tag")[start:start + limit]
+    )
+    return [
+        {**row, "total_engagement_rate": round(row["total_engagement_rate"] or 0, 2)}
+        for row in rows
+    ]
@@ -1,9 +1,42 @@
+import logging
+
 import requests
+from celery.signals import task_postrun, task_prerun
 from django.conf import settings
 
 from contentapi.celery import app
+from contents import content_partitioning, slow_queries, trending
+from contents.models import Product
+from contents.partitions import add_monthly_partitions, drop_monthly_partitions
+from contents.recommendations import refresh_cooccurrences
+from contents.reports import refresh_sales_summary
+from contents.tag_analytics import refresh_tag_cooccurrences, refresh_tag_daily_stats
 from contents.utils import ContentFetcher, ContentPusher
 
+logger = logging.getLogger(__name__)
+
+REORDER_WEBHOOK_MAX_RETRIES = 5
+
+
+@task_prerun.connect
+def record_task_slow_queries(task=None, **kwargs):
+    # The plans it captures run the slow queries again
+    if task.name != record_slow_queries.name:
+        slow_queries.start_recording()
+
+
+@task_postrun.connect
+def flush_task_slow_queries(task=None, **kwargs):
+    slow_queries.stop_recording(f"task {task.name}")
+
+
+@app.task(queue="contentapi.content_pull")
+def record_slow_queries(source, queries):
+    """
+    Stores the slow queries of a request (see `slow_queries.to_task_queries`), out of its response time.
+    """
+    slow_queries.record_all(source, slow_queries.from_task_queries(queries))
+
 
 @app.task(queue="contentapi.content_pull")
 def pull_and_store_content():
@@ -11,9 +44,104 @@ def pull_and_store_content():
     #  which is not ideal
 
     fetcher = ContentFetcher()
-    fetcher.fetch_contents()
+    return fetcher.fetch_contents()
 
 @app.task(queue="contentapi.push_content")
 def content_pusher():
     content_pusher = ContentPusher()
     content_pusher.push()
+
+
+@app.task(queue="contentapi.content_pull")
+def maintain_stat_snapshot_partitions():
+    table = "contents_contentstatsnapshot"
+    created = add_monthly_partitions(table, "captured_at", f"{table}_default")
+    dropped = drop_monthly_partitions(table, keep_months=settings.STAT_SNAPSHOT_RETENTION_MONTHS)
+    return {"created": created, "dropped": dropped}
+
+
+@app.task(queue="contentapi.content_pull")
+def maintain_content_partitions():
+    created = content_partitioning.maintain_partitions()
+    future_rows = content_partitioning.count_future_default_rows()
+    if future_rows:
+        logger.warning("%s contents past the last partition are kept in the default partition", future_rows)
+    return {"created": created, "default_partition_future_rows": future_rows}
+
+
+@app.task(queue="contentapi.content_pull")
+def refresh_sales_summary_task(full=False):
+    return refresh_sales_summary(full=full)
+
+
+@app.task(queue="contentapi.content_pull")
+def recompute_product_ratings(product_ids=None, batch_size=1000):
+    """
+    Run after bulk review imports, every product is recomputed when `product_ids` is not given.
+    """
+    if product_ids is None:
+        product_ids = Product.objects.order_by("pk").values_list("pk", flat=True).iterator()
+
+    updated, batch = 0, []
+    for product_id in product_ids:
+        batch.append(product_id)
+        if len(batch) == batch_size:
+            updated += Product.recompute_ratings(batch)
+            batch = []
+    if batch:
+        updated += Product.recompute_ratings(batch)
+    return updated
+
+
+@app.task(queue="contentapi.content_pull")
+def refresh_product_recommendations():
+    return refresh_cooccurrences()
+
+
+@app.task(
+    queue="contentapi.content_pull",
+    autoretry_for=(requests.RequestException,), retry_backoff=True, max_retries=REORDER_WEBHOOK_MAX_RETRIES,
+)
+def notify_reorder_point(warehouse_id, product_id, quantity, reorder_point):
+    """
+    Logs a warehouse going below its reorder point, and posts it to `REORDER_WEBHOOK_URL` when set.
+    """
+    logger.warning(
+        "Warehouse %s has %s units of product %s left, below its reorder point of %s",
+        warehouse_id, quantity, product_id, reorder_point,
+    )
+    if not settings.REORDER_WEBHOOK_URL:
+        return
+    response = requests.post(
+        settings.REORDER_WEBHOOK_URL,
+        json={
+            "event": "reorder_point",
+            "warehouse_id": warehouse_id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "reorder_point": reorder_point,
+        },
+        timeout=settings.REORDER_WEBHOOK_TIMEOUT,
+    )
+    response.raise_for_status()
+
+
+@app.task(queue="contentapi.content_pull")
+def refresh_tag_daily_stats_task(full=False):
+    return refresh_tag_daily_stats(full=full)
+
+
+@app.task(queue="contentapi.content_pull")
+def refresh_tag_cooccurrences_task():
+    return refresh_tag_cooccurrences()
+
+
+@app.task(queue="contentapi.content_pull")
+def rebuild_trending_days():
+    try:
+        missing = trending.missing_days(trending.window_days(settings.TRENDING_RETENTION_DAYS))
+        for day in missing:
+            trending.rebuild_day(day)
+        return len(missing)
+    finally:
+        trending.release_rebuild()
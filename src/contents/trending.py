@@ -0,0 +1,193 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+KEY_PREFIX = "contents:trending"
+# Set while a rebuild of the missing days is queued, so the cold requests enqueue it once
+REBUILD_KEY = f"{KEY_PREFIX}:rebuilding"
+
+# Engagement gained by each content in [start, end): its last engagement in the range minus its last one before.
+# Without an earlier snapshot the content counts from 0 (like its first ingest) only if it is new, otherwise its
+# history was dropped with the old partitions and the gain is unknown.
+ENGAGEMENT_GAINS_SQL = """
+    WITH last_in_range AS (
+        SELECT DISTINCT ON (s.content_id)
+            s.content_id,
+            s.like_count + s.comment_count + s.share_count AS engagement
+        FROM contents_contentstatsnapshot s
+        WHERE s.captured_at >= %(start)s AND s.captured_at < %(end)s
+        ORDER BY s.content_id, s.captured_at DESC
+    )
+    SELECT
+        r.content_id,
+        c.author_id,
+        r.engagement - COALESCE(before.engagement, 0) AS gained,
+        ARRAY(
+            SELECT DISTINCT lower(t.name)
+            FROM contents_contenttag ct JOIN contents_tag t ON t.id = ct.tag_id
+            WHERE ct.content_id = r.content_id
+        ) AS tags
+    FROM last_in_range r
+    JOIN contents_content c ON c.id = r.content_id
+    LEFT JOIN LATERAL (
+        SELECT p.like_count + p.comment_count + p.share_count AS engagement
+        FROM contents_contentstatsnapshot p
+        WHERE p.content_id = r.content_id AND p.captured_at < %(start)s
+        ORDER BY p.captured_at DESC
+        LIMIT 1
+    ) before ON true
+    WHERE (before.engagement IS NOT NULL OR c.created_at >= %(start)s) {where}
+    ORDER BY gained DESC
+    {limit}
+"""
+
+
+def day_key(day, *scope):
+    return ":".join([KEY_PREFIX, day.strftime("%Y%m%d"), *map(str, scope)])
+
+
+def ready_key(day):
+    return day_key(day, "ready")
+
+
+def window_days(days):
+    today = timezone.now().date()
+    return [today - datetime.timedelta(days=offset) for offset in range(days)]
+
+
+def day_start(day):
+    # The leaderboards are keyed by the UTC date of `timezone.now()`
+    return datetime.datetime.combine(day, datetime.time.min, datetime.timezone.utc)
+
+
+def engagement_gains(start, end, limit=None, author_id=None, tag=None):
+    """
+    Returns `[(content_id, author_id, gained, tags), ...]` of the contents whose engagement changed
+    in `[start, end)`, computed from their stat history, most gained first.
+    """
+    where = ""
+    if author_id:
+        where += " AND c.author_id = %(author_id)s"
+    if tag:
+        where += """
+            AND EXISTS (
+                SELECT 1 FROM contents_contenttag ct JOIN contents_tag t ON t.id = ct.tag_id
+                WHERE ct.content_id = r.content_id AND lower(t.name) = %(tag)s
+            )
+        """
+    sql = ENGAGEMENT_GAINS_SQL.format(where=where, limit="LIMIT %(limit)s" if limit else "")
+    params = {"start": start, "end": end, "limit": limit, "author_id": author_id, "tag": tag.lower() if tag else None}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def record_engagement_delta(content, delta, tags=()):
+    """
+    Adds the engagement gained by `content` since the last ingest to today's leaderboards
+    (global, the author's and one per tag).
+    """
+    if not delta:
+        return
+
+    day = timezone.now().date()
+    keys = [day_key(day), day_key(day, "author", content.author_id)]
+    keys += [day_key(day, "tag", tag.lower()) for tag in set(tags)]
+
+    ttl = datetime.timedelta(days=settings.TRENDING_RETENTION_DAYS)
+    pipeline = get_redis_connection("default").pipeline(transaction=False)
+    for key in keys:
+        pipeline.zincrby(key, delta, content.pk)
+        pipeline.expire(key, ttl)
+    pipeline.execute()
+
+
+def missing_days(days):
+    """
+    Returns the days of `days` whose leaderboards are not complete in redis, i.e. have no ready marker.
+    Today counts as complete when yesterday is: a flush would have removed yesterday's marker too, so every
+    delta since midnight was recorded.
+    """
+    redis = get_redis_connection("default")
+    ready = redis.mget([ready_key(day) for day in days])
+    missing = [day for day, marker in zip(days, ready) if marker is None]
+
+    today = timezone.now().date()
+    if today in missing and redis.exists(ready_key(today - datetime.timedelta(days=1))):
+        redis.set(ready_key(today), 1, ex=datetime.timedelta(days=settings.TRENDING_RETENTION_DAYS))
+        missing.remove(today)
+    return missing
+
+
+def rebuild_day(day):
+    """
+    Rebuilds the leaderboards of `day` from the stat history and marks the day as complete.
+    Deltas recorded while the history is read, before their snapshots are flushed, are lost.
+    """
+    start = day_start(day)
+    rows = engagement_gains(start, min(start + datetime.timedelta(days=1), timezone.now()))
+
+    redis = get_redis_connection("default")
+    ttl = datetime.timedelta(days=settings.TRENDING_RETENTION_DAYS)
+    pipeline = redis.pipeline()
+    pipeline.delete(day_key(day), *redis.scan_iter(match=f"{day_key(day)}:*"))
+    for content_id, author_id, gained, tags in rows:
+        if not gained:
+            continue
+        for key in [day_key(day), day_key(day, "author", author_id), *[day_key(day, "tag", tag) for tag in tags]]:
+            pipeline.zincrby(key, gained, content_id)
+            pipeline.expire(key, ttl)
+    pipeline.set(ready_key(day), 1, ex=ttl)
+    pipeline.execute()
+
+
+def claim_rebuild():
+    """
+    Returns whether the caller should enqueue the rebuild of the missing days, `False` while one is queued.
+    """
+    return bool(get_redis_connection("default").set(REBUILD_KEY, 1, nx=True, ex=settings.TRENDING_REBUILD_TTL))
+
+
+def release_rebuild():
+    get_redis_connection("default").delete(REBUILD_KEY)
+
+
+def top_content_scores(days, limit, author_id=None, tag=None):
+    """
+    Returns `[(content_id, score), ...]` of the contents that gained the most engagement in the last `days`,
+    or `None` when a day of the window is not complete in redis (e.g. after a flush) and the caller must fall
+    back to SQL until the missing days are rebuilt (see `rebuild_day`).
+
+    The union of the daily sets is kept for a short while, so repeated calls only pay for `ZREVRANGE`.
+    """
+    redis = get_redis_connection("default")
+    days_in_window = window_days(days)
+
+    if missing_days(days_in_window):
+        return None
+
+    scope = ("author", author_id) if author_id else ("tag", tag.lower()) if tag else ()
+    union_key = ":".join([KEY_PREFIX, "union", str(days), *map(str, scope), days_in_window[0].strftime("%Y%m%d")])
+
+    if not redis.exists(union_key):
+        pipeline = redis.pipeline()
+        pipeline.zunionstore(union_key, [day_key(day, *scope) for day in days_in_window])
+        pipeline.expire(union_key, settings.TRENDING_UNION_TTL)
+        pipeline.execute()
+
+    scores = redis.zrevrange(union_key, 0, limit - 1, withscores=True)
+    return [(int(content_id), score) for content_id, score in scores]
+
+
+def top_content_scores_from_db(days, limit, author_id=None, tag=None):
+    """
+    SQL fallback of `top_content_scores`, ranks the contents by the engagement they gained since the start
+    of the window, from their stat history.
+    """
+    rows = engagement_gains(
+        day_start(window_days(days)[-1]), timezone.now(), limit=limit, author_id=author_id, tag=tag
+    )
+    return [(content_id, gained) for content_id, _, gained, _ in rows]
@@ -1,23 +1,64 @@
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 
 from contentapi import settings
-from contents.models import Content, Author, Comment
+from contents import conditional, content_lookup, live_feed, trending
+from contents.locks import PullCoordinator
+from contents.ingest_cache import IngestCache
+from contents.models import Content, ContentStatSnapshot
+from contents.resilience import AIMDLimiter, CircuitBreaker
 
 
 class ContentFetcher:
     def __init__(self):
         self.API_BASE_URL = settings.API_BASE_URL
         self.header_api_key = settings.CONTENT_API_HEADER_X_API_KEY
+        self.pending_snapshots = []
+        self.changed_author_ids = set()
+        # Content id -> unique id
+        self.changed_contents = {}
+        self.ingest_cache = IngestCache()
 
     def fetch_contents(self):
+        """
+        Pages are claimed one by one through the `PullCoordinator`, so runs that overlap (beat fires every minute
+        whether the previous run finished or not) split the pages between them instead of upserting the same
+        pages concurrently.
+        """
+        coordinator = PullCoordinator()
+        generation = coordinator.start()
+        claimed, skipped = 0, 0
         page_number = 1
-        while page_number:
-            page_number = self.get_content_page(page_number)
-            if not page_number:
-                break
-            print(f"Processed page {page_number}")
+        try:
+            while not coordinator.is_past_last_page(page_number):
+                if not coordinator.claim_page(page_number):
+                    skipped += 1
+                    page_number += 1
+                    continue
+
+                claimed += 1
+                next_page = self.get_content_page(page_number)
+                if not next_page:
+                    coordinator.mark_last_page(page_number)
+                    break
+                print(f"Processed page {page_number}")
+                page_number += 1
+        finally:
+            coordinator.finish()
+
+        ingest_cache_stats = self.ingest_cache.get_stats()
+        print(f"Ingest cache: {ingest_cache_stats}")
+        self.ingest_cache.flush_stats()
+        return {
+            "generation": generation,
+            "role": coordinator.role,
+            "claimed": claimed,
+            "skipped": skipped,
+            "generation_stats": coordinator.get_stats(),
+            "ingest_cache": ingest_cache_stats,
+        }
 
     def get_content_page(self, page_number):
         url = f'{self.API_BASE_URL}/api/v1/contents?page={page_number}'
@@ -51,13 +92,28 @@ class ContentFetcher:
     def process_content_data(self, response_data):
         for content_data in response_data['data']:
             self.process_single_content(content_data)
+        self.flush_snapshots()
+        # The conditional GETs of the contents api stop matching, once per page
+        if self.changed_author_ids or self.ingest_cache.changed_author_ids:
+            conditional.bump_data_versions(self.changed_author_ids | self.ingest_cache.changed_author_ids)
+        live_feed.publish_contents(self.changed_contents)
+        content_lookup.invalidate(self.changed_contents.values())
+        self.changed_author_ids = set()
+        self.changed_contents = {}
+        self.ingest_cache.changed_author_ids = set()
+
+    def flush_snapshots(self):
+        # One insert per page for the contents whose stats changed
+        ContentStatSnapshot.objects.bulk_create(self.pending_snapshots)
+        self.pending_snapshots = []
 
     def process_single_content(self, content_data):
         try:
             content_unique_id = content_data['unq_external_id']
-            author = self.process_author(content_data.get('author'))
+            author_id = self.process_author(content_data.get('author'))
             thumbnail_url = content_data['thumbnail_view_url']
             title = content_data['title']
+            stats = content_data['stats']
         except KeyError as e:
             print(f"Missing key in content data: {e}")
             return
@@ -68,122 +124,214 @@ class ContentFetcher:
         content, created = Content.objects.get_or_create(
             unique_id=content_unique_id,
             defaults={
-                'author': author,
-                'url': thumbnail_url,
+                'author_id': author_id,
+                'thumbnail_url': thumbnail_url,
                 'title': title,
-                'data': content_data  # Presuming data field exists in content
+                'timestamp': content_data.get('timestamp'),
+                'big_metadata': content_data.get('big_metadata'),
+                'secret_value': content_data.get('secret_value'),
             }
         )
-        self.update_content_if_needed(content, content_data, created)
+        self.update_content_if_needed(content, content_data, stats, created)
 
     def process_author(self, author_data):
         if not author_data:
             return None
 
-        author, _ = Author.objects.get_or_create(
-            unique_id=author_data['unique_name'],
-            defaults={
-                'name': author_data.get('full_name'),
-                'url': author_data.get('url'),
-                'metadata': author_data.get('big_metadata'),  # Assuming a metadata field
-                'secret': author_data.get('secret_value')  # Assuming a secret field
-            }
-        )
-        return author
-
-    def update_content_if_needed(self, content, new_data, created):
-        if created:
-            print("New content created")
-            content.data = new_data
-            content.save()
-        elif content.data != new_data:
-            print("Content data updated")
-            content.data = new_data
-            content.save()
+        # The same authors come back on almost every page, they are resolved from the ingest cache
+        return self.ingest_cache.get_author_id(author_data)
+
+    def update_content_if_needed(self, content, content_data, stats, created):
+        engagement_before = 0 if created else content.total_engagement
+        changed_fields = content.apply_stats(stats)
+
+        if changed_fields:
+            print("New content created" if created else "Content stats updated")
+            content.save(update_fields=[*changed_fields, 'updated_at'])
         else:
             print("Content data not updated, continuing")
 
+        if changed_fields or created:
+            self.changed_author_ids.add(content.author_id)
+            self.changed_contents[content.id] = content.unique_id
+            self.pending_snapshots.append(ContentStatSnapshot.from_content(content, content.updated_at))
+
+        trending.record_engagement_delta(
+            content, content.total_engagement - engagement_before, content_data.get('hashtags', [])
+        )
 
-from contents.models import Content, Comment
 
+class PushError(Exception):
+    """
+    A call to the comment api that did not succeed. `permanent` errors are about the content itself, it is
+    never tried again. `attempted` is False when the call was not even made because the breaker is open.
+    """
+    def __init__(self, message, permanent=False, attempted=True):
+        super().__init__(message)
+        self.permanent = permanent
+        self.attempted = attempted
 
 
 class ContentPusher:
+    """
+    Generates an AI comment for every content that was not pushed yet and posts it.
+
+    Each upstream endpoint has its own circuit breaker: while the api is down, the pending contents wait for it
+    to come back instead of each burning retries. Generation calls run in parallel, as many as the AIMD limiter
+    shared by the workers allows. Posting is limited to one comment per `COMMENT_POST_INTERVAL` seconds.
+    """
+    # The content can never be commented, it is not retried
+    NOT_COMMENTABLE_ERROR = "This content is not available for commenting"
+
     def __init__(self):
         self.generate_comment_url = "https://hackapi.hellozelf.com/api/v1/ai_comment/"
         self.post_comment_url = "https://hackapi.hellozelf.com/api/v1/comment/"
         self.api_key = settings.CONTENT_API_HEADER_X_API_KEY
+        self.generate_breaker = get_comment_breaker('generate_comment')
+        self.post_breaker = get_comment_breaker('post_comment')
+        self.generate_limiter = get_comment_generation_limiter()
 
     def push(self):
         while True:
-            content = Content.objects.filter(is_pushed=False).first()
-            if content:
-                self.handle_comment_posting(content)
-            else:
-                pass
-            time.sleep(30)  # Wait 30 seconds between each push to respect rate limits
+            if not self.push_batch():
+                time.sleep(settings.COMMENT_POST_INTERVAL)
 
-    def handle_comment_posting(self, content):
-        response = self.generate_comment(content)
+    def push_batch(self):
+        """
+        Generates and posts the comments of the next pending contents, returns how many were posted.
+        """
+        retry_in = max(self.generate_breaker.retry_in(), self.post_breaker.retry_in())
+        if retry_in:
+            print(f"HackAPI circuit open, waiting {retry_in:.0f} seconds")
+            time.sleep(retry_in)
+            return 0
 
-        if response and response.status_code == 200:
-            comment_data = response.json()
-            self.post_comment(content, comment_data)
-        else:
-            pass
+        contents = list(
+            Content.objects.filter(is_pushed=False, push_failed_at__isnull=True)
+            .select_related('author')
+            .order_by('id')[:self.generate_limiter.get_limit()]
+        )
+        if not contents:
+            return 0
+
+        # The threads only call the api, the database is updated from this thread
+        with ThreadPoolExecutor(max_workers=len(contents)) as executor:
+            comments = list(executor.map(self.generate_comment, contents))
+
+        posted = 0
+        for content, comment_data in zip(contents, comments):
+            if isinstance(comment_data, PushError):
+                self.record_failure(content, comment_data)
+                continue
+            try:
+                self.post_comment(content, comment_data)
+            except PushError as e:
+                self.record_failure(content, e)
+                if not e.attempted:
+                    continue
+            else:
+                posted += 1
+            time.sleep(settings.COMMENT_POST_INTERVAL)  # The comment posting api allows one comment per 30 seconds
+        return posted
 
     def generate_comment(self, content):
+        """
+        Returns the generated comment, or the `PushError` of the call.
+        """
         data = {
             "content_id": content.unique_id,
             "title": content.title,
             "url": content.url,
             "author_username": content.author.username,
         }
-        for _ in range(3):  # Retry mechanism
-            try:
-                response = requests.post(
-                    self.generate_comment_url,
-                    headers={"x-api-key": self.api_key, "Content-Type": "application/json"},
-                    json=data,
-                )
-                if response.ok:
-                    pass
-                    return response
-                pass
-            except requests.RequestException as e:
-                pass
-            time.sleep(5)
-
-        pass
-        return None
+        token = self.generate_limiter.acquire(wait=settings.COMMENT_API_TIMEOUT)
+        if token is None:
+            return PushError("no generation slot available", attempted=False)
+
+        overloaded = False
+        try:
+            return self.call(self.generate_breaker, self.generate_comment_url, data).json()
+        except PushError as e:
+            overloaded = e.attempted and not e.permanent
+            return e
+        except ValueError:
+            return PushError("generated comment is not valid json")
+        finally:
+            self.generate_limiter.release(token, success=not overloaded)
 
     def post_comment(self, content, comment_data):
         data = {
             "content_id": content.unique_id,
             "comment_text": comment_data.get("comment_text"),
         }
-        for _ in range(3):  # Retry mechanism
-            try:
-                response = requests.post(
-                    self.post_comment_url,
-                    headers={"x-api-key": self.api_key, "Content-Type": "application/json"},
-                    json=data,
-                )
-                if response.status_code == 201:
-                    content.is_pushed = True
-                    content.save()
-                    pass
-                    return
-                elif (
-                        response.status_code == 400
-                        and "This content is not available for commenting" in response.json().get("error", "")
-                ):
-                    pass
-                    return
-                pass
-            except requests.RequestException as e:
-                pass
-            time.sleep(5)
-
-       #"Failed to post comment after retries"
+        self.call(self.post_breaker, self.post_comment_url, data)
+        content.is_pushed = True
+        content.save(update_fields=['is_pushed', 'updated_at'])
+
+    def call(self, breaker, url, data):
+        """
+        One call through the endpoint's breaker, without retries: a content whose call failed stays pending
+        and is tried again in a later batch, up to `COMMENT_PUSH_MAX_ATTEMPTS` times.
+        """
+        if not breaker.allow():
+            raise PushError(f"{breaker.name} circuit is open", attempted=False)
+        try:
+            response = requests.post(
+                url,
+                headers={"x-api-key": self.api_key, "Content-Type": "application/json"},
+                json=data,
+                timeout=settings.COMMENT_API_TIMEOUT,
+            )
+        except requests.RequestException as e:
+            breaker.record_failure()
+            raise PushError(f"{breaker.name}: {e.__class__.__name__}")
+
+        if response.ok:
+            breaker.record_success()
+            return response
+
+        error = get_response_error(response)
+        if response.status_code == 400 and self.NOT_COMMENTABLE_ERROR in error:
+            # The api answered properly, it is the content that can't be commented
+            breaker.record_success()
+            raise PushError(error, permanent=True)
+
+        breaker.record_failure()
+        raise PushError(f"{breaker.name}: {response.status_code} {error}".strip())
+
+    def record_failure(self, content, error):
+        if not error.attempted:
+            return
+        print(f"Comment push of content {content.pk} failed: {error}")
+        if error.permanent:
+            content.mark_push_failed(str(error))
+            return
+        content.push_attempts += 1
+        if content.push_attempts >= settings.COMMENT_PUSH_MAX_ATTEMPTS:
+            content.mark_push_failed(str(error))
+        else:
+            content.save(update_fields=['push_attempts'])
+
+
+def get_response_error(response):
+    try:
+        return str(response.json().get('error', ''))
+    except (ValueError, AttributeError):
+        return ''
+
+
+def get_comment_breaker(endpoint):
+    return CircuitBreaker(
+        f'hackapi:{endpoint}',
+        threshold=settings.COMMENT_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.COMMENT_BREAKER_RESET_TIMEOUT,
+    )
+
 
+def get_comment_generation_limiter():
+    return AIMDLimiter(
+        'hackapi:generate_comment',
+        min_limit=1,
+        max_limit=settings.COMMENT_GENERATION_MAX_CONCURRENCY,
+        slot_timeout=settings.COMMENT_API_TIMEOUT * 2,
+    )
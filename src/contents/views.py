@@ -1,13 +1,123 @@
 import datetime
+import logging
+import zoneinfo
 
-from django.db.models import Sum, Count
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Sum, Count, F, FloatField, Window
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, Lag, Cast, NullIf
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.views import View
+from kombu.exceptions import KombuError
 from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from contents.models import Content, Author, Tag, ContentTag
-from contents.serializers import ContentSerializer, ContentPostSerializer
+from contents import conditional, content_lookup, live_feed, orders, reports, tag_analytics, trending
+from contents.ingest_cache import IngestCache, get_total_stats
+from contents.utils import get_comment_breaker, get_comment_generation_limiter
+from contents.models import (
+    Content, Author, ContentTag, ContentStatSnapshot, Product, ProductRecommendation, TagCooccurrence,
+)
+from contents.serializers import (
+    ContentSerializer, ContentPostSerializer, ContentLookupSerializer, TopRatedProductSerializer, ProductRecommendationSerializer,
+)
+from contents.tasks import rebuild_trending_days
+
+logger = logging.getLogger(__name__)
+
+STATS_AGGREGATES = {
+    "total_likes": Sum('like_count'),
+    "total_shares": Sum('share_count'),
+    "total_views": Sum('view_count'),
+    "total_comments": Sum('comment_count'),
+    "total_engagement": Sum(F('like_count') + F('comment_count') + F('share_count')),
+    "total_contents": Count('id'),
+}
+
+STATS_TIME_BUCKETS = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+
+# `group_by` value -> (fields, named expressions) the stats are grouped on
+STATS_GROUPS = {
+    "author": (("author_id",), {"author_username": F("author__username")}),
+    "tag": ((), {"tag": F("contenttag__tag__name")}),
+}
+
+
+# Sortable fields of the author stats
+AUTHOR_STATS_ORDERINGS = (
+    "total_engagement", "total_engagement_rate", "total_contents", "total_views", "total_likes",
+    "total_comments", "total_shares", "followers", "author_username",
+)
+
+
+def apply_content_filters(queryset, query_params):
+    """
+    Filters shared by the content list and stats endpoints
+        - author_id: Author's db id
+        - author_username: Author's username
+        - timeframe: Content that has timestamp: now - 'x' days
+        - tag: Tag name
+        - title (insensitive match IE: SQL `ilike %text%`)
+    """
+    author_id = query_params.get("author_id")
+    author_username = query_params.get("author_username")
+    timeframe = query_params.get("timeframe")
+    tag = query_params.get("tag")
+    title = query_params.get("title")
+
+    if author_id:
+        queryset = queryset.filter(author_id=author_id)
+    if author_username:
+        queryset = queryset.filter(author__username__iexact=author_username)
+    if timeframe:
+        # Whole minutes, so the result (and its ETag, see `conditional.timeframe_bucket`) only changes once a minute
+        now = timezone.now().replace(second=0, microsecond=0)
+        timeframe_date = now - datetime.timedelta(days=int(timeframe))
+        queryset = queryset.filter(timestamp__gte=timeframe_date)
+    if tag:
+        queryset = queryset.filter(contenttag__tag__name__iexact=tag)
+    if title:
+        queryset = queryset.filter(title__icontains=title)
+    return queryset
+
+
+def get_positive_int(query_params, name, default, maximum=None):
+    """
+    A positive integer query parameter, capped to `maximum`. `None` when it is not a positive integer.
+    """
+    try:
+        value = int(query_params.get(name, default))
+    except ValueError:
+        return None
+    if value < 1:
+        return None
+    return min(value, maximum) if maximum is not None else value
+
+
+def build_stats(row):
+    """
+    Turns a row of `STATS_AGGREGATES` into the stats schema, empty aggregates (no contents) come back as 0.
+    """
+    total_views = row['total_views'] or 0
+    total_engagement = row['total_engagement'] or 0
+    total_engagement_rate = total_engagement / total_views if total_views else 0
+
+    return {
+        "total_likes": row['total_likes'] or 0,
+        "total_shares": row['total_shares'] or 0,
+        "total_views": total_views,
+        "total_comments": row['total_comments'] or 0,
+        "total_engagement": total_engagement,
+        "total_engagement_rate": round(total_engagement_rate, 2),
+        "total_contents": row['total_contents'] or 0,
+    }
 
 
 class ContentAPIView(APIView):
@@ -45,29 +155,22 @@ class ContentAPIView(APIView):
             - Should have items per page support in query params
             Example: `api_url?items_per_page=10&page=2`
         """
+        # `timeframe` counts from the current minute (see `apply_content_filters`), its results change every minute
+        conditional_get = conditional.ConditionalGet(
+            request, "contents", time_bucket=conditional.timeframe_bucket(request)
+        )
+        not_modified = conditional_get.not_modified()
+        if not_modified:
+            return not_modified
+
         query_params = request.query_params
-        author_id = query_params.get("author_id")
-        author_username = query_params.get("author_username")
-        timeframe = query_params.get("timeframe")
-        tag_name = query_params.get("tag")
-        title = query_params.get("title")
-        items_per_page = int(query_params.get("items_per_page", 100))
-        page = int(query_params.get("page", 1))
-
-        queryset = Content.objects.all()
-
-        # Apply filters
-        if author_id:
-            queryset = queryset.filter(author_id=author_id)
-        if author_username:
-            queryset = queryset.filter(author__username__iexact=author_username)
-        if timeframe:
-            timeframe_date = datetime.date.today() - datetime.timedelta(days=int(timeframe))
-            queryset = queryset.filter(timestamp__gte=timeframe_date)
-        if tag_name:
-            queryset = queryset.filter(contenttag__tag__name__iexact=tag_name)
-        if title:
-            queryset = queryset.filter(title__icontains=title)
+        items_per_page = get_positive_int(query_params, "items_per_page", 100)
+        page = get_positive_int(query_params, "page", 1)
+        for name, value in (("items_per_page", items_per_page), ("page", page)):
+            if value is None:
+                return Response({name: "Must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = apply_content_filters(Content.objects.all(), query_params)
 
         # Pagination
         start = items_per_page * (page - 1)
@@ -104,7 +207,7 @@ class ContentAPIView(APIView):
                 ).values_list("tag__name", flat=True)
             )
             serialized_data["content"]["tags"] = tags
-        return Response(serialized.data, status=status.HTTP_200_OK)
+        return conditional_get.finalize(Response(serialized.data, status=status.HTTP_200_OK))
 
     def post(self, request, ):
         """
@@ -123,59 +226,104 @@ class ContentAPIView(APIView):
         validated_data = serializer.validated_data
         response_data = []
 
-        author = validated_data.get("author")
         hashtags = validated_data.get("hashtags")
-
-        author_object = self.get_or_create_author(author)
+        ingest_cache = IngestCache()
 
         content = validated_data
-        content['author'] = author_object
+        content["author_id"] = ingest_cache.get_author_id(validated_data.get("author"))
         content_object = self.get_or_create_content(content)
 
-        self.update_content_tags(content_object, hashtags)
+        self.update_content_tags(content_object, ingest_cache.get_tag_ids(hashtags))
+        ingest_cache.flush_stats()
+        conditional.bump_data_versions([content_object.author_id])
+        live_feed.publish_contents([content_object.id])
+        content_lookup.invalidate([content_object.unique_id])
 
-        response_data.append(ContentSerializer({"content": content_object, "author": author_object}).data)
+        response_data.append(ContentSerializer({"content": content_object, "author": content_object.author}).data)
 
         return Response(response_data, status=status.HTTP_200_OK)
 
-    def get_or_create_author(self, author_data):
-        author, _ = Author.objects.get_or_create(
-            unique_id=author_data["unique_external_id"],
-            defaults={
-                "username": author_data["unique_name"],
-                "name": author_data["full_name"],
-                "url": author_data["url"],
-                "title": author_data["title"],
-                "big_metadata": author_data.get("big_metadata"),
-                "secret_value": author_data.get("secret_value"),
-            }
-        )
-        return author
-
     def get_or_create_content(self, content_data):
-        content, _ = Content.objects.get_or_create(
+        content, created = Content.objects.select_related("author").get_or_create(
             unique_id=content_data["unq_external_id"],
             defaults={
-                "author": content_data["author"],
+                "author_id": content_data["author_id"],
                 "title": content_data.get("title"),
                 "big_metadata": content_data.get("big_metadata"),
                 "secret_value": content_data.get("secret_value"),
                 "thumbnail_url": content_data.get("thumbnail_view_url"),
+                "timestamp": content_data.get("timestamp"),
                 "like_count": content_data["stats"]["likes"],
                 "comment_count": content_data["stats"]["comments"],
                 "share_count": content_data["stats"]["shares"],
                 "view_count": content_data["stats"]["views"],
             }
         )
+        # Existing contents used to keep the stats of their first ingest forever
+        engagement_before = 0 if created else content.total_engagement
+        changed_fields = content.apply_stats(content_data["stats"])
+        if changed_fields:
+            content.save(update_fields=[*changed_fields, "updated_at"])
+        if changed_fields or created:
+            ContentStatSnapshot.objects.bulk_create([ContentStatSnapshot.from_content(content, timezone.now())])
+
+        trending.record_engagement_delta(
+            content, content.total_engagement - engagement_before, content_data.get("hashtags", [])
+        )
         return content
 
-    def update_content_tags(self, content, hashtags):
+    def update_content_tags(self, content, tag_ids):
         # Clear existing tags
         ContentTag.objects.filter(content=content).delete()
+        ContentTag.objects.bulk_create([
+            ContentTag(tag_id=tag_id, content=content) for tag_id in dict.fromkeys(tag_ids)
+        ])
 
-        for tag_name in hashtags:
-            tag, _ = Tag.objects.get_or_create(name=tag_name)
-            ContentTag.objects.create(tag=tag, content=content)
+
+class ContentFeedView(View):
+    """
+    Server-Sent Events of the contents ingested or updated from now on, instead of polling the first page of
+    the contents api. Filters: `author_id`, `tag`.
+    Every process keeps a single postgres LISTEN connection for all of its streams (see `contents.live_feed`),
+    the streams themselves need an ASGI server.
+    """
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"detail": "The feed is only served by the ASGI server."}, status=501)
+        author_id = request.GET.get("author_id")
+        if author_id and not author_id.isdigit():
+            return JsonResponse({"author_id": ["A valid integer is required."]}, status=400)
+
+        response = StreamingHttpResponse(
+            live_feed.stream(author_id=int(author_id) if author_id else None, tag=request.GET.get("tag")),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        # Stops nginx from buffering the events
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class ContentLookupAPIView(APIView):
+    """
+    Contents by unique id, up to `CONTENT_LOOKUP_MAX_IDS` per request: `{"unq_external_ids": [...]}`.
+    Results follow the order of the request, ids without a content are returned with `found: false`.
+    """
+    def post(self, request):
+        serializer = ContentLookupSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        unique_ids = serializer.validated_data["unq_external_ids"]
+
+        contents, cached = content_lookup.get_contents(unique_ids)
+        results = [
+            {"unq_external_id": unique_id, "found": data is not None, **(data or {"author": None, "content": None})}
+            for unique_id, data in zip(unique_ids, contents)
+        ]
+        return Response({
+            "results": results,
+            "found": sum(result["found"] for result in results),
+            "cached": cached,
+        }, status=status.HTTP_200_OK)
 
 
 class ContentStatsAPIView(APIView):
@@ -205,49 +353,377 @@ class ContentStatsAPIView(APIView):
     """
     def get(self, request):
         query_params = request.query_params
+        group_by = query_params.get("group_by")
+
+        conditional_get = conditional.ConditionalGet(
+            request, "contents-stats", time_bucket=conditional.timeframe_bucket(request)
+        )
+        not_modified = conditional_get.not_modified()
+        if not_modified:
+            return not_modified
+
+        queryset = apply_content_filters(Content.objects.all(), query_params)
+
+        if group_by:
+            return conditional_get.finalize(self.get_grouped_stats(queryset, group_by, query_params.get("tz")))
+
+        stats = queryset.aggregate(**STATS_AGGREGATES)
+        # Summed over the distinct authors, not over their contents: an author is counted once
+        followers = Author.objects.filter(pk__in=queryset.values("author_id")).aggregate(total=Sum("followers"))
+
+        data = build_stats(stats)
+        data["total_followers"] = followers["total"] or 0
+
+        return conditional_get.finalize(Response(data, status=status.HTTP_201_CREATED))
+
+    def get_grouped_stats(self, queryset, group_by, tz_name):
+        """
+        Returns the stats of every bucket from a single `GROUP BY` query, instead of one aggregation per bucket.
+        Time buckets (day, week, month) are truncated in the `tz` time zone of the caller.
+        """
+        tz_name = tz_name or settings.TIME_ZONE
+        try:
+            tzinfo = zoneinfo.ZoneInfo(tz_name)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            return Response({"tz": f"Unknown time zone `{tz_name}`"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if group_by in STATS_TIME_BUCKETS:
+            truncate = STATS_TIME_BUCKETS[group_by]
+            rows = (
+                queryset.filter(timestamp__isnull=False)
+                .values(bucket=truncate("timestamp", tzinfo=tzinfo))
+                .annotate(**STATS_AGGREGATES)
+                .order_by("bucket")
+            )
+        elif group_by in STATS_GROUPS:
+            fields, expressions = STATS_GROUPS[group_by]
+            rows = (
+                queryset.values(*fields, **expressions)
+                .annotate(**STATS_AGGREGATES)
+                .order_by("-total_engagement")
+            )
+        else:
+            choices = ", ".join([*STATS_TIME_BUCKETS, *STATS_GROUPS])
+            return Response({"group_by": f"Must be one of: {choices}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        for row in rows:
+            keys = {key: value for key, value in row.items() if key not in STATS_AGGREGATES}
+            results.append({**keys, **build_stats(row)})
+
+        data = {
+            "group_by": group_by,
+            "timezone": tz_name,
+            "results": results,
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class AuthorStatsAPIView(APIView):
+    """
+    Stats of every author over their contents matching the content filters (see `apply_content_filters`),
+    from one query grouped by author. `followers` is the author's own count, not summed over the contents.
+
+    `ordering` is one of `AUTHOR_STATS_ORDERINGS`, `-` prefixed for descending (default `-total_engagement`).
+    Page number pagination: `items_per_page` (default 20, max 100) and `page`.
+    """
+    def get(self, request):
+        query_params = request.query_params
+        ordering = query_params.get("ordering", "-total_engagement")
+        items_per_page = get_positive_int(query_params, "items_per_page", 20, maximum=100)
+        page = get_positive_int(query_params, "page", 1)
+
+        for name, value in (("items_per_page", items_per_page), ("page", page)):
+            if value is None:
+                return Response({name: "Must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if ordering.lstrip("-") not in AUTHOR_STATS_ORDERINGS:
+            choices = ", ".join(AUTHOR_STATS_ORDERINGS)
+            return Response({"ordering": f"Must be one of: {choices}"}, status=status.HTTP_400_BAD_REQUEST)
+        order = F(ordering.lstrip("-"))
+        order = order.desc(nulls_last=True) if ordering.startswith("-") else order.asc(nulls_last=True)
+
+        start = items_per_page * (page - 1)
+        rows = (
+            apply_content_filters(Content.objects.all(), query_params)
+            .values("author_id")
+            .annotate(**STATS_AGGREGATES)
+            .annotate(
+                author_username=F("author__username"),
+                author_name=F("author__name"),
+                followers=F("author__followers"),
+                total_engagement_rate=Cast("total_engagement", FloatField()) / NullIf("total_views", 0),
+            )
+            .order_by(order, "author_id")[start:start + items_per_page]
+        )
+
+        results = []
+        for row in rows:
+            results.append({
+                "author_id": row["author_id"],
+                "author_username": row["author_username"],
+                "author_name": row["author_name"],
+                "followers": row["followers"],
+                **build_stats(row),
+            })
+        return Response(
+            {"page": page, "items_per_page": items_per_page, "results": results}, status=status.HTTP_200_OK
+        )
+
+
+class TagStatsAPIView(APIView):
+    """
+    The most engaging tags over the contents of the last `timeframe` days (default 7), by content day.
+    Served from the `TagDailyStats` table, which lags the contents by at most one refresh.
+
+    `ordering` is one of `tag_analytics.TAG_STATS_ORDERINGS`, `-` prefixed for descending (default
+    `-total_engagement`). Page number pagination: `items_per_page` (default 20, max 100) and `page`.
+    """
+    def get(self, request):
+        query_params = request.query_params
+        timeframe = get_positive_int(query_params, "timeframe", 7)
+        ordering = query_params.get("ordering", "-total_engagement")
+        items_per_page = get_positive_int(query_params, "items_per_page", 20, maximum=100)
+        page = get_positive_int(query_params, "page", 1)
+
+        for name, value in (("timeframe", timeframe), ("items_per_page", items_per_page), ("page", page)):
+            if value is None:
+                return Response({name: "Must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if ordering.lstrip("-") not in tag_analytics.TAG_STATS_ORDERINGS:
+            choices = ", ".join(tag_analytics.TAG_STATS_ORDERINGS)
+            return Response({"ordering": f"Must be one of: {choices}"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Define filters
+        results = tag_analytics.get_tag_stats(
+            timeframe, ordering=ordering, start=items_per_page * (page - 1), limit=items_per_page
+        )
+        return Response(
+            {"timeframe": timeframe, "page": page, "items_per_page": items_per_page, "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+
+class RelatedTagAPIView(APIView):
+    """
+    The tags most often found on the same contents as `tag` (`limit`, default 10), read with one lookup
+    on the (tag, rank) index of the precomputed `TagCooccurrence` top-K.
+    """
+    def get(self, request, tag):
+        limit = get_positive_int(request.query_params, "limit", 10, maximum=settings.TAG_COOCCURRENCE_TOP_K)
+        if limit is None:
+            return Response({"limit": "Must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+        related = (
+            TagCooccurrence.objects.filter(tag=tag.lower())
+            .order_by("rank")
+            .values("related_tag", "contents", "share")[:limit]
+        )
+        return Response({"tag": tag.lower(), "results": list(related)}, status=status.HTTP_200_OK)
+
+
+class TrendingContentAPIView(APIView):
+    """
+    Top contents by the engagement they gained in the last `days` (default 7), optionally scoped with
+    `author_id` or `tag`. Served from the redis leaderboards, falls back to SQL when they are cold.
+    """
+    def get(self, request):
+        query_params = request.query_params
+        days = get_positive_int(query_params, "days", 7, maximum=settings.TRENDING_RETENTION_DAYS)
+        limit = get_positive_int(query_params, "limit", 10, maximum=100)
+        for name, value in (("days", days), ("limit", limit)):
+            if value is None:
+                return Response({name: "Must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
         author_id = query_params.get("author_id")
-        author_username = query_params.get("author_username")
-        timeframe = query_params.get("timeframe")
         tag = query_params.get("tag")
-        title = query_params.get("title")
-
-        queryset = Content.objects.all()
-
-        if author_id:
-            queryset = queryset.filter(author_id=author_id)
-        if author_username:
-            queryset = queryset.filter(author__username__iexact=author_username)
-        if timeframe:
-            timeframe_date = timezone.now() - datetime.timedelta(days=int(timeframe))
-            queryset = queryset.filter(timestamp__gte=timeframe_date)
-        if tag:
-            queryset = queryset.filter(contenttag__tag__name__iexact=tag)
-        if title:
-            queryset = queryset.filter(title__icontains=title)
-
-        stats = queryset.aggregate(
-            total_likes=Sum('like_count'),
-            total_shares=Sum('share_count'),
-            total_views=Sum('view_count'),
-            total_comments=Sum('comment_count'),
-            total_contents=Count('id'),
-            total_followers=Sum('author__followers')
+
+        scores = trending.top_content_scores(days, limit, author_id=author_id, tag=tag)
+        if scores is None:
+            if trending.claim_rebuild():
+                # The SQL ranking is served either way, the next cold request queues the rebuild again
+                try:
+                    rebuild_trending_days.delay()
+                except KombuError:
+                    trending.release_rebuild()
+                    logger.exception("Could not queue the rebuild of the trending leaderboards")
+            scores = trending.top_content_scores_from_db(days, limit, author_id=author_id, tag=tag)
+
+        contents = Content.objects.select_related("author").in_bulk([content_id for content_id, _ in scores])
+
+        data = []
+        for content_id, score in scores:
+            content = contents.get(content_id)
+            if content is None:
+                continue
+            serialized = ContentSerializer({"content": content, "author": content.author}).data
+            serialized["score"] = score
+            data.append(serialized)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ContentGrowthAPIView(APIView):
+    """
+    Growth curve of a content from its stat history. Each point has the change since the previous snapshot
+    and the engagement velocity (engagement gained per hour), computed with `LAG()` window functions.
+    `days` limits the curve to the last 'x' days.
+    """
+    def get(self, request, content_id):
+        days = None
+        if "days" in request.query_params:
+            # No history is kept past the retention, a longer window is the whole curve
+            days = get_positive_int(
+                request.query_params, "days", None, maximum=settings.STAT_SNAPSHOT_RETENTION_MONTHS * 31
+            )
+            if days is None:
+                return Response({"days": "Must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        engagement = F("like_count") + F("comment_count") + F("share_count")
+        previous = {"order_by": F("captured_at").asc()}
+
+        queryset = ContentStatSnapshot.objects.filter(content_id=content_id)
+        if days:
+            queryset = queryset.filter(captured_at__gte=timezone.now() - datetime.timedelta(days=days))
+
+        snapshots = (
+            queryset.annotate(
+                total_engagement=engagement,
+                previous_engagement=Window(Lag(engagement), **previous),
+                previous_view_count=Window(Lag("view_count"), **previous),
+                previous_captured_at=Window(Lag("captured_at"), **previous),
+            )
+            .order_by("captured_at")
+            .values(
+                "captured_at", "like_count", "comment_count", "view_count", "share_count",
+                "total_engagement", "previous_engagement", "previous_view_count", "previous_captured_at",
+            )
         )
 
-        total_engagement = stats['total_likes'] + stats['total_shares'] + stats['total_comments']
-        total_engagement_rate = total_engagement / stats['total_views'] if stats['total_views'] else 0
+        points = []
+        for snapshot in snapshots:
+            previous_captured_at = snapshot.pop("previous_captured_at")
+            previous_engagement = snapshot.pop("previous_engagement")
+            previous_view_count = snapshot.pop("previous_view_count")
+
+            engagement_delta, view_delta, engagement_velocity = None, None, None
+            if previous_captured_at is not None:
+                engagement_delta = snapshot["total_engagement"] - previous_engagement
+                view_delta = snapshot["view_count"] - previous_view_count
+                hours = (snapshot["captured_at"] - previous_captured_at).total_seconds() / 3600
+                engagement_velocity = round(engagement_delta / hours, 2) if hours else None
+
+            points.append({
+                **snapshot,
+                "engagement_delta": engagement_delta,
+                "view_delta": view_delta,
+                "engagement_velocity": engagement_velocity,
+            })
+
+        return Response({"content_id": content_id, "points": points}, status=status.HTTP_200_OK)
 
+
+class SalesReportAPIView(APIView):
+    """
+    Revenue, units and discounts of the orders grouped by `group_by` (day, category or brand).
+    Filters: `start` / `end` (order day, YYYY-MM-DD, inclusive), `category`, `brand`.
+    Served from the `DailySalesSummary` table, which lags the orders by at most one refresh.
+    """
+    def get(self, request):
+        query_params = request.query_params
+        group_by = query_params.get("group_by", "day")
+        if group_by not in reports.SALES_REPORT_GROUPS:
+            choices = ", ".join(reports.SALES_REPORT_GROUPS)
+            return Response({"group_by": f"Must be one of: {choices}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            start = datetime.date.fromisoformat(query_params["start"]) if query_params.get("start") else None
+            end = datetime.date.fromisoformat(query_params["end"]) if query_params.get("end") else None
+        except ValueError:
+            return Response({"date": "`start` and `end` must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = reports.get_sales_report(
+            group_by,
+            start=start,
+            end=end,
+            category=query_params.get("category"),
+            brand=query_params.get("brand"),
+        )
+        return Response({"group_by": group_by, "results": rows}, status=status.HTTP_200_OK)
+
+
+class TopRatedProductAPIView(APIView):
+    """
+    Products with the best average rating, optionally of one `category_id`, ordered on the
+    (category, rating_average) index. `min_reviews` (default 1) leaves out products with too few reviews.
+    """
+    def get(self, request):
+        query_params = request.query_params
+        category_id = query_params.get("category_id")
+        min_reviews = get_positive_int(query_params, "min_reviews", 1)
+        limit = get_positive_int(query_params, "limit", 20, maximum=100)
+        for name, value in (("min_reviews", min_reviews), ("limit", limit)):
+            if value is None:
+                return Response({name: "Must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Product.objects.filter(rating_count__gte=min_reviews).select_related("category", "brand")
+        if category_id:
+            queryset = queryset.filter(category_id=category_id)
+        queryset = queryset.order_by("-rating_average", "-rating_count")[:limit]
+
+        return Response(TopRatedProductSerializer(queryset, many=True).data, status=status.HTTP_200_OK)
+
+
+class ProductRecommendationAPIView(APIView):
+    """
+    "Users who wanted this also bought": the precomputed top-K of a product (`limit`, default 10),
+    read with one lookup on the (product, rank) index.
+    """
+    def get(self, request, product_id):
+        limit = get_positive_int(request.query_params, "limit", 10, maximum=settings.PRODUCT_RECOMMENDATIONS_TOP_K)
+        if limit is None:
+            return Response({"limit": "Must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+        recommendations = (
+            ProductRecommendation.objects.filter(product_id=product_id)
+            .select_related("recommended_product")
+            .order_by("rank")[:limit]
+        )
+        return Response(
+            ProductRecommendationSerializer(recommendations, many=True).data, status=status.HTTP_200_OK
+        )
+
+
+class OrderHistoryAPIView(APIView):
+    """
+    Orders of the authenticated user, newest first, with their items and payment status.
+    Cursor pagination: pass the `next_cursor` of a page as `cursor` to get the next one.
+    `items_per_page` defaults to 20 (max 100).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query_params = request.query_params
+        items_per_page = get_positive_int(query_params, "items_per_page", 20, maximum=100)
+        if items_per_page is None:
+            return Response({"items_per_page": "Must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            page = orders.get_order_history_page(request.user, items_per_page, cursor=query_params.get("cursor"))
+        except orders.InvalidCursor:
+            return Response({"cursor": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(page, status=status.HTTP_200_OK)
+
+
+class MetricsAPIView(APIView):
+    """
+    Operational state of the background jobs: the HackAPI circuit breakers, the adaptive comment generation
+    concurrency and the comment push backlog.
+    """
+    def get(self, request):
+        pending = Content.objects.filter(is_pushed=False, push_failed_at__isnull=True).count()
+        failed = Content.objects.filter(push_failed_at__isnull=False).count()
         data = {
-            "total_likes": stats['total_likes'] or 0,
-            "total_shares": stats['total_shares'] or 0,
-            "total_views": stats['total_views'] or 0,
-            "total_comments": stats['total_comments'] or 0,
-            "total_engagement": total_engagement or 0,
-            "total_engagement_rate": round(total_engagement_rate, 2),
-            "total_contents": stats['total_contents'] or 0,
-            "total_followers": stats['total_followers'] or 0,
+            "circuit_breakers": {
+                breaker.name: breaker.get_stats()
+                for breaker in (get_comment_breaker("generate_comment"), get_comment_breaker("post_comment"))
+            },
+            "comment_generation_concurrency": get_comment_generation_limiter().get_stats(),
+            "comment_push": {"pending": pending, "failed": failed},
+            "ingest_cache": get_total_stats(),
+            "http": conditional.get_http_metrics(),
         }
-
-        return Response(data, status=status.HTTP_201_CREATED)
+        return Response(data, status=status.HTTP_200_OK)